@@ -2,16 +2,62 @@
 """
 实验结果完整性检查脚本
 检查 /data/xingkun/experiment_result 目录下的实验结果是否完整
+
+目录树通过 experiment_catalog.TreeCatalog 只遍历一次，CSV 行数按 (size, mtime)
+缓存在 .row_counts.json 中，各模型并行检查；报告内容与逐个检查时相同。
+
+每次运行在 Markdown 报告旁写一份结构化的 integrity_report_<ts>.json，并把每个
+cell（模型/环境/方法）的状态追加到 .integrity_history.json。
+--since last 只打印与上一次运行相比新坏掉、新修好和新出现的 cell，不写报告文件；
+有新坏掉的 cell 时以非零状态退出，自动化流程可以直接轮询。
+
+status 子命令把每个运行分为已完成（有 finish_mark 或行数已够）、运行中（最近
+--stale-minutes 分钟内有新记录）、停滞（超过该时间没有新记录且未完成）和未开始。
+只使用目录项的 stat 信息、偏移索引（summary_index.py，只扫描上次之后追加的部分）
+中的记录数和文件末尾最后一条记录的时间戳，不重新解析整个文件；空闲时间以最后一条
+记录的时间戳为准，没有可解析的时间戳时才用文件 mtime。有停滞的运行时以非零状态退出。
+
+用法:
+    python check_integrity.py [--since last|<时间戳>]
+    python check_integrity.py status [--stale-minutes 60] [--all]
 """
 
+import argparse
+import json
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
+from experiment_catalog import TreeCatalog, RowCountCache, ROW_COUNTS_FILE_NAME, read_last_timestamp
+from summary_index import update_index
+from run_manifest import (
+    load_manifest, get_manifest_path, get_finish_mark_path, get_expected_lines, check_manifest_consistency,
+)
+
 # 配置
 BASE_DIR = Path("/data/xingkun/experiment_result")
 TIMESTAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
 OUTPUT_FILE = BASE_DIR / f"integrity_report_{TIMESTAMP}.md"
+JSON_OUTPUT_FILE = OUTPUT_FILE.with_suffix(".json")
+HISTORY_FILE = BASE_DIR / ".integrity_history.json"
+HISTORY_VERSION = 1
+HISTORY_LIMIT = 200  # 历史中最多保留的运行数
+
+# 超过此时间（分钟）没有新记录且未完成的运行视为停滞
+STALE_MINUTES = 60
+
+# 运行状态 -> 显示名称（status 输出按此顺序）
+RUN_STATUS = {
+    "stalled": "⚠️ 停滞",
+    "in_flight": "🔄 运行中",
+    "not_started": "⬜ 未开始",
+    "finished": "✅ 已完成",
+}
+
+# 表示 cell 不存在的状态；从这些状态变为其他状态算"新出现"
+MISSING_STATES = {"model_missing", "env_missing", "method_missing"}
 
 # 模型列表及其前缀映射（按指定顺序）
 # model_name: (env_folder_prefix, [possible_method_folder_model_names])
@@ -49,7 +95,7 @@ METHODS = [
 ]
 
 
-def find_env_folder(model_dir: Path, prefix: str, env: str) -> Path | None:
+def find_env_folder(catalog: TreeCatalog, model_dir: Path, prefix: str, env: str) -> Path | None:
     """查找环境文件夹，尝试不同的命名格式"""
     # 可能的命名格式
     possible_names = [
@@ -59,12 +105,12 @@ def find_env_folder(model_dir: Path, prefix: str, env: str) -> Path | None:
     
     for name in possible_names:
         folder = model_dir / name
-        if folder.exists():
+        if catalog.exists(folder):
             return folder
     
     # 如果都不存在，尝试搜索
-    for item in model_dir.iterdir():
-        if item.is_dir() and env in item.name:
+    for item in catalog.iterdir(model_dir):
+        if catalog.is_dir(item) and env in item.name:
             return item
     
     return None
@@ -89,28 +135,28 @@ def get_log_folder_name(env: str, model_prefix: str, method: str) -> str:
         return f"log_{env_short}_{model_prefix}_{method}"
 
 
-def find_method_folder(env_folder: Path, model_prefix: str, env: str, method: str) -> Path | None:
+def find_method_folder(catalog: TreeCatalog, env_folder: Path, model_prefix: str, env: str, method: str) -> Path | None:
     """查找方法文件夹"""
     expected_name = get_log_folder_name(env, model_prefix, method)
     folder = env_folder / expected_name
-    if folder.exists():
+    if catalog.exists(folder):
         return folder
     
     # 尝试搜索包含方法名的文件夹
-    for item in env_folder.iterdir():
-        if item.is_dir() and method in item.name:
+    for item in catalog.iterdir(env_folder):
+        if catalog.is_dir(item) and method in item.name:
             return item
     
     return None
 
 
-def check_csv_lines(csv_path: Path) -> int:
-    """检查CSV文件的行数"""
-    if not csv_path.exists():
+def check_csv_lines(catalog: TreeCatalog, row_counts: RowCountCache, csv_path: Path) -> int:
+    """检查CSV文件的行数（文件未变化时使用缓存）"""
+    info = catalog.info(csv_path)
+    if info is None:
         return -1
     
-    with open(csv_path, 'r') as f:
-        return sum(1 for _ in f)
+    return row_counts.get(csv_path, info)
 
 
 def is_implicit_env(env: str) -> bool:
@@ -169,11 +215,11 @@ def check_method_folder_consistency(folder_name: str, model_name: str, model_var
     return issues
 
 
-def check_model(model_name: str, model_prefix: str, model_variants: list) -> dict:
+def check_model(catalog: TreeCatalog, row_counts: RowCountCache, model_name: str, model_prefix: str, model_variants: list) -> dict:
     """检查单个模型的完整性"""
     model_dir = BASE_DIR / model_name
     result = {
-        "exists": model_dir.exists(),
+        "exists": catalog.exists(model_dir),
         "environments": {},
         "consistency_issues": [],  # 一致性问题
     }
@@ -182,7 +228,7 @@ def check_model(model_name: str, model_prefix: str, model_variants: list) -> dic
         return result
     
     for env in ENVIRONMENTS:
-        env_folder = find_env_folder(model_dir, model_prefix, env)
+        env_folder = find_env_folder(catalog, model_dir, model_prefix, env)
         env_result = {
             "exists": env_folder is not None,
             "folder_name": env_folder.name if env_folder else None,
@@ -197,23 +243,29 @@ def check_model(model_name: str, model_prefix: str, model_variants: list) -> dic
             env_result["consistency_issues"] = env_consistency
             
             for method in METHODS:
-                method_folder = find_method_folder(env_folder, model_prefix, env, method)
+                method_folder = find_method_folder(catalog, env_folder, model_prefix, env, method)
                 csv_path = method_folder / "log" / "explorer_summary.csv" if method_folder else None
                 
-                expected_lines = 41 if is_implicit_env(env) else 61  # 用户指定的行数
-                actual_lines = check_csv_lines(csv_path) if csv_path else -1
+                # 优先使用运行时写入的清单，没有清单时回退到用户指定的行数
+                has_manifest = method_folder is not None and catalog.exists(get_manifest_path(method_folder))
+                manifest = load_manifest(method_folder) if has_manifest else None
+                expected_lines = get_expected_lines(manifest, 41 if is_implicit_env(env) else 61)
+                actual_lines = check_csv_lines(catalog, row_counts, csv_path) if csv_path else -1
                 
                 # 检查方法文件夹名的一致性
                 method_consistency = []
                 if method_folder:
                     method_consistency = check_method_folder_consistency(method_folder.name, model_name, model_variants, env)
+                if manifest:
+                    method_consistency.extend(check_manifest_consistency(manifest, method_folder))
                 
                 method_result = {
                     "exists": method_folder is not None,
                     "folder_name": method_folder.name if method_folder else None,
-                    "csv_exists": csv_path.exists() if csv_path else False,
+                    "csv_exists": catalog.exists(csv_path) if csv_path else False,
                     "csv_lines": actual_lines,
                     "expected_lines": expected_lines,
+                    "has_manifest": manifest is not None,
                     "csv_ok": actual_lines == expected_lines,
                     "consistency_issues": method_consistency,
                 }
@@ -355,7 +407,8 @@ def generate_report(results: dict) -> str:
                     if not method_result["csv_exists"]:
                         csv_issues.append(f"{method_name}: CSV不存在")
                     elif not method_result["csv_ok"]:
-                        csv_issues.append(f"{method_name}: {method_result['csv_lines']}/{method_result['expected_lines']}行")
+                        source = "（清单）" if method_result["has_manifest"] else ""
+                        csv_issues.append(f"{method_name}: {method_result['csv_lines']}/{method_result['expected_lines']}行{source}")
             
             if env_issues or csv_issues:
                 lines.append(f"\n#### ⚠️ {env_name}")
@@ -408,22 +461,265 @@ def generate_report(results: dict) -> str:
     return "\n".join(lines)
 
 
+def check_all_models() -> dict:
+    """共享同一个目录快照和行数缓存，并行检查所有模型，结果按 MODELS 顺序返回"""
+    catalog = TreeCatalog(BASE_DIR)
+    row_counts = RowCountCache(BASE_DIR / ROW_COUNTS_FILE_NAME)
+    
+    for model_name in MODELS:
+        print(f"  检查 {model_name}...")
+    with ThreadPoolExecutor(max_workers=len(MODELS)) as executor:
+        futures = {
+            model_name: executor.submit(check_model, catalog, row_counts, model_name, model_prefix, model_variants)
+            for model_name, (model_prefix, model_variants) in MODELS.items()
+        }
+        results = {model_name: future.result() for model_name, future in futures.items()}
+    
+    row_counts.save()
+    print(f"  行数缓存: 命中 {row_counts.hits}，重新计数 {row_counts.misses}")
+    return results
+
+
+def run_status(catalog: TreeCatalog, method_folder: Path | None, expected_lines: int,
+               now: datetime, stale_minutes: float) -> dict:
+    """单个运行的状态，只用 stat 信息、偏移索引中的记录数和文件末尾的时间戳"""
+    csv_path = method_folder / "log" / "explorer_summary.csv" if method_folder else None
+    info = catalog.info(csv_path) if csv_path else None
+    status = {"status": "not_started", "lines": -1, "expected_lines": expected_lines,
+              "finish_mark": False, "last_record": None, "idle_minutes": None}
+    if info is None:
+        return status
+
+    status["finish_mark"] = catalog.exists(get_finish_mark_path(method_folder))
+    # 行数 = 标题行 + 已写完的记录数（与 get_expected_lines 的口径一致）
+    try:
+        index = update_index(csv_path)
+        status["lines"] = len(index["offsets"]) + (1 if index["header_end"] else 0)
+    except OSError:
+        pass
+    # 最后一条记录的时间戳为准：文件被复制、touch 或同步时 mtime 会变，不代表运行还活着
+    last_record = read_last_timestamp(csv_path)
+    if last_record is not None:
+        status["last_record"] = last_record.strftime('%Y-%m-%d %H:%M:%S')
+        last_activity = last_record
+    else:
+        last_activity = datetime.fromtimestamp(info.mtime_ns / 1e9)
+    status["idle_minutes"] = (now - last_activity).total_seconds() / 60
+
+    if status["finish_mark"] or status["lines"] >= expected_lines:
+        status["status"] = "finished"
+    elif status["idle_minutes"] <= stale_minutes:
+        status["status"] = "in_flight"
+    else:
+        status["status"] = "stalled"
+    return status
+
+
+def collect_run_status(stale_minutes: float) -> list:
+    """按 MODELS / ENVIRONMENTS / METHODS 顺序返回所有运行的状态"""
+    catalog = TreeCatalog(BASE_DIR)
+    now = datetime.now()
+    runs = []
+    for model_name, (model_prefix, _) in MODELS.items():
+        model_dir = BASE_DIR / model_name
+        for env in ENVIRONMENTS:
+            env_folder = find_env_folder(catalog, model_dir, model_prefix, env) if catalog.exists(model_dir) else None
+            for method in METHODS:
+                method_folder = find_method_folder(catalog, env_folder, model_prefix, env, method) if env_folder else None
+                has_manifest = method_folder is not None and catalog.exists(get_manifest_path(method_folder))
+                manifest = load_manifest(method_folder) if has_manifest else None
+                expected_lines = get_expected_lines(manifest, 41 if is_implicit_env(env) else 61)
+                status = run_status(catalog, method_folder, expected_lines, now, stale_minutes)
+                status.update({"model": model_name, "env": env, "method": method})
+                runs.append(status)
+    return runs
+
+
+def format_status(runs: list, show_all: bool) -> str:
+    """status 子命令的输出: 各状态的数量和需要关注的运行"""
+    counts = {name: sum(1 for run in runs if run["status"] == name) for name in RUN_STATUS}
+    lines = ["  ".join(f"{RUN_STATUS[name]}: {count}" for name, count in counts.items())]
+    shown = [run for run in runs if show_all or run["status"] in ("stalled", "in_flight")]
+    if not shown:
+        return "\n".join(lines)
+    shown.sort(key=lambda run: list(RUN_STATUS).index(run["status"]))
+    lines.append("")
+    lines.append("| 状态 | 模型 | 环境 | 方法 | 行数 | 最后记录 | 空闲 |")
+    lines.append("|------|------|------|------|------|----------|------|")
+    for run in shown:
+        idle = f"{run['idle_minutes']:.0f} 分钟" if run["idle_minutes"] is not None else "-"
+        lines.append(
+            f"| {RUN_STATUS[run['status']]} | {run['model']} | {run['env']} | {run['method']} | "
+            f"{run['lines']}/{run['expected_lines']} | {run['last_record'] or '-'} | {idle} |"
+        )
+    return "\n".join(lines)
+
+
+def cell_state(method_result: dict) -> str:
+    """
+    单个 cell 的状态:
+    ok / method_missing / csv_missing / lines:<实际>/<期望> / inconsistent
+    """
+    if not method_result["exists"]:
+        return "method_missing"
+    if not method_result["csv_exists"]:
+        return "csv_missing"
+    if not method_result["csv_ok"]:
+        return f"lines:{method_result['csv_lines']}/{method_result['expected_lines']}"
+    if method_result["consistency_issues"]:
+        return "inconsistent"
+    return "ok"
+
+
+def cell_states(results: dict) -> dict:
+    """{"模型/环境/方法": 状态}，按 MODELS / ENVIRONMENTS / METHODS 顺序"""
+    states = {}
+    for model_name in MODELS:
+        result = results[model_name]
+        for env in ENVIRONMENTS:
+            env_result = result["environments"].get(env)
+            for method in METHODS:
+                key = f"{model_name}/{env}/{method}"
+                if not result["exists"]:
+                    states[key] = "model_missing"
+                elif not env_result["exists"]:
+                    states[key] = "env_missing"
+                else:
+                    states[key] = cell_state(env_result["methods"][method])
+    return states
+
+
+def diff_states(old: dict, new: dict) -> dict:
+    """
+    比较两次运行的 cell 状态。
+    broken: 原来 ok，现在不是 ok（回退）
+    fixed: 原来存在但不完整，现在 ok
+    added: 原来不存在（或不在上一次的检查范围内），现在存在
+    """
+    changes = {"broken": [], "fixed": [], "added": []}
+    for key, state in new.items():
+        previous = old.get(key, "method_missing")
+        if previous == state:
+            continue
+        if previous == "ok":
+            changes["broken"].append((key, previous, state))
+        elif previous in MISSING_STATES:
+            if state not in MISSING_STATES:
+                changes["added"].append((key, previous, state))
+        elif state == "ok":
+            changes["fixed"].append((key, previous, state))
+    return changes
+
+
+def format_changes(changes: dict, since: dict) -> str:
+    """--since 的输出"""
+    lines = [f"与 {since['timestamp']} 的运行相比:"]
+    titles = {"broken": "❌ 新坏掉", "fixed": "✅ 新修好", "added": "🆕 新出现"}
+    for kind, title in titles.items():
+        lines.append(f"{title}: {len(changes[kind])}")
+        for key, previous, state in changes[kind]:
+            lines.append(f"  {key}: {previous} -> {state}")
+    return "\n".join(lines)
+
+
+def load_history() -> list:
+    """历史运行列表（旧的在前）；文件不存在或格式不对时为空"""
+    if not HISTORY_FILE.exists():
+        return []
+    try:
+        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
+            history = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return []
+    if history.get("version") != HISTORY_VERSION:
+        return []
+    return history["runs"]
+
+
+def save_history(runs: list):
+    tmp_path = HISTORY_FILE.with_name(f".{HISTORY_FILE.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": HISTORY_VERSION, "runs": runs[-HISTORY_LIMIT:]}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, HISTORY_FILE)
+    except OSError as e:
+        print(f"  写入运行历史 {HISTORY_FILE} 失败: {e}")
+
+
+def find_run(runs: list, since: str) -> dict | None:
+    """"last" 为最近一次运行，否则按时间戳前缀查找（最近的优先）"""
+    if since == "last":
+        return runs[-1] if runs else None
+    for run in reversed(runs):
+        if run["timestamp"].startswith(since):
+            return run
+    return None
+
+
+def write_json_report(results: dict, states: dict):
+    """结构化结果: 完整的检查结果和每个 cell 的状态"""
+    report = {
+        "timestamp": TIMESTAMP,
+        "base_dir": str(BASE_DIR),
+        "cells": states,
+        "results": results,
+    }
+    tmp_path = JSON_OUTPUT_FILE.with_name(f".{JSON_OUTPUT_FILE.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, JSON_OUTPUT_FILE)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="检查实验结果完整性")
+    parser.add_argument("--since", default=None,
+                        help="只打印与某次运行相比的变化（last 或该次运行的时间戳前缀），不写报告文件")
+    subparsers = parser.add_subparsers(dest="command")
+    status_parser = subparsers.add_parser("status", help="列出运行中和停滞的运行")
+    status_parser.add_argument("--stale-minutes", type=float, default=STALE_MINUTES,
+                               help="超过多少分钟没有新记录视为停滞")
+    status_parser.add_argument("--all", action="store_true", help="同时列出已完成和未开始的运行")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        runs = collect_run_status(args.stale_minutes)
+        print(format_status(runs, args.all))
+        return 1 if any(run["status"] == "stalled" for run in runs) else 0
+
     print("🔍 开始检查实验结果完整性...")
     
-    results = {}
-    for model_name, (model_prefix, model_variants) in MODELS.items():
-        print(f"  检查 {model_name}...")
-        results[model_name] = check_model(model_name, model_prefix, model_variants)
+    results = check_all_models()
+    states = cell_states(results)
+    
+    runs = load_history()
+    previous = find_run(runs, args.since) if args.since else (runs[-1] if runs else None)
+    if args.since and previous is None:
+        print(f"\n⚠️ 运行历史中没有 {args.since} 对应的记录，只记录本次结果")
+    changes = diff_states(previous["cells"], states) if previous else None
     
-    report = generate_report(results)
+    runs.append({"timestamp": TIMESTAMP, "cells": states})
+    save_history(runs)
     
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        f.write(report)
+    if args.since:
+        if changes is not None:
+            print()
+            print(format_changes(changes, previous))
+    else:
+        report = generate_report(results)
+        
+        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+            f.write(report)
+        write_json_report(results, states)
+        
+        print(f"\n✅ 报告已生成: {OUTPUT_FILE}")
+        print(f"   结构化结果: {JSON_OUTPUT_FILE}")
+        if changes and changes["broken"]:
+            print(f"   ❌ 与上一次运行相比有 {len(changes['broken'])} 个 cell 回退（--since last 查看）")
     
-    print(f"\n✅ 报告已生成: {OUTPUT_FILE}")
+    # 有回退时非零退出
+    return 1 if changes and changes["broken"] else 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
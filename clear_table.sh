@@ -1,6 +1,6 @@
 #!/bin/bash
 # 清理所有 table*.csv 文件
-rm -f table*.csv
+rm -f table*.csv table*.csv.provenance.json table*.tex table*.md table*.json table*.xlsx
 echo "已清理所有 table*.csv 文件"
 
 rm -f integrity_report_*.md
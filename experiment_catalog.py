@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+实验目录树的共享目录（catalog）。
+
+TreeCatalog 对每个目录只 scandir 一次，之后的 exists / is_dir / iterdir / stat
+都从内存中的目录列表回答，不再逐个访问文件系统；目录项顺序与 Path.iterdir() 一致，
+因此按"第一个匹配的文件夹"查找的结果不变。多个线程可以共享同一个 TreeCatalog。
+
+RowCountCache 把每个文件的行数按 (size, mtime_ns) 缓存在 <BASE_DIR>/.row_counts.json，
+文件没变时不再读取内容。
+
+read_last_timestamp 只读取文件末尾的一小段，取最后一条记录的时间戳。
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+ROW_COUNTS_FILE_NAME = ".row_counts.json"
+ROW_COUNTS_VERSION = 1
+
+# explorer_summary.csv 记录开头的时间戳，如 2026-01-09_21:33:53,
+RECORD_TIMESTAMP_PATTERN = re.compile(rb"^(\d{4}-\d{2}-\d{2}_\d{2}:\d{2}:\d{2}),", re.MULTILINE)
+TAIL_BYTES = 64 * 1024
+
+
+class EntryInfo(NamedTuple):
+    """目录项信息"""
+    is_dir: bool
+    size: int
+    mtime_ns: int
+
+
+class TreeCatalog:
+    """目录树的快照，每个目录只列一次"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def entries(self, path: Path) -> dict:
+        """目录下的 {名称: EntryInfo}，按 scandir 顺序；目录不存在时为空"""
+        key = str(path)
+        listing = self._listings.get(key)
+        if listing is not None:
+            return listing
+
+        listing = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                        stat = entry.stat()
+                        listing[entry.name] = EntryInfo(is_dir, stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            pass
+        with self._lock:
+            self._listings[key] = listing
+        return listing
+
+    def info(self, path: Path) -> EntryInfo | None:
+        """路径的目录项信息，不存在时返回 None"""
+        return self.entries(path.parent).get(path.name)
+
+    def exists(self, path: Path) -> bool:
+        if path == self.root:
+            return path.exists()
+        return self.info(path) is not None
+
+    def is_dir(self, path: Path) -> bool:
+        info = self.info(path)
+        return info is not None and info.is_dir
+
+    def iterdir(self, path: Path) -> list:
+        """与 Path.iterdir() 相同顺序的子路径列表"""
+        return [path / name for name in self.entries(path)]
+
+
+def count_lines(path: Path) -> int:
+    """文件的行数（与逐行迭代文本文件的计数一致）"""
+    with open(path, 'r') as f:
+        return sum(1 for _ in f)
+
+
+def read_last_timestamp(path: Path, tail_bytes: int = TAIL_BYTES) -> datetime | None:
+    """
+    文件中最后一条记录的时间戳，只读取末尾 tail_bytes 字节；
+    末尾没有记录开头（如单条记录超过 tail_bytes）时扩大读取范围，没有记录时返回 None。
+    """
+    try:
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            while True:
+                start = max(size - tail_bytes, 0)
+                f.seek(start)
+                matches = RECORD_TIMESTAMP_PATTERN.findall(f.read(size - start))
+                if matches or start == 0:
+                    break
+                tail_bytes *= 4
+    except OSError:
+        return None
+    if not matches:
+        return None
+    return datetime.strptime(matches[-1].decode("ascii"), "%Y-%m-%d_%H:%M:%S")
+
+
+class RowCountCache:
+    """按 (size, mtime_ns) 缓存的文件行数"""
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self.counts = self._load()
+        self.changed = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if cache.get("version") != ROW_COUNTS_VERSION:
+            return {}
+        return cache["counts"]
+
+    def get(self, path: Path, info: EntryInfo) -> int:
+        """文件行数；size 和 mtime 没变时直接返回缓存"""
+        key = str(path)
+        cached = self.counts.get(key)
+        if cached is not None and cached[0] == info.size and cached[1] == info.mtime_ns:
+            with self._lock:
+                self.hits += 1
+            return cached[2]
+
+        lines = count_lines(path)
+        with self._lock:
+            self.counts[key] = [info.size, info.mtime_ns, lines]
+            self.changed = True
+            self.misses += 1
+        return lines
+
+    def save(self):
+        """有新的计数时写回缓存"""
+        if not self.changed:
+            return
+        tmp_path = self.cache_path.with_name(f".{self.cache_path.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": ROW_COUNTS_VERSION, "counts": self.counts}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"  写入行数缓存 {self.cache_path} 失败: {e}")
@@ -1,75 +1,162 @@
 #!/usr/bin/env python3
 """
 一次性提取所有 explorer_summary.csv 的最后一列，每 20 个为一行输出到文件。
+
+- 多个文件并行解析；每个文件只解码最后一列（分数），不做完整的 CSV 解析
+- 各文件的段落按路径顺序流式写出，输出内容与文件顺序确定，不依赖并行调度
+- 汇总部分先写入临时文件，最后追加到输出末尾，不在内存中累积
+- 输出文件名以 .gz 结尾或使用 --gzip 时写 gzip 压缩输出
+- --summary-only 只输出每组的个数和平均值，不输出原始分数
+
+用法:
+    python extract_scores.py [base_dir] [-o scores_output.txt] [--gzip] [--summary-only] [-j 8]
 """
 
-import csv
+import argparse
+import gzip
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from summary_index import update_index, get_record_span
+
+
+def read_score_column(csv_path: Path) -> list:
+    """
+    只解码每条记录最后一列的原始字符串（与 csv.reader 取 row[-1] 一致）。
+    记录边界来自偏移索引（见 summary_index.py，引号内的换行不算记录结束）；
+    分数是最后一列且不含逗号，因此直接取记录中最后一个逗号之后的部分。
+    """
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    index = update_index(csv_path, data)
+
+    spans = [get_record_span(index, i) for i in range(len(index["offsets"]))]
+    # 索引只包含以换行结尾的完整记录；末尾正在写入的记录也计入，与 csv.reader 一致
+    if data[index["indexed_size"]:].strip():
+        spans.append((index["indexed_size"], len(data)))
+
+    values = []
+    for start, end in spans:
+        record = data[start:end].rstrip(b"\r\n")
+        field = record[record.rfind(b",") + 1:].strip()
+        if len(field) >= 2 and field[:1] == b'"' and field[-1:] == b'"':
+            field = field[1:-1].replace(b'""', b'"')
+        values.append(field.decode("utf-8"))
+    return values
+
+
+def format_section(csv_path: Path, items_per_row: int, summary_only: bool) -> tuple:
+    """
+    解析一个文件并排好它在输出中的段落。
+    返回 (段落文本, 汇总文本)。
+    """
+    try:
+        values = read_score_column(csv_path)
+    except (OSError, UnicodeDecodeError) as e:
+        path_line = f"【{csv_path}】 读取失败: {e}"
+        return f"\n{path_line}\n" + "-" * 60 + "\n", f"{path_line}\n"
+
+    path_line = f"【{csv_path}】 共 {len(values)} 条"
+    section = [f"\n{path_line}\n", "-" * 60 + "\n"]
+    summary = [f"{path_line}\n"]
+
+    # 按 items_per_row 分组输出
+    for i in range(0, len(values), items_per_row):
+        chunk = values[i:i + items_per_row]
+        # 计算个数和平均值（无法解析的值不参与平均）
+        numeric_values = []
+        for v in chunk:
+            try:
+                numeric_values.append(float(v))
+            except ValueError:
+                pass
+        count = len(chunk)
+        avg = sum(numeric_values) / len(numeric_values) if numeric_values else 0
+        avg_line = f"[{count}个, 平均: {avg:.4f}]"
+        summary.append(f"{avg_line}\n")
+        section.append(f"{avg_line}\n")
+        if not summary_only:
+            section.append(", ".join(chunk) + "\n")
+
+    return "".join(section), "".join(summary)
+
+
+def _format_section_job(job: tuple) -> tuple:
+    return format_section(*job)
+
 
-def extract_all_scores(base_dir: str = ".", items_per_row: int = 20, output_file: str = "scores_output.txt") -> None:
+def open_output(output_path: Path, use_gzip: bool):
+    """打开输出文件，gzip 时写压缩文本"""
+    if use_gzip:
+        return gzip.open(output_path, "wt", encoding="utf-8")
+    return open(output_path, "w", encoding="utf-8")
+
+
+def extract_all_scores(
+    base_dir: str = ".",
+    items_per_row: int = 20,
+    output_file: str = "scores_output.txt",
+    use_gzip: bool = False,
+    summary_only: bool = False,
+    jobs: int | None = None,
+) -> None:
     """遍历所有子目录，提取 explorer_summary.csv 的最后一列，输出到文件。"""
     base_path = Path(base_dir)
-    
+
     # 查找所有 explorer_summary.csv 文件
     csv_files = sorted(base_path.glob("**/explorer_summary.csv"))
-    
+
     if not csv_files:
         print("未找到任何 explorer_summary.csv 文件")
         return
-    
+
+    if use_gzip and not output_file.endswith(".gz"):
+        output_file += ".gz"
+    use_gzip = use_gzip or output_file.endswith(".gz")
     output_path = base_path / output_file
-    
-    with open(output_path, "w", encoding="utf-8") as out:
+
+    tasks = [(csv_path, items_per_row, summary_only) for csv_path in csv_files]
+    max_workers = min(jobs or os.cpu_count() or 1, len(csv_files))
+
+    with open_output(output_path, use_gzip) as out, tempfile.TemporaryFile("w+", encoding="utf-8") as summary_spool:
         out.write(f"找到 {len(csv_files)} 个 CSV 文件\n\n")
         out.write("=" * 80 + "\n")
-        
-        # 收集路径行和对应的平均值行
-        summary_items = []  # [(path_line, [avg_lines]), ...]
-        
-        for csv_path in csv_files:
-            values = []
-            with open(csv_path, "r", encoding="utf-8") as f:
-                reader = csv.reader(f)
-                next(reader, None)  # 跳过标题行
-                for row in reader:
-                    if row:
-                        values.append(row[-1])
-            
-            path_line = f"【{csv_path}】 共 {len(values)} 条"
-            out.write(f"\n{path_line}\n")
-            out.write("-" * 60 + "\n")
-            
-            current_avg_lines = []
-            # 按 items_per_row 分组输出
-            for i in range(0, len(values), items_per_row):
-                chunk = values[i:i + items_per_row]
-                # 计算个数和平均值
-                numeric_values = [float(v) for v in chunk]
-                count = len(numeric_values)
-                avg = sum(numeric_values) / count if count > 0 else 0
-                avg_line = f"[{count}个, 平均: {avg:.4f}]"
-                current_avg_lines.append(avg_line)
-                out.write(f"{avg_line}\n")
-                out.write(", ".join(chunk) + "\n")
-            
-            summary_items.append((path_line, current_avg_lines))
-        
+
+        # executor.map 按提交顺序返回结果，段落顺序与文件顺序一致
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for section, summary in executor.map(_format_section_job, tasks, chunksize=4):
+                out.write(section)
+                summary_spool.write(summary)
+
         # 最后汇总 - 保持原顺序
         out.write("\n" + "=" * 80 + "\n")
         out.write("【汇总】\n")
         out.write("-" * 60 + "\n")
-        for path_line, avg_lines in summary_items:
-            out.write(f"{path_line}\n")
-            for avg_line in avg_lines:
-                out.write(f"{avg_line}\n")
-        
+        summary_spool.seek(0)
+        for line in summary_spool:
+            out.write(line)
+
         out.write("\n" + "=" * 80 + "\n")
         out.write("提取完成!\n")
-    
+
     print(f"结果已输出到: {output_path}")
 
 
+def main():
+    parser = argparse.ArgumentParser(description="提取所有 explorer_summary.csv 的分数")
+    parser.add_argument("base_dir", nargs="?", default="./", help="搜索的根目录（默认当前目录）")
+    parser.add_argument("-o", "--output", default="scores_output.txt", help="输出文件名（相对于 base_dir）")
+    parser.add_argument("--items-per-row", type=int, default=20, help="每行输出的分数个数")
+    parser.add_argument("--gzip", action="store_true", help="写 gzip 压缩输出（文件名自动加 .gz）")
+    parser.add_argument("--summary-only", action="store_true", help="只输出每组的个数和平均值，不输出原始分数")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="并行进程数（默认 CPU 核数）")
+    args = parser.parse_args()
+
+    extract_all_scores(args.base_dir, args.items_per_row, args.output, args.gzip, args.summary_only, args.jobs)
+
+
 if __name__ == "__main__":
     # 在 global_verifier 目录下运行
-    extract_all_scores("./", items_per_row=20, output_file="scores_output.txt")
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Cross-process rate limiter for API-backed runs.
+
+All processes on one machine share a SQLite database (default
+`~/.cache/global_verifier/api_rate_limiter.sqlite`, override with
+`$API_RATE_LIMITER_DB` or `--rate-limit-db`). For every `<provider>/<model>`
+key it holds:
+
+- a token bucket refilled at `rpm / 60` tokens per second (burst = `burst`),
+  so the aggregate request rate of all runs stays under the quota;
+- a concurrency governor: at most `max_concurrent` requests in flight, tracked as
+  leases that expire after LEASE_SECONDS so a crashed process cannot hold a slot;
+- a shared cooldown: when any process gets a 429, every process waits out the
+  provider's Retry-After instead of retrying on its own.
+
+`install_openai_hook()` wraps `openai` chat completion calls (the client the
+Explorer API backends use) so every request goes through the limiter. Other
+clients can use `RateLimiter.request()` as a context manager directly.
+
+Status of all keys:
+    python api_rate_limiter.py [--db PATH]
+"""
+
+import argparse
+import contextlib
+import functools
+import os
+import sqlite3
+import time
+import uuid
+from typing import Optional
+
+DEFAULT_DB_PATH = os.path.join("~", ".cache", "global_verifier", "api_rate_limiter.sqlite")
+DB_ENV_VAR = "API_RATE_LIMITER_DB"
+
+DEFAULT_RPM = 60.0
+DEFAULT_BURST = 5.0
+DEFAULT_MAX_CONCURRENT = 4
+
+LEASE_SECONDS = 300.0
+DEFAULT_COOLDOWN_SECONDS = 10.0
+MAX_SLEEP_SECONDS = 5.0
+
+# Substring of the model name -> provider (first match wins).
+PROVIDERS = [
+    ("deepseek", "deepseek"),
+    ("grok", "xai"),
+    ("gpt", "openai"),
+    ("o1", "openai"),
+    ("o3", "openai"),
+    ("qwen", "qwen"),
+    ("llama", "llama"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    cooldown_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS leases (
+    id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_key ON leases (key);
+"""
+
+
+def provider_for(model_name: str) -> str:
+    name = model_name.lower()
+    for pattern, provider in PROVIDERS:
+        if pattern in name:
+            return provider
+    return "default"
+
+
+def default_db_path() -> str:
+    return os.path.expanduser(os.environ.get(DB_ENV_VAR) or DEFAULT_DB_PATH)
+
+
+class RateLimiter:
+    """Token bucket + concurrency leases for one provider/model key, shared through SQLite."""
+
+    def __init__(
+        self,
+        model_name: str,
+        rpm: float = DEFAULT_RPM,
+        burst: float = DEFAULT_BURST,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+        db_path: Optional[str] = None,
+    ):
+        self.key = f"{provider_for(model_name)}/{model_name}"
+        self.rate = rpm / 60.0
+        self.burst = max(burst, 1.0)
+        self.max_concurrent = max_concurrent
+        self.db_path = db_path or default_db_path()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.waited = 0.0
+        self.requests = 0
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=60.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Exclusive write transaction (serializes all processes on the database)."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _try_acquire(self) -> tuple:
+        """One attempt: returns (lease id or None, seconds to wait before retrying)."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT tokens, updated, cooldown_until FROM buckets WHERE key = ?", (self.key,)
+            ).fetchone()
+            tokens, updated, cooldown_until = row if row else (self.burst, now, 0.0)
+            tokens = min(self.burst, tokens + max(now - updated, 0.0) * self.rate)
+
+            conn.execute("DELETE FROM leases WHERE key = ? AND expires < ?", (self.key, now))
+            (in_flight,) = conn.execute("SELECT COUNT(*) FROM leases WHERE key = ?", (self.key,)).fetchone()
+
+            wait = 0.0
+            if cooldown_until > now:
+                wait = cooldown_until - now
+            elif tokens < 1.0:
+                wait = (1.0 - tokens) / self.rate if self.rate > 0 else MAX_SLEEP_SECONDS
+            elif self.max_concurrent > 0 and in_flight >= self.max_concurrent:
+                wait = 0.2
+
+            lease = None
+            if wait == 0.0:
+                tokens -= 1.0
+                lease = uuid.uuid4().hex
+                conn.execute("INSERT INTO leases (id, key, expires) VALUES (?, ?, ?)",
+                             (lease, self.key, now + LEASE_SECONDS))
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated, cooldown_until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (self.key, tokens, now, cooldown_until),
+            )
+        return lease, wait
+
+    def acquire(self) -> str:
+        """Block until a token and a concurrency slot are available; returns the lease id."""
+        start = time.time()
+        while True:
+            lease, wait = self._try_acquire()
+            if lease is not None:
+                self.waited += time.time() - start
+                self.requests += 1
+                return lease
+            time.sleep(min(wait, MAX_SLEEP_SECONDS))
+
+    def release(self, lease: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE id = ?", (lease,))
+
+    def cool_down(self, seconds: float):
+        """Make every process wait `seconds` before the next request (after a 429)."""
+        until = time.time() + seconds
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated, cooldown_until) VALUES (?, 0, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET cooldown_until = MAX(cooldown_until, excluded.cooldown_until)",
+                (self.key, time.time(), until),
+            )
+
+    @contextlib.contextmanager
+    def request(self):
+        """`with limiter.request(): client.call(...)`"""
+        lease = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(lease)
+
+
+def retry_after_seconds(error: Exception) -> float:
+    """Retry-After of a 429 response, or DEFAULT_COOLDOWN_SECONDS."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", DEFAULT_COOLDOWN_SECONDS))
+    except (TypeError, ValueError):
+        return DEFAULT_COOLDOWN_SECONDS
+
+
+def install_openai_hook(limiter: RateLimiter) -> bool:
+    """Route every openai chat completion call through `limiter`; False if openai is not installed."""
+    try:
+        from openai.resources.chat.completions import Completions
+    except ImportError:
+        return False
+    if getattr(Completions.create, "_rate_limited", False):
+        return True
+    original = Completions.create
+
+    @functools.wraps(original)
+    def create(self, *args, **kwargs):
+        with limiter.request():
+            try:
+                return original(self, *args, **kwargs)
+            except Exception as e:
+                if type(e).__name__ == "RateLimitError" or getattr(e, "status_code", None) == 429:
+                    limiter.cool_down(retry_after_seconds(e))
+                raise
+
+    create._rate_limited = True
+    Completions.create = create
+    return True
+
+
+def add_rate_limit_args(p: argparse.ArgumentParser):
+    """Flags shared by the runner CLIs."""
+    p.add_argument("--rate-limit-rpm", type=float, default=DEFAULT_RPM,
+                   help="Requests per minute shared by all runs of the same provider/model (0 disables).")
+    p.add_argument("--rate-limit-burst", type=float, default=DEFAULT_BURST)
+    p.add_argument("--max-concurrent-requests", type=int, default=DEFAULT_MAX_CONCURRENT,
+                   help="In-flight requests allowed across all runs of the same provider/model (0 = unlimited).")
+    p.add_argument("--rate-limit-db", type=str, default=None,
+                   help=f"SQLite coordinator file (default: ${DB_ENV_VAR} or {DEFAULT_DB_PATH}).")
+
+
+def setup_from_args(args: argparse.Namespace) -> Optional[RateLimiter]:
+    """Install the limiter for an API-backed run; None when disabled or not applicable."""
+    if not args.use_api or args.rate_limit_rpm <= 0:
+        return None
+    limiter = RateLimiter(args.model_name, args.rate_limit_rpm, args.rate_limit_burst,
+                          args.max_concurrent_requests, args.rate_limit_db)
+    if install_openai_hook(limiter):
+        print(f"[rate-limit] {limiter.key}: {args.rate_limit_rpm:g} rpm, "
+              f"{args.max_concurrent_requests or 'unlimited'} concurrent ({limiter.db_path})")
+    else:
+        print("[rate-limit] openai is not installed; requests are not rate limited")
+    return limiter
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Show the state of the shared API rate limiter.")
+    p.add_argument("--db", default=None, help=f"SQLite coordinator file (default: {DEFAULT_DB_PATH}).")
+    args = p.parse_args()
+    db_path = args.db or default_db_path()
+    if not os.path.exists(db_path):
+        print(f"{db_path} does not exist yet")
+        return 0
+    now = time.time()
+    conn = sqlite3.connect(db_path, timeout=60.0)
+    leases = dict(conn.execute(
+        "SELECT key, COUNT(*) FROM leases WHERE expires >= ? GROUP BY key", (now,)).fetchall())
+    print(f"{'key':40s} {'tokens':>8s} {'in flight':>9s} {'cooldown':>9s}")
+    for key, tokens, updated, cooldown_until in conn.execute(
+            "SELECT key, tokens, updated, cooldown_until FROM buckets ORDER BY key"):
+        cooldown = max(cooldown_until - now, 0.0)
+        print(f"{key:40s} {tokens:8.2f} {leases.get(key, 0):9d} {cooldown:8.1f}s")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
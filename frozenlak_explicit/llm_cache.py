@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Disk-backed, content-addressed cache of LLM responses for the runner CLIs.
+
+Every chat completion request is keyed by sha256 of its canonical JSON form
+(model, messages and all sampling parameters, see IGNORED_PARAMS) and the
+response is stored in a SQLite file, so repeated prompts - e.g. the first
+episode of every `vanilla_False_False` run on the same map - and whole reruns
+can be served from disk.
+
+Modes (`--llm-cache-mode`):
+- off:       no caching
+- read:      serve hits from the cache, misses go to the API and are not stored
+- write:     always call the API, store every response
+- readwrite: serve hits, store misses
+
+Only deterministic requests (temperature=0) are read from or stored in the
+cache; sampled requests always go to the API, since serving the first recorded
+sample for every repeat would collapse the sampling. `--llm-cache-deterministic`
+forces temperature=0, top_p=1 and a fixed seed on every request, so all of them
+become cacheable.
+
+`install_openai_hook()` wraps `openai` chat completion calls; it is installed
+after the rate limiter so cache hits never consume API quota. Streaming
+requests bypass the cache.
+
+Stats of a cache file:
+    python llm_cache.py PATH
+"""
+
+import argparse
+import functools
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Optional
+
+MODES = ["off", "read", "write", "readwrite"]
+
+# Request parameters that do not change the response.
+IGNORED_PARAMS = {"timeout", "extra_headers", "extra_query", "user", "stream_options"}
+
+# Values forced by --llm-cache-deterministic.
+DETERMINISTIC_PARAMS = {"temperature": 0.0, "top_p": 1.0, "seed": 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    request TEXT NOT NULL,
+    response_type TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def request_key(params: dict) -> str:
+    """sha256 of the canonical JSON of the request parameters."""
+    canonical = {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+    text = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def dump_response(response: Any) -> tuple:
+    """Response -> (type path, JSON text); pydantic models (openai types) keep their class."""
+    if hasattr(response, "model_dump_json"):
+        cls = type(response)
+        return f"{cls.__module__}:{cls.__qualname__}", response.model_dump_json()
+    return "json", json.dumps(response, ensure_ascii=False)
+
+
+def load_response(response_type: str, text: str) -> Any:
+    if response_type == "json":
+        return json.loads(text)
+    module_name, _, qualname = response_type.partition(":")
+    cls = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        cls = getattr(cls, part)
+    return cls.model_validate_json(text)
+
+
+class LLMCache:
+    """SQLite response cache; one connection per call so it is safe across processes."""
+
+    def __init__(self, path: str, mode: str = "readwrite", deterministic: bool = False):
+        if mode not in MODES:
+            raise ValueError(f"unknown cache mode {mode!r}, expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.deterministic = deterministic
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.sampled = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @property
+    def reads(self) -> bool:
+        return self.mode in ("read", "readwrite")
+
+    @property
+    def writes(self) -> bool:
+        return self.mode in ("write", "readwrite")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def prepare(self, params: dict) -> dict:
+        """Request parameters as sent (with the deterministic overrides when enabled)."""
+        if self.deterministic:
+            params = {**params, **DETERMINISTIC_PARAMS}
+        return params
+
+    @staticmethod
+    def cacheable(params: dict) -> bool:
+        """Deterministic, non-streaming requests only."""
+        return not params.get("stream") and params.get("temperature") == 0
+
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT response_type, response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET hits = hits + 1 WHERE key = ?", (key,))
+        finally:
+            conn.close()
+        return load_response(*row)
+
+    def put(self, key: str, params: dict, response: Any):
+        response_type, text = dump_response(response)
+        request = json.dumps({k: v for k, v in params.items() if k not in IGNORED_PARAMS},
+                             sort_keys=True, ensure_ascii=False, default=str)
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, request, response_type, response, created) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, str(params.get("model", "")), request, response_type, text, time.time()),
+            )
+        finally:
+            conn.close()
+        self.stored += 1
+
+    def call(self, create, params: dict) -> Any:
+        """Serve `create(**params)` from the cache according to the mode."""
+        params = self.prepare(params)
+        if not self.cacheable(params):
+            self.sampled += 1
+            return create(**params)
+        key = request_key(params)
+        if self.reads:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+        response = create(**params)
+        if self.writes:
+            self.put(key, params, response)
+        return response
+
+    def summary(self) -> str:
+        return (f"[llm-cache] {self.hits} hits, {self.misses} misses, {self.stored} stored, "
+                f"{self.sampled} sampled requests not cached ({self.path}, {self.mode})")
+
+
+def install_openai_hook(cache: LLMCache) -> bool:
+    """Route openai chat completion calls through `cache`; False if openai is not installed."""
+    try:
+        from openai.resources.chat.completions import Completions
+    except ImportError:
+        return False
+    original = Completions.create
+
+    @functools.wraps(original)
+    def create(self, **kwargs):
+        return cache.call(functools.partial(original, self), kwargs)
+
+    Completions.create = create
+    return True
+
+
+def add_cache_args(p: argparse.ArgumentParser):
+    """Flags shared by the runner CLIs."""
+    p.add_argument("--llm-cache", type=str, default=None, help="SQLite file of cached LLM responses.")
+    p.add_argument("--llm-cache-mode", choices=MODES, default="readwrite",
+                   help="How --llm-cache is used (default: readwrite; ignored without --llm-cache).")
+    p.add_argument("--llm-cache-deterministic", action="store_true",
+                   help="Force temperature=0, top_p=1 and a fixed seed so every request is cacheable "
+                        "(otherwise only requests already sent with temperature=0 are cached).")
+
+
+def setup_from_args(args: argparse.Namespace) -> Optional[LLMCache]:
+    """Install the cache for this run; None when disabled."""
+    if not args.llm_cache or args.llm_cache_mode == "off":
+        return None
+    cache = LLMCache(args.llm_cache, args.llm_cache_mode, args.llm_cache_deterministic)
+    if not install_openai_hook(cache):
+        print("[llm-cache] openai is not installed; responses are not cached")
+        return None
+    print(f"[llm-cache] {cache.path} ({cache.mode}{', deterministic' if cache.deterministic else ''})")
+    return cache
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Show statistics of an LLM response cache file.")
+    p.add_argument("path")
+    args = p.parse_args()
+    if not os.path.exists(args.path):
+        print(f"{args.path} does not exist")
+        return 1
+    conn = sqlite3.connect(args.path, timeout=60.0)
+    print(f"{'model':40s} {'responses':>10s} {'hits':>8s}")
+    for model, count, hits in conn.execute(
+            "SELECT model, COUNT(*), SUM(hits) FROM responses GROUP BY model ORDER BY model"):
+        print(f"{model:40s} {count:10d} {hits or 0:8d}")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Offline "model" that answers by replaying recorded actions.
+
+Selected in the runner CLIs with `--use-api replay:<path>`, where <path> is an
+explorer_summary.csv or a run folder containing `log/explorer_summary.csv`.
+Recorded episodes are matched by model name (all rows if the model never
+appears in the file), env, map (parsed from `instruction`) and episode index
+within that map. The runner calls `start_episode()` before every episode; each
+decision request of that episode is then answered with the next recorded
+action, formatted with `--replay-template`.
+
+Explorer is not part of this repo, so the backend plugs in below it: the
+openai chat completion call is replaced by the replay (no network, no API key
+needed). Requests whose last message does not match `--replay-decision-pattern`
+(verifier checks, memory reflection, ...) get `--replay-other-response`.
+
+Replayed runs write their logs, storage, manifest and finish mark under
+DEFAULT_OUTPUT_ROOT unless `--output-root` is given, so they never land next to
+the real results; the runners refuse to run when the output summary would be
+the replay source itself.
+
+With no model latency left, episode wall time is the harness overhead (memory
+retrieval, verifier, logging); the runner prints it per episode. For a profile:
+    python -m cProfile -o harness.prof run_frozenlake_cli_v0.py --use-api replay:<path> ...
+"""
+
+import ast
+import csv
+import json
+import os
+import re
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+REPLAY_PREFIX = "replay:"
+DEFAULT_TEMPLATE = "{action}"
+DEFAULT_DECISION_PATTERN = r"(?i)\baction"
+DEFAULT_OTHER_RESPONSE = ""
+# --output-root of replayed runs when none is given (scratch, relative to the cwd).
+DEFAULT_OUTPUT_ROOT = "replay_runs"
+
+MapKey = Tuple[str, ...]
+
+
+def parse_replay_path(use_api: str) -> Optional[str]:
+    """'replay:<path>' -> path, anything else -> None."""
+    if isinstance(use_api, str) and use_api.startswith(REPLAY_PREFIX):
+        return use_api[len(REPLAY_PREFIX):]
+    return None
+
+
+def summary_path(path: str) -> str:
+    for candidate in (path, os.path.join(path, "explorer_summary.csv"),
+                      os.path.join(path, "log", "explorer_summary.csv")):
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"no explorer_summary.csv at {path}")
+
+
+def replays_into(use_api: str, log_dir: str) -> bool:
+    """True when a run logging to `log_dir` would append to the summary it replays."""
+    path = parse_replay_path(use_api)
+    if path is None:
+        return False
+    output = os.path.join(log_dir, "explorer_summary.csv")
+    return os.path.realpath(summary_path(path)) == os.path.realpath(output)
+
+
+def map_key_from_instruction(instruction: str) -> MapKey:
+    """'Destinations: [...]; Map: [[...]]' -> map rows."""
+    grid = ast.literal_eval(instruction.split("; Map: ", 1)[1])
+    return tuple("".join(row) for row in grid)
+
+
+def load_episodes(path: str, env_name: str, model_name: str) -> Dict[MapKey, List[List]]:
+    """{map rows: [action list of episode 0, 1, ...]} from a recorded summary."""
+    with open(summary_path(path), "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        rows = [row for row in reader if len(row) == 7 and row[2] == env_name]
+    if any(row[1] == model_name for row in rows):
+        rows = [row for row in rows if row[1] == model_name]
+    episodes = {}
+    for row in rows:
+        try:
+            key = map_key_from_instruction(row[3])
+            actions = json.loads(row[4])
+        except (ValueError, SyntaxError, IndexError):
+            continue
+        episodes.setdefault(key, []).append(list(actions))
+    return episodes
+
+
+class ReplayBackend:
+    """Answers decision requests with the recorded actions of the current episode."""
+
+    def __init__(
+        self,
+        episodes: Dict[MapKey, List[List]],
+        template: str = DEFAULT_TEMPLATE,
+        decision_pattern: str = DEFAULT_DECISION_PATTERN,
+        other_response: str = DEFAULT_OTHER_RESPONSE,
+    ):
+        self.episodes = episodes
+        self.template = template
+        self.decision_pattern = re.compile(decision_pattern)
+        self.other_response = other_response
+        self.actions = []
+        self.step = 0
+        self.decisions = 0
+        self.other_calls = 0
+        self.exhausted = 0
+        self.missing = 0
+
+    def start_episode(self, desc: List[str], episode_idx: int):
+        recorded = self.episodes.get(tuple(desc), [])
+        if episode_idx < len(recorded):
+            self.actions = recorded[episode_idx]
+        else:
+            # Fewer recorded episodes than requested: reuse them cyclically.
+            self.missing += 1
+            self.actions = recorded[episode_idx % len(recorded)] if recorded else []
+        self.step = 0
+
+    def complete(self, messages: list) -> str:
+        prompt = messages[-1].get("content", "") if messages else ""
+        if not isinstance(prompt, str):
+            prompt = str(prompt)
+        if not self.decision_pattern.search(prompt):
+            self.other_calls += 1
+            return self.other_response
+        self.decisions += 1
+        if self.step < len(self.actions):
+            action = self.actions[self.step]
+        else:
+            self.exhausted += 1
+            action = self.actions[-1] if self.actions else 0
+        self.step += 1
+        return self.template.format(action=action)
+
+    def summary(self) -> str:
+        return (f"[replay] {self.decisions} decisions, {self.other_calls} other requests, "
+                f"{self.exhausted} past the recorded path, {self.missing} episodes not recorded")
+
+
+def chat_completion(model: str, content: str):
+    """Minimal openai ChatCompletion carrying `content`."""
+    payload = {
+        "id": f"replay-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(payload)
+
+
+def install_openai_hook(backend: ReplayBackend) -> bool:
+    """Replace openai chat completion calls with the replay; False if openai is not installed."""
+    try:
+        from openai.resources.chat.completions import Completions
+    except ImportError:
+        return False
+
+    def create(self, **kwargs):
+        return chat_completion(str(kwargs.get("model", "replay")), backend.complete(kwargs.get("messages", [])))
+
+    Completions.create = create
+    # The client still insists on a key at construction time.
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    return True
+
+
+def add_replay_args(p):
+    """Flags shared by the runner CLIs (used with --use-api replay:<path>)."""
+    p.add_argument("--replay-template", type=str, default=DEFAULT_TEMPLATE,
+                   help="Response text for a replayed decision; {action} is the recorded action.")
+    p.add_argument("--replay-decision-pattern", type=str, default=DEFAULT_DECISION_PATTERN,
+                   help="Regex on the last prompt message identifying action decisions.")
+    p.add_argument("--replay-other-response", type=str, default=DEFAULT_OTHER_RESPONSE,
+                   help="Response text for all other requests (verifier, memory, ...).")
+
+
+def setup_from_args(args, env_name: str) -> Optional[ReplayBackend]:
+    """Install the replay backend for `--use-api replay:<path>`; None otherwise."""
+    path = parse_replay_path(args.use_api)
+    if path is None:
+        return None
+    episodes = load_episodes(path, env_name, args.model_name)
+    backend = ReplayBackend(episodes, args.replay_template, args.replay_decision_pattern,
+                            args.replay_other_response)
+    if not install_openai_hook(backend):
+        raise RuntimeError("--use-api replay:<path> needs the openai package to stand in for the API backend")
+    print(f"[replay] {sum(len(v) for v in episodes.values())} recorded episodes on {len(episodes)} maps "
+          f"from {summary_path(path)}")
+    return backend
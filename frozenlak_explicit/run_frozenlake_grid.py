@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Parallel grid launcher for `run_frozenlake_cli_v*.py`.
+
+Expands models x METHODS (x scripts) into `--memory-env/--use-memory/
+--use-global-verifier/--model-name` jobs, skips every job whose
+`<output-root>/finish_mark/<cur_name>` already exists, and runs the rest in a
+local pool of `--jobs` concurrent processes. Each job's stdout/stderr goes to
+`<log-dir>/<cur_name>.out` (default `<output-root>/launcher_logs`); progress is printed live (finished jobs plus the
+current `--- map X | episode i/N ---` line of every running job).
+
+Arguments after `--` are passed through to every job unchanged.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from typing import List, NamedTuple, Optional
+
+# (memory_env, use_memory, use_global_verifier) for the 9 table rows;
+# names match the `log_frozenlake_<model>_<method>` folders.
+METHODS = {
+    "generative_True_False": ("generative", True, False),
+    "generative_True_True": ("generative", True, True),
+    "memorybank_True_False": ("memorybank", True, False),
+    "memorybank_True_True": ("memorybank", True, True),
+    "vanilla_False_False": ("vanilla", False, False),
+    "vanilla_True_False": ("vanilla", True, False),
+    "vanilla_True_True": ("vanilla", True, True),
+    "voyager_True_False": ("voyager", True, False),
+    "voyager_True_True": ("voyager", True, True),
+}
+
+ENV_NAME = "frozenlake"
+PROGRESS_MARKER = "--- map "
+PROGRESS_TAIL_BYTES = 4096
+
+
+class Job(NamedTuple):
+    script: str
+    model: str
+    method: str
+    output_root: str
+    cur_name: str
+    command: List[str]
+    log_path: str
+    gpu: Optional[str]
+
+
+def cur_name_for(model: str, method: str) -> str:
+    """Same naming as run_frozenlake_cli_v*.py."""
+    memory_env, use_memory, use_global_verifier = METHODS[method]
+    return f"log_{ENV_NAME}_{model}_{memory_env}_{use_memory}_{use_global_verifier}"
+
+
+def finish_mark_path(output_root: str, cur_name: str) -> str:
+    return os.path.join(output_root, "finish_mark", cur_name)
+
+
+def expand_grid(args: argparse.Namespace, extra: List[str]) -> List[Job]:
+    """One job per (script, model, method), in that order."""
+    gpus = [g for g in args.gpus.split(",") if g] if args.gpus else []
+    jobs = []
+    for script in args.script:
+        version = os.path.splitext(os.path.basename(script))[0].rsplit("_", 1)[-1]
+        for model in args.models.split(","):
+            model = model.strip()
+            if not model:
+                continue
+            output_root = args.output_root.format(model=model, version=version)
+            for method in args.methods.split(","):
+                method = method.strip()
+                memory_env, use_memory, use_global_verifier = METHODS[method]
+                cur_name = cur_name_for(model, method)
+                command = [
+                    args.python, script,
+                    "--model-name", model,
+                    "--memory-env", memory_env,
+                    "--use-memory", str(use_memory),
+                    "--use-global-verifier", str(use_global_verifier),
+                    "--output-root", output_root,
+                ] + extra
+                log_dir = (args.log_dir.format(model=model, version=version) if args.log_dir
+                           else os.path.join(output_root, "launcher_logs"))
+                log_path = os.path.join(log_dir, f"{cur_name}.out")
+                gpu = gpus[len(jobs) % len(gpus)] if gpus else None
+                jobs.append(Job(script, model, method, output_root, cur_name, command, log_path, gpu))
+    return jobs
+
+
+def read_progress(log_path: str) -> str:
+    """Last `--- map X | episode i/N ---` line of a job log, or ''."""
+    try:
+        with open(log_path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - PROGRESS_TAIL_BYTES, 0))
+            tail = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+    for line in reversed(tail.splitlines()):
+        if line.startswith(PROGRESS_MARKER):
+            return line.strip("- ").strip()
+    return ""
+
+
+class Launcher:
+    """Runs jobs with bounded concurrency and tracks the running processes."""
+
+    def __init__(self, jobs: List[Job], concurrency: int):
+        self.jobs = jobs
+        self.concurrency = concurrency
+        self.running = {}  # log path -> (job, Popen, start time)
+        self.lock = threading.Lock()
+        self.stopping = False
+
+    def run_job(self, job: Job) -> int:
+        if self.stopping:
+            return -1
+        os.makedirs(os.path.dirname(job.log_path) or ".", exist_ok=True)
+        env = dict(os.environ)
+        if job.gpu is not None:
+            env["CUDA_VISIBLE_DEVICES"] = job.gpu
+        # Unbuffered so progress lines reach the log file immediately.
+        env["PYTHONUNBUFFERED"] = "1"
+        with open(job.log_path, "ab") as log:
+            log.write(f"# {time.strftime('%Y-%m-%d_%H:%M:%S')} {' '.join(job.command)}\n".encode("utf-8"))
+            log.flush()
+            proc = subprocess.Popen(job.command, stdout=log, stderr=subprocess.STDOUT, env=env)
+            with self.lock:
+                self.running[job.log_path] = (job, proc, time.time())
+            try:
+                return proc.wait()
+            finally:
+                with self.lock:
+                    self.running.pop(job.log_path, None)
+
+    def print_running(self):
+        with self.lock:
+            running = list(self.running.values())
+        now = time.time()
+        for job, _, started in running:
+            progress = read_progress(job.log_path) or "starting"
+            print(f"    running {job.cur_name} [{os.path.basename(job.script)}] "
+                  f"{progress} ({format_elapsed(now - started)})")
+
+    def terminate(self):
+        self.stopping = True
+        with self.lock:
+            running = list(self.running.values())
+        for _, proc, _ in running:
+            proc.terminate()
+
+    def run(self, progress_interval: float) -> int:
+        """Run all jobs, return the number of failed jobs."""
+        failed = 0
+        done = 0
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.run_job, job): job for job in self.jobs}
+            pending = set(futures)
+            try:
+                while pending:
+                    finished = [f for f in pending if f.done()]
+                    for future in finished:
+                        pending.discard(future)
+                        job = futures[future]
+                        try:
+                            code = future.result()
+                        except OSError as e:
+                            print(f"  failed to start {job.cur_name}: {e}")
+                            code = -1
+                        done += 1
+                        failed += code != 0
+                        status = "ok" if code == 0 else f"exit {code}"
+                        print(f"[{done}/{len(self.jobs)}] {status:8s} {job.cur_name} "
+                              f"[{os.path.basename(job.script)}] -> {job.log_path}")
+                    if pending:
+                        print(f"  {done}/{len(self.jobs)} done, {failed} failed, "
+                              f"elapsed {format_elapsed(time.time() - start)}")
+                        self.print_running()
+                        wait_any(pending, progress_interval)
+            except KeyboardInterrupt:
+                print("\ninterrupted, terminating running jobs...")
+                self.terminate()
+                for future in pending:
+                    future.cancel()
+                raise
+        return failed
+
+
+def wait_any(futures: set, timeout: float):
+    """Block until one future finishes or `timeout` seconds pass."""
+    try:
+        next(as_completed(futures, timeout=timeout))
+    except FuturesTimeout:
+        pass
+
+
+def format_elapsed(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+def build_argparser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(
+        description="Run a grid of run_frozenlake_cli_v*.py jobs in parallel, skipping finished runs.",
+        epilog="Arguments after `--` are passed to every job, e.g. -- --use-api false --max-steps 20",
+    )
+    p.add_argument("--script", action="append", required=True,
+                   help="Runner script, e.g. v0/run_frozenlake_cli_v0.py; repeat for several versions.")
+    p.add_argument("--models", required=True, help="Comma-separated --model-name values.")
+    p.add_argument("--methods", default=",".join(METHODS),
+                   help=f"Comma-separated methods (default: all 9). Choices: {', '.join(METHODS)}")
+    p.add_argument("--output-root", default=".",
+                   help="Per-job --output-root; may use {model} and {version}, e.g. {version}/{model}-frozenlake-explicit")
+    p.add_argument("--log-dir", default=None,
+                   help="Directory for per-job stdout files; may use {model} and {version} "
+                        "(default: <output-root>/launcher_logs).")
+    p.add_argument("-j", "--jobs", type=int, default=4, help="Number of concurrent jobs.")
+    p.add_argument("--gpus", default=None,
+                   help="Comma-separated CUDA devices assigned to jobs round-robin (for local models).")
+    p.add_argument("--python", default=sys.executable, help="Python interpreter for the jobs.")
+    p.add_argument("--progress-interval", type=float, default=30.0,
+                   help="Seconds between progress reports while jobs are running.")
+    p.add_argument("--dry-run", action="store_true", help="Print the jobs that would run and exit.")
+    return p
+
+
+def main() -> int:
+    argv = sys.argv[1:]
+    extra = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, extra = argv[:split], argv[split + 1:]
+    parser = build_argparser()
+    args = parser.parse_args(argv)
+
+    unknown = [m for m in args.methods.split(",") if m.strip() and m.strip() not in METHODS]
+    if unknown:
+        parser.error(f"unknown methods: {', '.join(unknown)}")
+    for script in args.script:
+        if not os.path.isfile(script):
+            parser.error(f"script not found: {script}")
+
+    jobs = expand_grid(args, extra)
+    todo = [job for job in jobs if not os.path.exists(finish_mark_path(job.output_root, job.cur_name))]
+    print(f"{len(jobs)} jobs in grid, {len(jobs) - len(todo)} already finished, {len(todo)} to run "
+          f"({min(args.jobs, len(todo))} at a time)")
+    if args.dry_run:
+        for job in todo:
+            gpu = f"CUDA_VISIBLE_DEVICES={job.gpu} " if job.gpu is not None else ""
+            print(f"  {gpu}{' '.join(job.command)} > {job.log_path}")
+        return 0
+    if not todo:
+        return 0
+
+    failed = Launcher(todo, max(args.jobs, 1)).run(args.progress_interval)
+    print(f"done: {len(todo) - failed} succeeded, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
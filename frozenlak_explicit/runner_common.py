@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the `run_frozenlake_cli_v*.py` runners.
+
+The runners only differ in their maps; everything else they need besides the
+Explorer loop lives here so a fix is made once:
+- the per-run manifest (`<output_root>/finish_mark/<cur_name>.manifest.json`),
+  read back by run_manifest.py, check_integrity.py and the table generators;
+- `--resume`: where an interrupted run continues (first episode not yet in
+  explorer_summary.csv) and the MemoryBank status saved after every episode
+  (`storage/mb_status.json`), whose timestep is restored on resume;
+- `--use-api` and the model-call backends below Explorer: the offline replay
+  (replay_backend.py) or, for live runs, the shared rate limiter
+  (api_rate_limiter.py) and the response cache (llm_cache.py).
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, List, NamedTuple
+
+# The backend helpers sit next to this module; each one is optional.
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+if _MODULE_DIR not in sys.path:
+    sys.path.append(_MODULE_DIR)
+
+try:
+    from api_rate_limiter import add_rate_limit_args, setup_from_args as setup_rate_limiter
+except ImportError:
+    add_rate_limit_args = setup_rate_limiter = None
+
+try:
+    from llm_cache import add_cache_args, setup_from_args as setup_llm_cache
+except ImportError:
+    add_cache_args = setup_llm_cache = None
+
+try:
+    from replay_backend import (
+        DEFAULT_OUTPUT_ROOT as REPLAY_OUTPUT_ROOT, REPLAY_PREFIX, add_replay_args, replays_into,
+        setup_from_args as setup_replay,
+    )
+except ImportError:
+    REPLAY_OUTPUT_ROOT = add_replay_args = replays_into = setup_replay = None
+    REPLAY_PREFIX = "replay:"
+
+MANIFEST_VERSION = 1
+
+# Manifest fields that describe the run itself (compared on restart); the
+# rest (created_at, script) is bookkeeping.
+MANIFEST_RUN_FIELDS = ("cur_name", "env_name", "config", "maps", "map_hashes", "num_maps",
+                       "episodes_per_map", "expected_episodes")
+
+MEMORY_STATUS_FILE_NAME = "mb_status.json"
+
+
+class Backends(NamedTuple):
+    """Model-call backends installed for this run (None when not in use)."""
+    replay: Any     # replay_backend.ReplayBackend for --use-api replay:<path>
+    llm_cache: Any  # llm_cache.LLMCache
+
+
+class ResumePoint(NamedTuple):
+    """Where a run starts: first map / episode to run and the MemoryBank timestep."""
+    start_map: int
+    start_episode: int
+    timestep: int
+    done: bool  # every episode is already recorded
+
+
+def str2bool(v: Any) -> bool:
+    """Parse common boolean strings from CLI."""
+    if isinstance(v, bool):
+        return v
+    if v is None:
+        raise argparse.ArgumentTypeError("Boolean value expected, got None")
+    s = str(v).strip().lower()
+    if s in {"1", "true", "t", "yes", "y", "on"}:
+        return True
+    if s in {"0", "false", "f", "no", "n", "off"}:
+        return False
+    raise argparse.ArgumentTypeError(f"Boolean value expected, got: {v!r}")
+
+
+def parse_use_api(v: Any) -> Any:
+    """`--use-api` value: a boolean, or `replay:<path>` for the offline replay backend."""
+    if isinstance(v, str) and v.startswith(REPLAY_PREFIX):
+        return v
+    return str2bool(v)
+
+
+def map_hash(desc: List[str]) -> str:
+    """Stable content hash of a FrozenLake map (rows joined by newlines)."""
+    return hashlib.sha1("\n".join(desc).encode("utf-8")).hexdigest()
+
+
+def build_run_manifest(
+    cur_name: str,
+    args: argparse.Namespace,
+    env_name: str,
+    maps_to_run: List[List[str]],
+    script: str,
+) -> dict:
+    """Manifest content for this run (see write_run_manifest)."""
+    return {
+        "manifest_version": MANIFEST_VERSION,
+        "cur_name": cur_name,
+        "created_at": datetime.now().strftime("%Y-%m-%d_%H:%M:%S"),
+        "script": script,
+        "env_name": env_name,
+        "config": {
+            "model_name": args.model_name,
+            "memory_env": args.memory_env,
+            "use_memory": args.use_memory,
+            "use_global_verifier": args.use_global_verifier,
+            "max_steps": args.max_steps,
+            "threshold": args.threshold,
+            "decay_rate": args.decay_rate,
+            "use_api": args.use_api,
+        },
+        "maps": maps_to_run,
+        "map_hashes": [map_hash(m) for m in maps_to_run],
+        "num_maps": len(maps_to_run),
+        "episodes_per_map": args.episodes_per_map,
+        "expected_episodes": len(maps_to_run) * args.episodes_per_map,
+    }
+
+
+def manifest_differences(old: dict, new: dict) -> List[str]:
+    """Run fields on which two manifests disagree."""
+    return [field for field in MANIFEST_RUN_FIELDS if old.get(field) != new.get(field)]
+
+
+def write_run_manifest(
+    marker_dir: str,
+    cur_name: str,
+    args: argparse.Namespace,
+    env_name: str,
+    maps_to_run: List[List[str]],
+    script: str,
+) -> str:
+    """
+    Write `<marker_dir>/<cur_name>.manifest.json` describing what this run will produce.
+
+    The integrity checker and table generators read it to know the exact
+    expected episode count instead of guessing from the env type.
+
+    An existing manifest for the same run is kept as is (so `created_at` stays
+    the start of the run). One that describes a different run is replaced on a
+    fresh start; with `--resume` that would mix two runs in one log, so a
+    ValueError is raised instead.
+    """
+    os.makedirs(marker_dir, exist_ok=True)
+    manifest = build_run_manifest(cur_name, args, env_name, maps_to_run, script)
+    manifest_path = os.path.join(marker_dir, f"{cur_name}.manifest.json")
+    if os.path.exists(manifest_path):
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                existing = json.load(f)
+        except (OSError, ValueError):
+            existing = None
+        if existing is not None:
+            differences = manifest_differences(existing, manifest)
+            if not differences:
+                return manifest_path
+            if getattr(args, "resume", False):
+                raise ValueError(f"{manifest_path} was written with different {', '.join(differences)}; "
+                                 f"resume with the original arguments or start a fresh run")
+            print(f"[manifest] replacing {manifest_path} (different {', '.join(differences)})")
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
+
+
+def write_finish_mark(marker_path: str) -> None:
+    """Empty `<output_root>/finish_mark/<cur_name>` file marking a completed run."""
+    os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+    with open(marker_path, "w", encoding="utf-8"):
+        pass
+
+
+def count_recorded_episodes(log_dir: str, env_name: str) -> int:
+    """Number of episodes already recorded in `<log_dir>/explorer_summary.csv`."""
+    summary_path = os.path.join(log_dir, "explorer_summary.csv")
+    if not os.path.exists(summary_path):
+        return 0
+    with open(summary_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        return sum(1 for row in reader if len(row) > 2 and row[2] == env_name)
+
+
+def load_memory_status(status_path: str) -> Any:
+    """MemoryBank status saved by a previous (interrupted) run, or None."""
+    if not os.path.exists(status_path):
+        return None
+    try:
+        with open(status_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_memory_status(status_path: str, exp_backend: Any) -> None:
+    """Atomically write `exp_backend.export_status()` (if any) so --resume can restore the timestep."""
+    status = exp_backend.export_status()
+    if status is None:
+        return
+    os.makedirs(os.path.dirname(status_path), exist_ok=True)
+    tmp_path = status_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(status, f, indent=2, default=str)
+    os.replace(tmp_path, status_path)
+
+
+def carry_timestep(exp_backend: Any, timestep: int) -> int:
+    """
+    MemoryBank timestep to start the next map with. The backend is re-initialized
+    per map, so the latest timestep is carried forward; it only grows, so max()
+    keeps a resumed timestep over a fresh backend's 0.
+    """
+    status = exp_backend.export_status()
+    if status is None:
+        return timestep
+    return max(timestep, status.get("mb_current_timestep", timestep))
+
+
+def add_resume_args(p: argparse.ArgumentParser):
+    """`--resume`, shared by the runner CLIs."""
+    p.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from the first episode not yet in explorer_summary.csv, "
+        "reusing storage/exp_store.json and the MemoryBank timestep.",
+    )
+
+
+def plan_resume(
+    args: argparse.Namespace,
+    env_name: str,
+    num_maps: int,
+    log_dir: str,
+    storage_path: str,
+    status_path: str,
+) -> ResumePoint:
+    """
+    Start point of this run. Without --resume the run starts from scratch (and
+    appends to any existing log). With --resume the episodes already recorded are
+    skipped; the experience store is reloaded from storage_path by Explorer, and
+    the MemoryBank timestep comes from status_path.
+    """
+    expected_episodes = num_maps * args.episodes_per_map
+    completed = count_recorded_episodes(log_dir, env_name)
+    if not args.resume:
+        if completed:
+            print(f"[warn] {completed} episodes already recorded in {log_dir}; "
+                  f"new episodes will be appended (use --resume to continue instead)")
+        return ResumePoint(0, 0, 0, False)
+    if completed >= expected_episodes:
+        print(f"[resume] all {expected_episodes} episodes already recorded, nothing to do")
+        return ResumePoint(num_maps, 0, 0, True)
+    if completed and args.use_memory and not os.path.exists(storage_path):
+        print(f"[warn] {storage_path} not found; resuming with an empty experience store")
+    start_map, start_episode = divmod(completed, args.episodes_per_map)
+    print(f"[resume] {completed}/{expected_episodes} episodes recorded, "
+          f"continuing from map {start_map}, episode {start_episode}")
+
+    timestep = 0
+    if completed:
+        saved_status = load_memory_status(status_path)
+        if saved_status is not None:
+            timestep = saved_status.get("mb_current_timestep", timestep)
+            print(f"[resume] MemoryBank timestep {timestep} from {status_path}")
+        elif args.memory_env == "memorybank":
+            print(f"[warn] {status_path} not found; MemoryBank timestep restarts at 0")
+    return ResumePoint(start_map, start_episode, timestep, False)
+
+
+def add_backend_args(p: argparse.ArgumentParser):
+    """Flags of the available backend helpers (rate limiter, cache, replay)."""
+    if add_rate_limit_args is not None:
+        add_rate_limit_args(p)
+    if add_cache_args is not None:
+        add_cache_args(p)
+    if add_replay_args is not None:
+        add_replay_args(p)
+
+
+def setup_backends(args: argparse.Namespace, env_name: str) -> Backends | None:
+    """
+    Install the backends for `--use-api` and fill in the default `--output-root`;
+    None when the run cannot start.
+
+    Replayed runs answer from a recorded run with no network and default to the
+    scratch root REPLAY_OUTPUT_ROOT, so they never mix with (or finish-mark) real
+    results. Live runs share the provider quota with every other run on this
+    machine; the cache is installed after the rate limiter so cache hits never
+    wait for (or spend) quota.
+    """
+    replay_backend = llm_cache = None
+    if isinstance(args.use_api, str):
+        if setup_replay is None:
+            print("[replay] replay_backend.py not found")
+            return None
+        replay_backend = setup_replay(args, env_name)
+    else:
+        if setup_rate_limiter is not None:
+            setup_rate_limiter(args)
+        elif args.use_api:
+            print("[rate-limit] api_rate_limiter.py not found; requests are not rate limited")
+        llm_cache = setup_llm_cache(args) if setup_llm_cache is not None else None
+    if args.output_root is None:
+        args.output_root = REPLAY_OUTPUT_ROOT if replay_backend is not None else "."
+    return Backends(replay_backend, llm_cache)
+
+
+def replay_source_conflict(args: argparse.Namespace, backends: Backends, log_dir: str) -> bool:
+    """True (with a message) when a replayed run would append to the summary it replays."""
+    if backends.replay is None or not replays_into(args.use_api, log_dir):
+        return False
+    print(f"[replay] {log_dir} is the replay source; refusing to append to it (pass another --output-root)")
+    return True
+
+
+def print_backend_summary(backends: Backends, episode_times: List[float]):
+    """Cache statistics and, when replaying, the harness time per episode."""
+    if backends.llm_cache is not None:
+        print(backends.llm_cache.summary())
+    if backends.replay is not None:
+        print(backends.replay.summary())
+        if episode_times:
+            times = sorted(episode_times)
+            print(f"[replay] harness time per episode: mean {sum(times) / len(times):.3f}s, "
+                  f"median {times[len(times) // 2]:.3f}s, max {times[-1]:.3f}s over {len(times)} episodes")
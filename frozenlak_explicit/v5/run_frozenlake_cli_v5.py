@@ -9,21 +9,19 @@ It mirrors `run_frozenLake.py` but accepts key configs from CLI.
 import argparse
 import os
 import sys
-from typing import Any
+import time
 
+# Shared helpers sit next to this script when deployed, or one directory up in this repo.
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+for _path in (_SCRIPT_DIR, os.path.dirname(_SCRIPT_DIR)):
+    if _path not in sys.path:
+        sys.path.append(_path)
 
-def str2bool(v: Any) -> bool:
-    """Parse common boolean strings from CLI."""
-    if isinstance(v, bool):
-        return v
-    if v is None:
-        raise argparse.ArgumentTypeError("Boolean value expected, got None")
-    s = str(v).strip().lower()
-    if s in {"1", "true", "t", "yes", "y", "on"}:
-        return True
-    if s in {"0", "false", "f", "no", "n", "off"}:
-        return False
-    raise argparse.ArgumentTypeError(f"Boolean value expected, got: {v!r}")
+from runner_common import (  # noqa: E402
+    MEMORY_STATUS_FILE_NAME, add_backend_args, add_resume_args, carry_timestep, parse_use_api, plan_resume,
+    print_backend_summary, replay_source_conflict, save_memory_status, setup_backends, str2bool,
+    write_finish_mark, write_run_manifest,
+)
 
 
 def build_argparser() -> argparse.ArgumentParser:
@@ -47,15 +45,23 @@ def build_argparser() -> argparse.ArgumentParser:
     p.add_argument("--threshold", type=float, default=0.3)
     p.add_argument("--decay-rate", type=float, default=60.0)
     p.add_argument("--episodes-per-map", type=int, default=20)
-    p.add_argument("--output-root", type=str, default=".")
+    p.add_argument(
+        "--output-root",
+        type=str,
+        default=None,
+        help="Root for logs, storage and finish_mark (default: ., or replay_runs with --use-api replay:<path>).",
+    )
     p.add_argument("--cuda-visible-devices", type=str, default=None)
     p.add_argument("--use-global-verifier", type=str2bool, default=None)
     p.add_argument(
         "--use-api",
-        type=str2bool,
+        type=parse_use_api,
         default=True,
-        help="Whether to use API model backend when loading the explorer model.",
+        help="Whether to use API model backend when loading the explorer model, "
+        "or replay:<explorer_summary.csv or run folder> to answer from a recorded run offline.",
     )
+    add_resume_args(p)
+    add_backend_args(p)
     return p
 
 
@@ -72,6 +78,12 @@ def main() -> int:
 
     from explorer import Explorer  # noqa: E402
 
+    # Model-call backends (replay, or rate limiter + cache) and the default output root.
+    backends = setup_backends(args, "frozenlake")
+    if backends is None:
+        return 1
+    replay_backend = backends.replay
+
     map_0 = [
         "SFHH",
         "HFFH",
@@ -100,9 +112,26 @@ def main() -> int:
     backend_log_dir = log_dir
     storage_path = os.path.join(run_root, "storage", "exp_store.json")
     depreiciate_exp_store_path = os.path.join(run_root, "storage", "depreiciate_exp_store.json")
+    memory_status_path = os.path.join(run_root, "storage", MEMORY_STATUS_FILE_NAME)
+    marker_dir = os.path.join(args.output_root, "finish_mark")
+    marker_path = os.path.join(marker_dir, cur_name)
+    if replay_source_conflict(args, backends, log_dir):
+        return 1
+    try:
+        write_run_manifest(marker_dir, cur_name, args, env_name, maps_to_run, os.path.basename(__file__))
+    except ValueError as e:
+        print(f"[resume] {e}")
+        return 1
+
+    # Resume: skip the episodes already recorded (see runner_common.plan_resume).
+    resume = plan_resume(args, env_name, len(maps_to_run), log_dir, storage_path, memory_status_path)
+    if resume.done:
+        write_finish_mark(marker_path)
+        return 0
+    start_map, start_episode = resume.start_map, resume.start_episode
 
     # Initialize once (model load happens here); per-map we call init_after_model to avoid reload.
-    ts = 0
+    ts = resume.timestep
     e = Explorer(
         model_name=args.model_name,
         env_name=env_name,
@@ -116,17 +145,18 @@ def main() -> int:
         backend_log_dir=backend_log_dir,
         storage_path=storage_path,
         depreiciate_exp_store_path=depreiciate_exp_store_path,
-        desc=maps_to_run[0],
-        use_api=args.use_api,
+        desc=maps_to_run[start_map],
+        use_api=bool(args.use_api),
         use_global_verifier=args.use_global_verifier,
     )
 
+    episode_times = []
     for map_idx, cur_map in enumerate(maps_to_run):
+        if map_idx < start_map:
+            continue
         # MemoryBank keeps an integer timestep for forgetting; when we re-init the backend
         # (switching maps), carry forward the latest timestep so forgetting continues.
-        status = e.exp_backend.export_status()
-        if status is not None:
-            ts = status.get("mb_current_timestep", ts)
+        ts = carry_timestep(e.exp_backend, ts)
         e.init_after_model(
             model_name=args.model_name,
             env_name=env_name,
@@ -144,17 +174,22 @@ def main() -> int:
             use_global_verifier=args.use_global_verifier,
         )
 
-        for i in range(args.episodes_per_map):
+        for i in range(start_episode if map_idx == start_map else 0, args.episodes_per_map):
             print(f"--- map {map_idx} | episode {i}/{args.episodes_per_map} ---")
+            if replay_backend is not None:
+                replay_backend.start_episode(cur_map, i)
+            episode_start = time.perf_counter()
             e.explore()
+            episode_times.append(time.perf_counter() - episode_start)
+            save_memory_status(memory_status_path, e.exp_backend)
+            if replay_backend is not None:
+                # No model latency while replaying: this is the harness overhead.
+                print(f"[replay] episode time {episode_times[-1]:.3f}s")
 
     # Create a finish marker file to indicate this run completed successfully.
-    marker_dir = os.path.join(args.output_root, "finish_mark")
-    os.makedirs(marker_dir, exist_ok=True)
-    marker_path = os.path.join(marker_dir, cur_name)
-    with open(marker_path, "w", encoding="utf-8"):
-        pass
-    
+    write_finish_mark(marker_path)
+
+    print_backend_summary(backends, episode_times)
     return 0
 
 
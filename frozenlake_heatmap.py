@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+FrozenLake 状态访问热力图。
+
+主实验目录（explicit / implicit）和 frozenlak_explicit 下所有版本目录（磁盘上实际存在的
+v0, v1, ...，见 table_pivot.SOURCE_VERSIONS）的 frozenlake episode 一次性批量回放
+（见 frozenlake_replay.py），每一步的位置用 np.add.at 累加到
+(model, mode, method, version) × 地图 的访问计数网格中。
+
+输出到 --output-dir（默认 <BASE_DIR>/heatmaps）:
+- frozenlake_visits.npz: counts（组 × 地图 × 行 × 列）、episodes（组 × 地图）和
+  meta（JSON: 各组的维度取值、各地图的目的地和网格）
+- frozenlake_heatmaps.txt: ASCII 热力图，按 地图 / 模型 / 版本 分段，同一段内各方法并排，
+  便于比较 glove 与非 glove 的探索范围；每个格子是 地图字符 + 访问强度（LEVELS，相对该组最大值）
+- --png 时每段一张 PNG（需要 matplotlib，没有安装时跳过并给出提示）
+
+用法:
+    python frozenlake_heatmap.py [--where model=GPT-4o] [--where version=v0,v1] [--png] [--output-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from frozenlake_replay import EpisodeBatch, replay
+from table_pivot import BASE_DIR, DIM_ORDER, crawl_sources, parse_where
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:
+    plt = None
+
+# 热力图按这些维度分组；同一段内并排的维度
+GROUP_DIMS = ["model", "mode", "method", "version"]
+SIDE_BY_SIDE_DIM = "method"
+
+# 访问强度字符，从无到多
+LEVELS = " .:-=+*#%@"
+
+OUTPUT_DIR_NAME = "heatmaps"
+ARRAYS_FILE_NAME = "frozenlake_visits.npz"
+ASCII_FILE_NAME = "frozenlake_heatmaps.txt"
+
+
+def collect_batch(where: dict) -> tuple:
+    """
+    读取所有 frozenlake 源文件。
+    返回 (EpisodeBatch, 各组的维度取值列表, 每个 episode 的组号数组)
+    """
+    batch = EpisodeBatch()
+    groups, group_index, file_groups = [], {}, []
+    for csv_path, _, dims in crawl_sources():
+        if dims["env"] != "frozenlake":
+            continue
+        if any(dims.get(dim) not in allowed for dim, allowed in where.items()):
+            continue
+        # add_file 失败时会撤销该文件的部分记录，file_groups 与 batch.files 保持一一对应
+        try:
+            batch.add_file(csv_path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"读取 {csv_path} 失败: {e}", file=sys.stderr)
+            continue
+        key = tuple(dims[dim] for dim in GROUP_DIMS)
+        if key not in group_index:
+            group_index[key] = len(groups)
+            groups.append({dim: dims[dim] for dim in GROUP_DIMS})
+        file_groups.append(group_index[key])
+    episode_group = np.array(file_groups, dtype=np.intp)[np.array(batch.file, dtype=np.intp)]
+    return batch, groups, episode_group
+
+
+def visit_counts(batch: EpisodeBatch, result: dict, episode_group: np.ndarray, n_groups: int) -> tuple:
+    """返回 (counts: 组 × 地图 × 行 × 列 的访问次数, episodes: 组 × 地图 的 episode 数)"""
+    height = max(len(grid) for _, grid in batch.maps)
+    width = max(len(grid[0]) for _, grid in batch.maps)
+    counts = np.zeros((n_groups, len(batch.maps), height, width), dtype=np.int64)
+    episodes = np.zeros((n_groups, len(batch.maps)), dtype=np.int64)
+
+    map_id = np.array(batch.map_id, dtype=np.intp)
+    np.add.at(episodes, (episode_group, map_id), 1)
+
+    path_row, path_col = result["path_row"], result["path_col"]
+    visited = path_row >= 0
+    ep = np.broadcast_to(np.arange(len(batch))[:, None], path_row.shape)[visited]
+    np.add.at(counts, (episode_group[ep], map_id[ep], path_row[visited], path_col[visited]), 1)
+    return counts, episodes
+
+
+def save_arrays(output_dir: Path, batch: EpisodeBatch, groups: list, counts: np.ndarray, episodes: np.ndarray):
+    path = output_dir / ARRAYS_FILE_NAME
+    meta = json.dumps({
+        "groups": groups,
+        "maps": [{"destinations": destinations, "grid": grid} for destinations, grid in batch.maps],
+    }, ensure_ascii=False)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp.npz")
+    np.savez_compressed(tmp_path, counts=counts, episodes=episodes, meta=np.array(meta))
+    os.replace(tmp_path, path)
+    print(f"  生成: {path}")
+
+
+def render_ascii(counts: np.ndarray, grid: list) -> list:
+    """一个组在一张地图上的 ASCII 热力图（每行一个字符串）"""
+    peak = counts.max()
+    lines = []
+    for r, row in enumerate(grid):
+        cells = []
+        for c, ch in enumerate(row):
+            level = 0 if peak == 0 or counts[r, c] == 0 else 1 + int((len(LEVELS) - 2) * counts[r, c] / peak)
+            cells.append(ch + LEVELS[level])
+        lines.append(" ".join(cells))
+    return lines
+
+
+def _order_key(group: dict) -> tuple:
+    """按 DIM_ORDER 的规范顺序排序，没有列出的值排在后面"""
+    key = []
+    for dim in GROUP_DIMS:
+        order = DIM_ORDER.get(dim, [])
+        value = group[dim]
+        key.append((order.index(value) if value in order else len(order), value))
+    return tuple(key)
+
+
+def sections(groups: list, episodes: np.ndarray) -> list:
+    """
+    把 (组, 地图) 排成段: [(地图编号, 段标题, [(组号, 并排标签), ...])]，
+    同一地图、同一 model/mode/version 的各方法在一段中并排。
+    """
+    outer_dims = [dim for dim in GROUP_DIMS if dim != SIDE_BY_SIDE_DIM]
+    by_section = {}
+    for g in sorted(range(len(groups)), key=lambda g: _order_key(groups[g])):
+        for m in np.flatnonzero(episodes[g]):
+            key = (int(m),) + tuple(groups[g][dim] for dim in outer_dims)
+            by_section.setdefault(key, []).append((g, groups[g][SIDE_BY_SIDE_DIM]))
+    result = []
+    for key in sorted(by_section, key=lambda k: (k[0], _order_key(groups[by_section[k][0][0]]))):
+        title = " / ".join(f"{dim}={value}" for dim, value in zip(outer_dims, key[1:]))
+        result.append((key[0], title, by_section[key]))
+    return result
+
+
+def write_ascii(output_dir: Path, batch: EpisodeBatch, groups: list, counts: np.ndarray, episodes: np.ndarray):
+    lines = [f"访问强度: '{LEVELS}'（从无到多，相对每个方法自己的最大访问次数）", ""]
+    for map_id, title, members in sections(groups, episodes):
+        destinations, grid = batch.maps[map_id]
+        lines.append("=" * 80)
+        lines.append(f"地图 {map_id}（目的地 {destinations}）  {title}")
+        labels = [f"{label} ({episodes[g, map_id]})" for g, label in members]
+        width = max(3 * len(grid[0]) - 1, *map(len, labels))
+        blocks = [[label] + render_ascii(counts[g, map_id], grid) for (g, _), label in zip(members, labels)]
+        # 每行最多并排 5 个方法
+        for i in range(0, len(blocks), 5):
+            chunk = blocks[i:i + 5]
+            for row in range(len(chunk[0])):
+                lines.append("   ".join(block[row].ljust(width) for block in chunk).rstrip())
+            lines.append("")
+    path = output_dir / ASCII_FILE_NAME
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+    print(f"  生成: {path}")
+
+
+def write_png(output_dir: Path, batch: EpisodeBatch, groups: list, counts: np.ndarray, episodes: np.ndarray):
+    """每段一张 PNG，各方法并排；没有 matplotlib 时跳过"""
+    if plt is None:
+        print("  ⚠️ 未安装 matplotlib，跳过 PNG 输出")
+        return
+    png_dir = output_dir / "png"
+    png_dir.mkdir(parents=True, exist_ok=True)
+    for map_id, title, members in sections(groups, episodes):
+        _, grid = batch.maps[map_id]
+        fig, axes = plt.subplots(1, len(members), figsize=(2.2 * len(members), 2.6), squeeze=False)
+        for ax, (g, label) in zip(axes[0], members):
+            visits = counts[g, map_id, :len(grid), :len(grid[0])] / episodes[g, map_id]
+            ax.imshow(visits, cmap="viridis")
+            for r, row in enumerate(grid):
+                for c, ch in enumerate(row):
+                    if ch != "F":
+                        ax.text(c, r, ch, ha="center", va="center", color="white", fontsize=8)
+            ax.set_title(label, fontsize=8)
+            ax.set_xticks([])
+            ax.set_yticks([])
+        fig.suptitle(f"map {map_id}  {title}", fontsize=9)
+        name = f"map{map_id}_" + title.replace(" / ", "_").replace("=", "-").replace("/", "-") + ".png"
+        fig.savefig(png_dir / name, dpi=100, bbox_inches="tight")
+        plt.close(fig)
+    print(f"  生成: {png_dir}/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FrozenLake 状态访问热力图")
+    parser.add_argument("--where", action="append", default=[], help="筛选条件，如 model=GPT-4o 或 version=v0,v1；可重复")
+    parser.add_argument("--output-dir", type=Path, default=BASE_DIR / OUTPUT_DIR_NAME, help="输出目录")
+    parser.add_argument("--png", action="store_true", help="同时输出 PNG（需要 matplotlib）")
+    args = parser.parse_args()
+
+    batch, groups, episode_group = collect_batch(parse_where(args.where))
+    if not len(batch):
+        print("没有符合条件的 frozenlake episode")
+        return 0
+    result = replay(batch)
+    counts, episodes = visit_counts(batch, result, episode_group, len(groups))
+    print(f"回放 {len(batch)} 个 episode，{len(groups)} 组，{len(batch.maps)} 张不同的地图")
+    per_version = {}
+    for group, n in zip(groups, episodes.sum(axis=1)):
+        per_version[group["version"]] = per_version.get(group["version"], 0) + int(n)
+    order = DIM_ORDER["version"]
+    versions = sorted(per_version, key=lambda v: (order.index(v) if v in order else len(order), v))
+    print("  各版本 episode 数: " + "，".join(f"{version} {per_version[version]}" for version in versions))
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    save_arrays(args.output_dir, batch, groups, counts, episodes)
+    write_ascii(args.output_dir, batch, groups, counts, episodes)
+    if args.png:
+        write_png(args.output_dir, batch, groups, counts, episodes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+FrozenLake 批量回放: 用 instruction 中的地图和 action_path 重新计算每个 episode 的结果，
+检查记录的 final_score 和 step_count 是否与回放一致。
+
+- 每个不同的 instruction（地图 + 目的地）只解析一次，地图编码为 F/H/G 数组
+- 所有 episode 的动作排成 (episode × step) 数组，按步同时推进所有 episode 的位置
+- 规则（与 Explorer 的 FrozenLake 一致，由记录数据验证）:
+  动作 0/1/2/3 = 左/下/右/上，撞墙原地不动；踩到 H 结束得 0；到达 G 结束；
+  到达 G 时已用满 max_steps 步算超时，得 0；走满 max_steps 步没有结束得 0。
+  单目的地到达即得 1.0；多目的地的 hidden（implicit）运行每块只有一个真正的目的地
+  （见 HIDDEN_GOAL_INDEX），到达它得 1.0，到达其他目的地得 1/目的地个数。
+- 每张地图用 BFS 求出到各目的地的最短步数（按地图哈希缓存），得到每个 episode 的
+  最优性差距 optimality_gap，以 fl_ 前缀注册为表格指标（见 ROW_METRICS、
+  generate_tables.py --extra-metrics 和 table_pivot.py --metric）
+
+用法:
+    python frozenlake_replay.py [base_dir] [--examples 3] [--exclude old _tmp*] [--strict]
+"""
+
+import argparse
+import ast
+import csv
+import hashlib
+import json
+import sys
+import time
+from collections import deque
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from generate_all_tables import BASE_DIR
+from table_deps import RowMetric
+from row_schema import DEFAULT_EXCLUDES, find_summary_files, folder_identity
+from run_manifest import load_manifest, get_items_per_env
+
+# 地图格子编码
+FROZEN, HOLE, GOAL = 0, 1, 2
+CELL_CODES = {"S": FROZEN, "F": FROZEN, "H": HOLE, "G": GOAL}
+
+# 动作 -> (行偏移, 列偏移): 0 左, 1 下, 2 右, 3 上
+ACTION_DR = np.array([0, 1, 0, -1], dtype=np.int64)
+ACTION_DC = np.array([-1, 0, 1, 0], dtype=np.int64)
+
+# 没有清单时的默认最大步数（run_frozenlake_cli 的 --max-steps 默认值）
+DEFAULT_MAX_STEPS = 20
+
+# hidden 运行中第 i 块真正的目的地在 Destinations 列表中的下标（按块循环）
+HIDDEN_GOAL_INDEX = [-1, 0]
+
+# 回放结果
+OUTCOME_NAMES = {0: "未结束", 1: "掉进洞", 2: "到达目的地", -1: "非法动作"}
+
+# 指标名 -> 说明（表格/透视表中的指标名加 fl_ 前缀）
+METRIC_NAMES = {
+    "optimality_gap": "成功: 比最短路径多走的步数；失败: 结束时离目的地的最短步数",
+}
+
+# 地图哈希 -> 到各目的地的最短步数（见 destination_distances）
+_DISTANCE_CACHE = {}
+
+
+def parse_instruction(instruction: str) -> tuple:
+    """"Destinations: [...]; Map: [[...]]" -> (目的地列表, 地图行列表)"""
+    destinations_text, map_text = instruction.split("; Map: ", 1)
+    destinations = ast.literal_eval(destinations_text[len("Destinations: "):])
+    grid = ast.literal_eval(map_text)
+    return [tuple(d) for d in destinations], ["".join(row) for row in grid]
+
+
+class EpisodeBatch:
+    """所有 frozenlake episode 的数组表示"""
+
+    # 每个 episode 一项的列表
+    EPISODE_FIELDS = ("file", "record", "map_id", "block", "hidden", "max_steps", "actions", "step_count", "score")
+
+    def __init__(self):
+        self.files = []
+        self.map_keys = {}  # instruction -> 地图编号
+        self.maps = []  # [(目的地列表, 地图行列表)]
+        self.file, self.record, self.map_id, self.block = [], [], [], []
+        self.hidden, self.max_steps = [], []
+        self.actions, self.step_count, self.score = [], [], []
+
+    def add_file(self, csv_path: Path):
+        """加入一个文件的所有记录；读取失败时撤销该文件已加入的部分再抛出异常"""
+        n_files, n_episodes, n_maps = len(self.files), len(self), len(self.maps)
+        try:
+            self._read_file(csv_path)
+        except BaseException:
+            del self.files[n_files:]
+            for field in self.EPISODE_FIELDS:
+                del getattr(self, field)[n_episodes:]
+            del self.maps[n_maps:]
+            self.map_keys = {key: map_id for key, map_id in self.map_keys.items() if map_id < n_maps}
+            raise
+
+    def _read_file(self, csv_path: Path):
+        method_folder = csv_path.parent.parent
+        manifest = load_manifest(method_folder)
+        items_per_env = get_items_per_env(manifest, 20)
+        max_steps = manifest["config"]["max_steps"] if manifest else DEFAULT_MAX_STEPS
+        hidden = method_folder.name.startswith("log_hidden_")
+
+        file_idx = len(self.files)
+        self.files.append(csv_path)
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for j, row in enumerate(reader):
+                self.add_row(row, file_idx, j + 1, j // items_per_env, hidden, max_steps)
+
+    def add_row(self, row: list, file_idx: int, record: int, block: int, hidden: bool, max_steps: int) -> bool:
+        """加入一条记录，不是 frozenlake 或无法解析时返回 False"""
+        if len(row) != 7 or row[2] != "frozenlake":
+            return False
+        instruction = row[3]
+        map_id = self.map_keys.get(instruction)
+        if map_id is None:
+            try:
+                self.maps.append(parse_instruction(instruction))
+            except (ValueError, SyntaxError):
+                return False
+            map_id = self.map_keys[instruction] = len(self.maps) - 1
+        try:
+            actions = json.loads(row[4])
+            step_count = int(row[5])
+            score = float(row[6])
+        except ValueError:
+            return False
+        self.file.append(file_idx)
+        self.record.append(record)
+        self.map_id.append(map_id)
+        self.block.append(block)
+        self.hidden.append(hidden)
+        self.max_steps.append(max_steps)
+        self.actions.append(actions)
+        self.step_count.append(step_count)
+        self.score.append(score)
+        return True
+
+    def __len__(self):
+        return len(self.file)
+
+
+def action_matrix(actions: list) -> tuple:
+    """动作列表 -> (episode × step 数组，空位为 -2；每个 episode 的长度)"""
+    lengths = np.array([len(a) for a in actions], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.full((len(actions), width), -2, dtype=np.int64)
+    if lengths.sum():
+        flat = np.fromiter((a for path in actions for a in path), dtype=np.int64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(actions)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        cols = np.arange(len(flat)) - np.repeat(offsets, lengths)
+        matrix[rows, cols] = flat
+    return matrix, lengths
+
+
+def encode_maps(maps: list) -> tuple:
+    """地图 -> (地图编号 × 行 × 列 的格子编码数组, 行数, 列数)，小地图用 H 填充"""
+    height = max(len(grid) for _, grid in maps)
+    width = max(len(grid[0]) for _, grid in maps)
+    cells = np.full((len(maps), height, width), HOLE, dtype=np.int8)
+    for i, (_, grid) in enumerate(maps):
+        for r, row in enumerate(grid):
+            cells[i, r, :len(row)] = [CELL_CODES.get(ch, HOLE) for ch in row]
+    n_rows = np.array([len(grid) for _, grid in maps], dtype=np.int64)
+    n_cols = np.array([len(grid[0]) for _, grid in maps], dtype=np.int64)
+    return cells, n_rows, n_cols
+
+
+def replay(batch: EpisodeBatch) -> dict:
+    """
+    同时回放所有 episode。
+    返回按 episode 的数组: outcome（见 OUTCOME_NAMES）、steps（回放走的步数）、
+    end_row / end_col（结束位置）、score（回放得分），以及形状为 (episode, step + 1) 的
+    path_row / path_col（每步之后的位置，第 0 列为起点，episode 结束后为 -1）
+    """
+    n = len(batch)
+    matrix, lengths = action_matrix(batch.actions)
+    cells, n_rows, n_cols = encode_maps(batch.maps)
+    map_id = np.array(batch.map_id, dtype=np.intp)
+    max_row = n_rows[map_id] - 1
+    max_col = n_cols[map_id] - 1
+
+    row = np.zeros(n, dtype=np.int64)
+    col = np.zeros(n, dtype=np.int64)
+    outcome = np.zeros(n, dtype=np.int64)
+    steps = lengths.copy()
+    alive = np.ones(n, dtype=bool)
+    path_row = np.full((n, matrix.shape[1] + 1), -1, dtype=np.int64)
+    path_col = np.full_like(path_row, -1)
+    path_row[:, 0] = 0
+    path_col[:, 0] = 0
+
+    for t in range(matrix.shape[1]):
+        action = matrix[:, t]
+        moving = alive & (action >= 0)
+        invalid = alive & ((action > 3) | (action == -1) | (action < -2))
+        outcome[invalid] = -1
+        steps[invalid] = t
+        alive &= ~invalid
+        safe_action = np.where(moving & ~invalid, action, 0)
+        row = np.where(moving, np.clip(row + ACTION_DR[safe_action], 0, max_row), row)
+        col = np.where(moving, np.clip(col + ACTION_DC[safe_action], 0, max_col), col)
+        cell = cells[map_id, row, col]
+        ended = moving & (cell != FROZEN)
+        outcome[ended] = np.where(cell[ended] == HOLE, 1, 2)
+        steps[ended] = t + 1
+        path_row[moving, t + 1] = row[moving]
+        path_col[moving, t + 1] = col[moving]
+        alive &= ~ended
+
+    score = goal_scores(batch, row, col)
+    max_steps = np.array(batch.max_steps, dtype=np.int64)
+    score[(outcome != 2) | (steps >= max_steps)] = 0.0
+    return {
+        "outcome": outcome, "steps": steps, "end_row": row, "end_col": col, "score": score,
+        "path_row": path_row, "path_col": path_col,
+    }
+
+
+def true_goal_index(batch: EpisodeBatch) -> tuple:
+    """
+    每个 episode 真正的目的地在 Destinations 中的下标，以及是否为多目的地的 hidden 运行
+    （只有这种运行区分真正的目的地，其他运行到达任一目的地都算成功）
+    """
+    n_destinations = np.array([len(destinations) for destinations, _ in batch.maps], dtype=np.int64)
+    map_id = np.array(batch.map_id, dtype=np.intp)
+    block = np.array(batch.block, dtype=np.int64)
+    hidden = np.array(batch.hidden, dtype=bool)
+
+    goal_index = np.array(HIDDEN_GOAL_INDEX, dtype=np.int64)[block % len(HIDDEN_GOAL_INDEX)]
+    goal_index = np.where(goal_index < 0, n_destinations[map_id] + goal_index, goal_index) % n_destinations[map_id]
+    return goal_index, hidden & (n_destinations[map_id] > 1)
+
+
+def goal_scores(batch: EpisodeBatch, row: np.ndarray, col: np.ndarray) -> np.ndarray:
+    """到达 (row, col) 处的目的地时的得分（不考虑是否真的到达）"""
+    n_destinations = np.array([len(destinations) for destinations, _ in batch.maps], dtype=np.int64)
+    map_id = np.array(batch.map_id, dtype=np.intp)
+    goal_index, multi = true_goal_index(batch)
+
+    # 每个 (地图, 块) 真正的目的地坐标
+    destination_rows = np.zeros((len(batch.maps), n_destinations.max()), dtype=np.int64)
+    destination_cols = np.zeros_like(destination_rows)
+    for i, (destinations, _) in enumerate(batch.maps):
+        for k, (r, c) in enumerate(destinations):
+            destination_rows[i, k] = r
+            destination_cols[i, k] = c
+    at_goal = (destination_rows[map_id, goal_index] == row) & (destination_cols[map_id, goal_index] == col)
+
+    partial_credit = 1.0 / n_destinations[map_id]
+    return np.where(multi & ~at_goal, partial_credit, 1.0)
+
+
+def map_hash(destinations: list, grid: list) -> str:
+    return hashlib.sha1(json.dumps([destinations, grid]).encode("utf-8")).hexdigest()
+
+
+def destination_distances(destinations: list, grid: list) -> np.ndarray:
+    """
+    BFS 得到每个格子到每个目的地的最短步数，形状为 (目的地个数, 行, 列)，到不了为 inf。
+    路径只能经过 S/F（H 和其他目的地会结束 episode），但 H 和其他目的地本身也有距离，
+    用于计算在那里结束的 episode 离目的地还有多远。按地图哈希缓存在 _DISTANCE_CACHE 中。
+    """
+    key = map_hash(destinations, grid)
+    cached = _DISTANCE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    n_rows, n_cols = len(grid), len(grid[0])
+    dist = np.full((len(destinations), n_rows, n_cols), np.inf)
+    for k, (goal_row, goal_col) in enumerate(destinations):
+        dist[k, goal_row, goal_col] = 0
+        queue = deque([(goal_row, goal_col)])
+        while queue:
+            r, c = queue.popleft()
+            if (r, c) != (goal_row, goal_col) and CELL_CODES.get(grid[r][c], HOLE) != FROZEN:
+                continue
+            for dr, dc in zip(ACTION_DR, ACTION_DC):
+                nr, nc = r + int(dr), c + int(dc)
+                if 0 <= nr < n_rows and 0 <= nc < n_cols and dist[k, nr, nc] == np.inf:
+                    dist[k, nr, nc] = dist[k, r, c] + 1
+                    queue.append((nr, nc))
+    _DISTANCE_CACHE[key] = dist
+    return dist
+
+
+def distance_grids(maps: list) -> np.ndarray:
+    """所有地图的 destination_distances，形状为 (地图编号, 目的地, 行, 列)，空位为 inf"""
+    n_destinations = max(len(destinations) for destinations, _ in maps)
+    height = max(len(grid) for _, grid in maps)
+    width = max(len(grid[0]) for _, grid in maps)
+    grids = np.full((len(maps), n_destinations, height, width), np.inf)
+    for i, (destinations, grid) in enumerate(maps):
+        dist = destination_distances(destinations, grid)
+        grids[i, :dist.shape[0], :dist.shape[1], :dist.shape[2]] = dist
+    return grids
+
+
+def optimality_gap(batch: EpisodeBatch, result: dict) -> np.ndarray:
+    """
+    每个 episode 的最优性差距: 成功（得 1.0）的 episode 为 step_count 减去从起点出发的最短步数，
+    失败的 episode 为结束位置到目的地的最短步数（多目的地的 hidden 运行按真正的目的地，
+    其他运行按最近的目的地）；到不了目的地时为 NaN。
+    """
+    grids = distance_grids(batch.maps)
+    map_id = np.array(batch.map_id, dtype=np.intp)
+    goal_index, multi = true_goal_index(batch)
+    episode = np.arange(len(batch))
+
+    def target_distance(row, col):
+        nearest = grids[map_id, :, row, col].min(axis=1)
+        return np.where(multi, grids[map_id, goal_index, row, col], nearest)
+
+    optimal = target_distance(np.zeros_like(episode), np.zeros_like(episode))
+    remaining = target_distance(result["end_row"], result["end_col"])
+    gap = np.where(result["score"] == 1.0, np.array(batch.step_count, dtype=np.float64) - optimal, remaining)
+    gap[~np.isfinite(gap)] = np.nan
+    return gap
+
+
+def rows_metrics(rows: list, block: int) -> dict:
+    """
+    一组 CSV 行（同一块）的回放指标；不是 frozenlake 或无法解析的行为 NaN。
+    只有行内容时不知道运行文件夹: 多目的地即 hidden 运行（与记录数据一致），
+    最大步数取 DEFAULT_MAX_STEPS。
+    """
+    batch = EpisodeBatch()
+    index = [i for i, row in enumerate(rows) if batch.add_row(row, 0, i + 1, block, False, DEFAULT_MAX_STEPS)]
+    result = {name: np.full(len(rows), np.nan) for name in METRIC_NAMES}
+    if index:
+        batch.hidden = [len(batch.maps[m][0]) > 1 for m in batch.map_id]
+        result["optimality_gap"][index] = optimality_gap(batch, replay(batch))
+    return result
+
+
+def _block_metric(name: str, rows: list, block_idx: int) -> np.ndarray:
+    return rows_metrics(rows, block_idx)[name]
+
+
+# 表格指标名 -> RowMetric（按整组记录回放）
+ROW_METRICS = {f"fl_{name}": RowMetric(partial(_block_metric, name)) for name in METRIC_NAMES}
+
+
+def format_report(batch: EpisodeBatch, result: dict, base_dir: Path, examples: int) -> str:
+    file_idx = np.array(batch.file, dtype=np.intp)
+    record = np.array(batch.record, dtype=np.int64)
+    score_mismatch = ~np.isclose(np.array(batch.score), result["score"])
+    step_mismatch = np.array(batch.step_count) != result["steps"]
+
+    lines = [f"回放 {len(batch)} 个 episode（{len(batch.files)} 个文件，{len(batch.maps)} 张不同的地图）", ""]
+    lines.append("| 回放结果 | episode 数 |")
+    lines.append("|----------|------------|")
+    for code, name in OUTCOME_NAMES.items():
+        lines.append(f"| {name} | {int((result['outcome'] == code).sum())} |")
+    lines.append("")
+    lines.append(f"final_score 与回放不一致: {int(score_mismatch.sum())}")
+    lines.append(f"step_count 与回放不一致: {int(step_mismatch.sum())}")
+
+    gap = optimality_gap(batch, result)
+    success = result["score"] == 1.0
+    lines.append("")
+    lines.append("| 最优性差距 | episode 数 | 平均 | 为 0 的比例 |")
+    lines.append("|------------|------------|------|-------------|")
+    for name, mask in (("成功: 多走的步数", success), ("失败: 离目的地的步数", ~success)):
+        values = gap[mask & ~np.isnan(gap)]
+        if len(values):
+            lines.append(f"| {name} | {len(values)} | {values.mean():.3f} | {(values == 0).mean():.3f} |")
+
+    bad_files = np.unique(file_idx[score_mismatch | step_mismatch])
+    if len(bad_files):
+        lines.append("")
+        lines.append(f"有不一致的文件 ({len(bad_files)}):")
+    for i in bad_files:
+        lines.append(f"- {batch.files[i].relative_to(base_dir)}")
+        in_file = file_idx == i
+        for name, mask in (("final_score", score_mismatch), ("step_count", step_mismatch)):
+            hits = np.flatnonzero(mask & in_file)
+            if len(hits):
+                shown = ", ".join(
+                    f"#{record[k]}（记录 {batch.score[k] if name == 'final_score' else batch.step_count[k]}，"
+                    f"回放 {result['score'][k] if name == 'final_score' else result['steps'][k]}）"
+                    for k in hits[:examples]
+                )
+                more = " ..." if len(hits) > examples else ""
+                lines.append(f"    {name}: {len(hits)} 行 {shown}{more}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放所有 frozenlake episode，检查 final_score 和 step_count")
+    parser.add_argument("base_dir", nargs="?", default=str(BASE_DIR), help="搜索的根目录")
+    parser.add_argument("--examples", type=int, default=3, help="每个文件列出的不一致记录个数")
+    parser.add_argument("--exclude", nargs="*", default=DEFAULT_EXCLUDES, help="跳过的顶层目录（支持通配符）")
+    parser.add_argument("--strict", action="store_true", help="有任何不一致时以非零状态退出")
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir)
+    start = time.perf_counter()
+    batch = EpisodeBatch()
+    for csv_path in find_summary_files(base_dir, args.exclude):
+        # 文件夹名不符合命名规则时按行中的 env_name 筛选
+        if folder_identity(csv_path)[0] in ("frozenlake", None):
+            try:
+                batch.add_file(csv_path)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"读取 {csv_path} 失败: {e}", file=sys.stderr)
+    if not len(batch):
+        print("未找到任何 frozenlake episode")
+        return 0
+    loaded = time.perf_counter()
+    result = replay(batch)
+    elapsed = time.perf_counter()
+
+    print(format_report(batch, result, base_dir, args.examples))
+    print(f"\n⏱️ 读取 {loaded - start:.2f}s，回放 {elapsed - loaded:.3f}s")
+    mismatch = ~np.isclose(np.array(batch.score), result["score"]) | (np.array(batch.step_count) != result["steps"])
+    return 1 if args.strict and mismatch.any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,10 +9,15 @@
 - explicit 和 implicit 分开成两个独立的表格文件
 """
 
-import csv
+import argparse
 from pathlib import Path
 from collections import defaultdict
-from datetime import datetime
+
+from run_manifest import load_manifest, get_items_per_env
+from table_deps import DependencyGraph, DEPS_FILE_NAME
+from table_export import parse_formats
+from table_layout import OutputSpec, render_model_tables
+from table_writer import format_write_report
 
 # 配置
 BASE_DIR = Path("/data/xingkun/experiment_result")
@@ -65,18 +70,12 @@ METHODS = [
     "voyager_True_True",
 ]
 
-# 行顺序
-ROW_ORDER = [
-    "no-memory",
-    "vanilla", "vanilla-glove",
-    "memorybank", "memorybank-glove",
-    "voyager", "voyager-glove",
-    "generative", "generative-glove",
-]
-
 # 最小数据点要求
 MIN_DATA_POINTS = 20
 
+# 依赖跟踪中的指标名（见 table_deps.py）
+METRIC = "raw"
+
 
 def find_env_folder(model_dir: Path, prefix: str, env: str) -> Path | None:
     """查找环境文件夹"""
@@ -136,41 +135,12 @@ def parse_method(method: str) -> tuple:
     return (parts[0], parts[1], parts[2])
 
 
-def extract_scores_from_csv(csv_path: Path) -> list:
-    """从CSV文件提取最后一列的分数"""
-    values = []
-    try:
-        with open(csv_path, "r", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            next(reader, None)  # 跳过标题行
-            for row in reader:
-                if row:
-                    try:
-                        values.append(float(row[-1]))
-                    except ValueError:
-                        pass
-    except Exception as e:
-        print(f"读取 {csv_path} 失败: {e}")
-    return values
+def parse_score(text: str) -> float:
+    """解析最后一列的分数，无法解析时抛出 ValueError"""
+    return float(text)
 
 
-def calculate_env_averages(values: list, items_per_env: int = 20) -> list:
-    """
-    计算每个环境的平均值。
-    如果某个环境的数据点少于 MIN_DATA_POINTS，返回 None 表示该环境数据不全。
-    """
-    averages = []
-    for i in range(0, len(values), items_per_env):
-        chunk = values[i:i + items_per_env]
-        if len(chunk) >= MIN_DATA_POINTS:
-            avg = sum(chunk) / len(chunk)
-            averages.append(avg)
-        else:
-            averages.append(None)  # 数据不全，留空
-    return averages
-
-
-def generate_model_table(model_folder: str, model_prefix: str, model_variants: list, display_name: str):
+def generate_model_table(model_folder: str, model_prefix: str, model_variants: list, display_name: str, graph: DependencyGraph):
     """为单个模型生成表格数据"""
     model_dir = BASE_DIR / model_folder
     
@@ -182,6 +152,8 @@ def generate_model_table(model_folder: str, model_prefix: str, model_variants: l
     data = {
         "explicit": defaultdict(lambda: defaultdict(list)),
         "implicit": defaultdict(lambda: defaultdict(list)),
+        # 每个 cell 的来源: sources[explicit/implicit][row_name][env] = describe_source(...)
+        "sources": {"explicit": defaultdict(dict), "implicit": defaultdict(dict)},
     }
     
     for env_name, env_short, exp_type in ENVIRONMENTS:
@@ -204,106 +176,58 @@ def generate_model_table(model_folder: str, model_prefix: str, model_variants: l
             if not row_name:
                 continue
             
-            # 提取分数并计算平均值
-            values = extract_scores_from_csv(csv_path)
-            averages = calculate_env_averages(values, 20)
+            # 提取分数并按组计算平均值；源文件未变化的组直接复用上次结果（见 table_deps.py）
+            # 有清单时按清单的每组 episode 数分组，并校验总条数
+            manifest = load_manifest(method_folder)
+            items_per_env = get_items_per_env(manifest, 20)
+            try:
+                averages, source = graph.block_averages(
+                    csv_path, method_folder, get_log_folder_name(env_name, model_prefix, method), manifest,
+                    items_per_env, min(MIN_DATA_POINTS, items_per_env), METRIC, parse_score,
+                )
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"读取 {csv_path} 失败: {e}")
+                continue
+            num_values = sum(block["count"] for block in source["blocks"])
+            if manifest and num_values != manifest["expected_episodes"]:
+                print(f"  ⚠️ {csv_path}: {num_values}/{manifest['expected_episodes']} 条（清单）")
             
             data[exp_type][row_name][env_short] = averages
+            data["sources"][exp_type][row_name][env_short] = source
     
     return data
 
 
-def write_explicit_csv(model_data: dict, display_name: str, output_file: Path):
-    """为单个模型写入 explicit CSV文件"""
-    envs = ["webshop", "frozenlake", "mountaincar"]
-    
-    with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        
-        # 标题行1: 模型名
-        writer.writerow([display_name] + [""] * 9)
-        
-        # 标题行2: 环境大类
-        writer.writerow(["", "webshop", "", "", "frozen lake", "", "", "mountain car", "", ""])
-        
-        # 标题行3: env0, env1, env2
-        writer.writerow(["", "env0", "env1", "env2", "env0", "env1", "env2", "env0", "env1", "env2"])
-        
-        # explicit 数据行
-        for row_name in ROW_ORDER:
-            row_data = [row_name]
-            
-            for env in envs:
-                averages = model_data["explicit"].get(row_name, {}).get(env, []) if model_data else []
-                
-                for i in range(3):
-                    if i < len(averages) and averages[i] is not None:
-                        row_data.append(f"{averages[i]:.4f}")
-                    else:
-                        row_data.append("")
-            
-            writer.writerow(row_data)
-
-
-def write_implicit_csv(model_data: dict, display_name: str, output_file: Path):
-    """为单个模型写入 implicit CSV文件"""
-    envs = ["webshop", "frozenlake"]  # implicit 只有 webshop 和 frozenlake
-    
-    with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        
-        # 标题行1: 模型名
-        writer.writerow([display_name] + [""] * 4)
-        
-        # 标题行2: 环境大类
-        writer.writerow(["", "webshop", "", "frozen lake", ""])
-        
-        # 标题行3: env0, env1 (implicit 只有 2 个环境)
-        writer.writerow(["", "env0", "env1", "env0", "env1"])
-        
-        # implicit 数据行
-        for row_name in ROW_ORDER:
-            row_data = [row_name]
-            
-            for env in envs:
-                averages = model_data["implicit"].get(row_name, {}).get(env, []) if model_data else []
-                
-                for i in range(2):  # implicit 只有 env0, env1
-                    if i < len(averages) and averages[i] is not None:
-                        row_data.append(f"{averages[i]:.4f}")
-                    else:
-                        row_data.append("")
-            
-            writer.writerow(row_data)
-
 
 def main():
     print("🔍 开始为所有模型生成表格（explicit/implicit 分离版本）...")
     
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="忽略依赖缓存，全部重新计算并重写所有表格")
+    parser.add_argument("--export", type=parse_formats, default=[], help="同时导出的其他格式，逗号分隔（latex,markdown,json,xlsx）或 all")
+    args = parser.parse_args()
+    
+    graph = DependencyGraph(BASE_DIR / DEPS_FILE_NAME, force=args.full)
     all_data = {}
     
     for model_folder, (model_prefix, model_variants, display_name) in MODELS.items():
         print(f"\n处理模型: {display_name} ({model_folder})")
-        model_data = generate_model_table(model_folder, model_prefix, model_variants, display_name)
+        model_data = generate_model_table(model_folder, model_prefix, model_variants, display_name, graph)
         all_data[model_folder] = model_data
     
-    # 为每个模型生成 explicit 和 implicit 两个独立的表格
-    for model_folder, (model_prefix, model_variants, display_name) in MODELS.items():
-        model_data = all_data.get(model_folder)
-        if model_data:
-            # explicit 表格
-            explicit_output = BASE_DIR / f"table_{model_folder}_explicit.csv"
-            write_explicit_csv(model_data, display_name, explicit_output)
-            print(f"  生成: {explicit_output}")
-            
-            # implicit 表格
-            implicit_output = BASE_DIR / f"table_{model_folder}_implicit.csv"
-            write_implicit_csv(model_data, display_name, implicit_output)
-            print(f"  生成: {implicit_output}")
+    # 每个模型的 explicit 和 implicit 两个独立的表格，由 table_layout 一次遍历生成
+    specs = [
+        OutputSpec(METRIC, "explicit", "model", "table_{model}_explicit.csv"),
+        OutputSpec(METRIC, "implicit", "model", "table_{model}_implicit.csv"),
+    ]
+    
+    models = [(model_folder, display_name) for model_folder, (_, _, display_name) in MODELS.items()]
+    render_model_tables({METRIC: all_data}, specs, models, BASE_DIR, graph, args.export)
+    
+    graph.save()
+    print(f"\n📦 增量统计: {graph.summary()}")
+    print(format_write_report())
 
 
 if __name__ == "__main__":
     main()
-
-
-
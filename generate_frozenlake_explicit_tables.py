@@ -7,10 +7,16 @@
 数据按 20 个一组分成 env0, env1, env2。
 """
 
-import csv
+import argparse
 from pathlib import Path
 from collections import defaultdict
 
+from run_manifest import load_manifest, get_items_per_env
+from table_deps import DependencyGraph, DEPS_FILE_NAME
+from table_export import parse_formats
+from table_layout import render_version_tables
+from table_writer import format_write_report
+
 # 配置
 BASE_DIR = Path("/data/xingkun/experiment_result/frozenlak_explicit")
 OUTPUT_DIR = Path("/data/xingkun/experiment_result")
@@ -57,15 +63,6 @@ METHOD_TO_ROW = {
     ("generative", "True", "True"): "generative-glove",
 }
 
-# 行顺序
-ROW_ORDER = [
-    "no-memory",
-    "vanilla", "vanilla-glove",
-    "memorybank", "memorybank-glove",
-    "voyager", "voyager-glove",
-    "generative", "generative-glove",
-]
-
 # 模型显示顺序
 MODEL_ORDER = [
     "Llama3.1-8B",
@@ -82,6 +79,9 @@ MODEL_ORDER = [
 MIN_DATA_POINTS = 20
 ITEMS_PER_ENV = 20
 
+# 依赖跟踪中的指标名（见 table_deps.py）
+METRIC = "raw"
+
 
 def parse_method(method: str) -> tuple:
     """解析方法字符串为 (memory_type, use_memory, use_glove)"""
@@ -89,39 +89,9 @@ def parse_method(method: str) -> tuple:
     return (parts[0], parts[1], parts[2])
 
 
-def extract_scores_from_csv(csv_path: Path) -> list:
-    """从CSV文件提取最后一列的分数"""
-    values = []
-    try:
-        with open(csv_path, "r", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            next(reader, None)  # 跳过标题行
-            for row in reader:
-                if row:
-                    try:
-                        values.append(float(row[-1]))
-                    except ValueError:
-                        pass
-    except Exception as e:
-        print(f"  读取 {csv_path} 失败: {e}")
-    return values
-
-
-def calculate_env_averages(values: list, items_per_env: int = ITEMS_PER_ENV) -> list:
-    """
-    计算每个环境的平均值。
-    将数据按 items_per_env 分组，返回 [env0_avg, env1_avg, env2_avg]。
-    如果某个环境的数据点少于 MIN_DATA_POINTS，返回 None 表示该环境数据不全。
-    """
-    averages = []
-    for i in range(0, len(values), items_per_env):
-        chunk = values[i:i + items_per_env]
-        if len(chunk) >= MIN_DATA_POINTS:
-            avg = sum(chunk) / len(chunk)
-            averages.append(avg)
-        else:
-            averages.append(None)  # 数据不全，留空
-    return averages
+def parse_score(text: str) -> float:
+    """解析最后一列的分数，无法解析时抛出 ValueError"""
+    return float(text)
 
 
 def find_model_folder(version_dir: Path, model_key: str) -> Path | None:
@@ -157,17 +127,19 @@ def find_log_folder(model_folder: Path, model_variants: list, method: str) -> Pa
     return None
 
 
-def process_version(version: str) -> dict:
-    """处理单个版本，返回数据字典"""
+def process_version(version: str, graph: DependencyGraph) -> tuple:
+    """处理单个版本，返回 (数据字典, 来源字典)"""
     version_dir = BASE_DIR / version
     print(f"\n处理版本: {version}")
     
     if not version_dir.exists():
         print(f"  版本目录不存在: {version_dir}")
-        return {}
+        return {}, {}
     
     # 数据结构: data[display_name][row_name] = [env0_avg, env1_avg, env2_avg]
     data = defaultdict(dict)
+    # 每个 cell 的来源: sources[display_name][row_name] = describe_source(...)
+    sources = defaultdict(dict)
     
     for model_key, (model_variants, display_name) in MODEL_PATTERNS.items():
         model_folder = find_model_folder(version_dir, model_key)
@@ -192,119 +164,63 @@ def process_version(version: str) -> dict:
             if not row_name:
                 continue
             
-            # 提取分数并计算每个环境的平均值
-            values = extract_scores_from_csv(csv_path)
-            env_averages = calculate_env_averages(values, ITEMS_PER_ENV)
+            # 提取分数并按组计算每个环境的平均值；源文件未变化的组直接复用上次结果（见 table_deps.py）
+            # 有清单时按清单的每组 episode 数分组，并校验总条数
+            manifest = load_manifest(log_folder)
+            items_per_env = get_items_per_env(manifest, ITEMS_PER_ENV)
+            expected_names = [f"log_frozenlake_{variant}_{method}" for variant in model_variants]
+            expected_name = log_folder.name if log_folder.name in expected_names else expected_names[0]
+            try:
+                env_averages, source = graph.block_averages(
+                    csv_path, log_folder, expected_name, manifest,
+                    items_per_env, min(MIN_DATA_POINTS, items_per_env), METRIC, parse_score,
+                )
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"  读取 {csv_path} 失败: {e}")
+                continue
+            num_values = sum(block["count"] for block in source["blocks"])
+            if manifest and num_values != manifest["expected_episodes"]:
+                print(f"    ⚠️ {row_name}: {num_values}/{manifest['expected_episodes']} 条（清单）")
             
             data[display_name][row_name] = env_averages
+            sources[display_name][row_name] = source
             
             # 打印调试信息
             avg_strs = [f"{a:.4f}" if a is not None else "N/A" for a in env_averages]
-            print(f"    {row_name}: {avg_strs} ({len(values)} 数据点)")
+            print(f"    {row_name}: {avg_strs} ({num_values} 数据点)")
     
-    return data
-
-
-def write_version_csv(version: str, data: dict, output_file: Path):
-    """为单个版本写入 CSV 文件"""
-    with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        
-        # 获取该版本中存在的模型（按顺序）
-        available_models = [m for m in MODEL_ORDER if m in data]
-        
-        if not available_models:
-            print(f"  {version} 没有可用数据，跳过生成表格")
-            return
-        
-        # 标题行1: 版本信息
-        header1 = [f"FrozenLake Explicit - {version}"]
-        for model in available_models:
-            header1.extend([model, "", ""])
-        writer.writerow(header1)
-        
-        # 标题行2: env0, env1, env2 (每个模型重复)
-        header2 = ["Method"]
-        for _ in available_models:
-            header2.extend(["env0", "env1", "env2"])
-        writer.writerow(header2)
-        
-        # 数据行
-        for row_name in ROW_ORDER:
-            row_data = [row_name]
-            for model in available_models:
-                env_averages = data.get(model, {}).get(row_name, [])
-                for i in range(3):
-                    if i < len(env_averages) and env_averages[i] is not None:
-                        row_data.append(f"{env_averages[i]:.4f}")
-                    else:
-                        row_data.append("")
-            writer.writerow(row_data)
-    
-    print(f"  生成: {output_file}")
-
-
-def write_summary_csv(all_data: dict, output_file: Path):
-    """生成汇总表格，包含所有版本"""
-    with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        
-        # 标题行1: 版本
-        header1 = [""]
-        for version in VERSIONS:
-            # 每个版本有 7 个模型 × 3 个 env = 21 列
-            header1.extend([version] + [""] * (len(MODEL_ORDER) * 3 - 1))
-        writer.writerow(header1)
-        
-        # 标题行2: 模型名称（每个版本重复）
-        header2 = [""]
-        for version in VERSIONS:
-            for model in MODEL_ORDER:
-                header2.extend([model, "", ""])
-        writer.writerow(header2)
-        
-        # 标题行3: env0, env1, env2
-        header3 = ["Method"]
-        for version in VERSIONS:
-            for _ in MODEL_ORDER:
-                header3.extend(["env0", "env1", "env2"])
-        writer.writerow(header3)
-        
-        # 数据行
-        for row_name in ROW_ORDER:
-            row_data = [row_name]
-            for version in VERSIONS:
-                version_data = all_data.get(version, {})
-                for model in MODEL_ORDER:
-                    env_averages = version_data.get(model, {}).get(row_name, [])
-                    for i in range(3):
-                        if i < len(env_averages) and env_averages[i] is not None:
-                            row_data.append(f"{env_averages[i]:.4f}")
-                        else:
-                            row_data.append("")
-            writer.writerow(row_data)
-    
-    print(f"\n生成汇总表格: {output_file}")
+    return data, sources
 
 
 def main():
     print("🔍 开始为 frozenlak_explicit 每个版本生成表格（分 env0/env1/env2）...")
     
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="忽略依赖缓存，全部重新计算并重写所有表格")
+    parser.add_argument("--export", type=parse_formats, default=[], help="同时导出的其他格式，逗号分隔（latex,markdown,json,xlsx）或 all")
+    args = parser.parse_args()
+    
+    graph = DependencyGraph(OUTPUT_DIR / DEPS_FILE_NAME, force=args.full)
     all_data = {}
+    all_sources = {}
     
     # 处理每个版本
     for version in VERSIONS:
-        data = process_version(version)
+        data, sources = process_version(version, graph)
         all_data[version] = data
-        
-        # 为每个版本生成单独的表格
-        if data:
-            output_file = OUTPUT_DIR / f"table_frozenlake_explicit_{version}.csv"
-            write_version_csv(version, data, output_file)
+        all_sources[version] = sources
+    
+    # 每个版本单独的表格和汇总表格，由 table_layout 一次遍历生成
+    print()
+    render_version_tables(
+        all_data, all_sources, VERSIONS, MODEL_ORDER, "FrozenLake Explicit",
+        "table_frozenlake_explicit_{version}.csv", "table_frozenlake_explicit_summary.csv",
+        OUTPUT_DIR, METRIC, graph, args.export,
+    )
     
-    # 生成汇总表格
-    summary_file = OUTPUT_DIR / "table_frozenlake_explicit_summary.csv"
-    write_summary_csv(all_data, summary_file)
+    graph.save()
+    print(f"\n📦 增量统计: {graph.summary()}")
+    print(format_write_report())
     
     print("\n✅ 完成！")
 
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+一次运行生成所有模型的 raw / ceiling、合并 / 分离表格。
+
+等价于依次运行 generate_all_tables.py、generate_all_tables_ceiling.py、
+generate_all_tables_split.py 和 generate_all_tables_ceiling_split.py，但:
+- 实验目录只遍历一次，每个 explorer_summary.csv 只描述（读取）一次，
+  raw 和 ceiling 两种指标一起计算（见 DependencyGraph.block_averages_multi）
+- 所有输出表格由 table_layout 在一次遍历中生成
+- --extra-metrics 额外生成回放指标的表格（如 mountaincar 的 mc_max_position，
+  见 mountaincar_replay.py；frozenlake 的 fl_optimality_gap，见 frozenlake_replay.py），
+  每个指标一个 table_<指标>_<模型>_explicit.csv 和 table_<指标>_<模型>_implicit.csv
+
+用法:
+    python generate_tables.py [--full] [--all-models] [--export latex,markdown,json,xlsx]
+                              [--extra-metrics mc_max_position,fl_optimality_gap]
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime
+
+from generate_all_tables import (
+    BASE_DIR, MODELS, ENVIRONMENTS, METHODS, METHOD_TO_ROW, MIN_DATA_POINTS,
+    find_env_folder, find_method_folder, get_log_folder_name, parse_method, parse_score,
+)
+from generate_all_tables_ceiling import parse_score as parse_ceiling_score
+import frozenlake_replay
+import mountaincar_replay
+from run_manifest import load_manifest, get_items_per_env
+from table_deps import DependencyGraph, DEPS_FILE_NAME
+from table_export import parse_formats
+from table_layout import OutputSpec, render_model_tables
+from table_writer import format_write_report
+
+# 指标名 -> 最后一列的解析函数（指标名与各单独脚本的 METRIC 一致，共用依赖缓存）
+METRICS = {
+    "raw": parse_score,
+    "ceiling": parse_ceiling_score,
+}
+
+# 额外的回放指标（--extra-metrics）
+ROW_METRICS = {**mountaincar_replay.ROW_METRICS, **frozenlake_replay.ROW_METRICS}
+
+# 每个模型的输出表格（与各单独脚本的文件名一致）
+MODEL_SPECS = [
+    OutputSpec("raw", "combined", "model", "table_{model}.csv"),
+    OutputSpec("ceiling", "combined", "model", "table_ceiling_{model}.csv"),
+    OutputSpec("raw", "explicit", "model", "table_{model}_explicit.csv"),
+    OutputSpec("raw", "implicit", "model", "table_{model}_implicit.csv"),
+    OutputSpec("ceiling", "explicit", "model", "table_ceiling_{model}_explicit.csv"),
+    OutputSpec("ceiling", "implicit", "model", "table_ceiling_{model}_implicit.csv"),
+]
+
+
+def generate_model_tables(model_folder: str, model_prefix: str, display_name: str, graph: DependencyGraph,
+                          metrics: dict = METRICS) -> dict | None:
+    """
+    为单个模型同时计算所有指标的表格数据。
+    返回 {指标名: 与 generate_all_tables.generate_model_table 相同结构的数据}
+    """
+    model_dir = BASE_DIR / model_folder
+
+    if not model_dir.exists():
+        print(f"  模型目录不存在: {model_dir}")
+        return None
+
+    # 来源与指标无关，所有指标共用同一个 sources
+    sources = {"explicit": defaultdict(dict), "implicit": defaultdict(dict)}
+    data = {
+        metric: {
+            "explicit": defaultdict(lambda: defaultdict(list)),
+            "implicit": defaultdict(lambda: defaultdict(list)),
+            "sources": sources,
+        }
+        for metric in metrics
+    }
+
+    for env_name, env_short, exp_type in ENVIRONMENTS:
+        env_folder = find_env_folder(model_dir, model_prefix, env_name)
+        if not env_folder:
+            continue
+
+        for method in METHODS:
+            method_folder = find_method_folder(env_folder, model_prefix, env_name, method)
+            if not method_folder:
+                continue
+
+            csv_path = method_folder / "log" / "explorer_summary.csv"
+            if not csv_path.exists():
+                continue
+
+            # 解析方法获取行名
+            memory_type, use_memory, use_glove = parse_method(method)
+            row_name = METHOD_TO_ROW.get((memory_type, use_memory, use_glove))
+            if not row_name:
+                continue
+
+            manifest = load_manifest(method_folder)
+            items_per_env = get_items_per_env(manifest, 20)
+            try:
+                averages, source = graph.block_averages_multi(
+                    csv_path, method_folder, get_log_folder_name(env_name, model_prefix, method), manifest,
+                    items_per_env, min(MIN_DATA_POINTS, items_per_env), metrics,
+                )
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"读取 {csv_path} 失败: {e}")
+                continue
+            num_values = sum(block["count"] for block in source["blocks"])
+            if manifest and num_values != manifest["expected_episodes"]:
+                print(f"  ⚠️ {csv_path}: {num_values}/{manifest['expected_episodes']} 条（清单）")
+
+            for metric in metrics:
+                data[metric][exp_type][row_name][env_short] = averages[metric]
+            sources[exp_type][row_name][env_short] = source
+
+    return data
+
+
+def main():
+    print("🔍 开始为所有模型生成全部表格（raw/ceiling × 合并/分离）...")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="忽略依赖缓存，全部重新计算并重写所有表格")
+    parser.add_argument("--export", type=parse_formats, default=[], help="同时导出的其他格式，逗号分隔（latex,markdown,json,xlsx）或 all")
+    parser.add_argument("--all-models", action="store_true", help="同时生成所有模型合并在一个文件中的表格")
+    parser.add_argument("--extra-metrics", default="",
+                        help=f"额外的回放指标，逗号分隔（可选: {', '.join(ROW_METRICS)}）或 all")
+    args = parser.parse_args()
+
+    extra = list(ROW_METRICS) if args.extra_metrics == "all" else [m.strip() for m in args.extra_metrics.split(",") if m.strip()]
+    unknown = [metric for metric in extra if metric not in ROW_METRICS]
+    if unknown:
+        parser.error(f"未知指标: {', '.join(unknown)}（可选: {', '.join(ROW_METRICS)}）")
+    metrics = dict(METRICS)
+    metrics.update({metric: ROW_METRICS[metric] for metric in extra})
+
+    graph = DependencyGraph(BASE_DIR / DEPS_FILE_NAME, force=args.full)
+    data_by_metric = {metric: {} for metric in metrics}
+
+    for model_folder, (model_prefix, model_variants, display_name) in MODELS.items():
+        print(f"\n处理模型: {display_name} ({model_folder})")
+        model_data = generate_model_tables(model_folder, model_prefix, display_name, graph, metrics)
+        for metric in metrics:
+            data_by_metric[metric][model_folder] = model_data[metric] if model_data else None
+
+    specs = list(MODEL_SPECS)
+    # 回放指标每个一对 explicit / implicit 表格（frozenlake 两种都有；mountaincar 只有 explicit，
+    # 其 implicit 表格为空）
+    for metric in extra:
+        specs.append(OutputSpec(metric, "explicit", "model", f"table_{metric}_{{model}}_explicit.csv"))
+        specs.append(OutputSpec(metric, "implicit", "model", f"table_{metric}_{{model}}_implicit.csv"))
+    if args.all_models:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        specs.append(OutputSpec("raw", "combined", "all", f"all_models_table_{timestamp}.csv"))
+        specs.append(OutputSpec("ceiling", "combined", "all", f"all_models_table_ceiling_{timestamp}.csv"))
+
+    print()
+    models = [(model_folder, display_name) for model_folder, (_, _, display_name) in MODELS.items()]
+    render_model_tables(data_by_metric, specs, models, BASE_DIR, graph, args.export)
+
+    graph.save()
+    print(f"\n📦 增量统计: {graph.summary()}")
+    print(format_write_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+MountainCar 批量物理回放: 用 action_path 重新模拟每个 episode，得到比 final_score 更稠密的进度指标。
+
+mountaincar 的 final_score 几乎都是 0，表格里看不出差别；回放后可以得到:
+- max_position: 到达的最远位置（-1.2 ~ 0.6，目标 0.5）
+- reach_time:   第一次到达 REACH_POSITION 所用的步数，没有到达记为 MAX_STEPS
+- energy:       最大机械能，归一化为 谷底 = 0、恰好能冲上目标 = 1
+
+动力学与 gym MountainCar 相同，三个环境（每块 20 个 episode）只有 force 不同
+（见 old/*/mountain_car/test_mountainCar_*.py 中的 forces）。
+日志中没有记录初始位置（gym 在 [-0.6, -0.4] 中随机），因此每个 episode 在
+START_POSITIONS 上同时模拟，只保留与记录一致的初始位置后取平均:
+成功的 episode 取到达目标的步数最接近 step_count 的初始位置（初始位置是离散取点，
+不一定恰好在最后一步到达），失败的 episode 取始终没有到达目标的初始位置；
+没有一致的初始位置时使用全部初始位置。
+
+所有 episode × 初始位置在一个 (episode, start) 数组上按步同时推进。
+
+ROW_METRICS 把这些指标以 mc_ 前缀注册为表格指标（见 generate_tables.py --extra-metrics
+和 table_pivot.py --metric）。
+
+用法:
+    python mountaincar_replay.py [base_dir] [--exclude old _tmp*]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from generate_all_tables import BASE_DIR
+from table_deps import RowMetric
+from row_schema import DEFAULT_EXCLUDES, find_summary_files, folder_identity
+from run_manifest import load_manifest, get_items_per_env
+
+# 每块（env0/env1/env2）的 force，按块循环
+FORCES = [0.0016, 0.00159, 0.00158]
+GRAVITY = 0.0025
+MAX_SPEED = 0.07
+MIN_POSITION = -1.2
+MAX_POSITION = 0.6
+GOAL_POSITION = 0.5
+MAX_STEPS = 200
+
+# gym 初始位置的取值范围上均匀取点
+START_POSITIONS = np.linspace(-0.6, -0.4, 21)
+
+# reach_time 统计的位置
+REACH_POSITION = 0.0
+
+# 指标名 -> 说明（表格/透视表中的指标名加 mc_ 前缀）
+METRIC_NAMES = {
+    "max_position": "到达的最远位置",
+    "reach_time": f"第一次到达 {REACH_POSITION} 的步数",
+    "energy": "归一化最大机械能",
+}
+
+ENERGY_BOTTOM = -GRAVITY / 3
+ENERGY_GOAL = GRAVITY / 3 * np.sin(3 * GOAL_POSITION)
+
+
+def action_matrix(action_paths: list) -> tuple:
+    """动作列表 -> (episode × step 数组，空位为 1 即不加力；每个 episode 的长度)"""
+    lengths = np.array([len(path) for path in action_paths], dtype=np.int64)
+    width = int(lengths.max()) if len(lengths) else 0
+    matrix = np.ones((len(action_paths), width), dtype=np.int64)
+    if lengths.sum():
+        flat = np.fromiter((a for path in action_paths for a in path), dtype=np.int64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(action_paths)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        matrix[rows, np.arange(len(flat)) - np.repeat(offsets, lengths)] = flat
+    return matrix, lengths
+
+
+def simulate(matrix: np.ndarray, lengths: np.ndarray, forces: np.ndarray) -> dict:
+    """
+    在 (episode, start) 上同时模拟，返回形状为 (episode, start) 的数组:
+    max_position、reach_time、goal_step（到达目标的步数，没有到达为 MAX_STEPS + 1）、energy
+    """
+    n, n_steps = matrix.shape
+    shape = (n, len(START_POSITIONS))
+    result = {
+        "max_position": np.broadcast_to(START_POSITIONS, shape).copy(),
+        "max_energy": np.broadcast_to(GRAVITY / 3 * np.sin(3 * START_POSITIONS), shape).copy(),
+        "reach_time": np.full(shape, MAX_STEPS, dtype=np.int64),
+        "goal_step": np.full(shape, MAX_STEPS + 1, dtype=np.int64),
+    }
+
+    # 只推进还有 episode 在走的行；rows 是这些行在完整数组中的下标，state 与 rows 一一对应
+    rows = np.flatnonzero(lengths > 0)
+    state = {name: values[rows] for name, values in result.items()}
+    position = state["max_position"].copy()
+    velocity = np.zeros_like(position)
+    active = np.ones_like(position, dtype=bool)
+    force = forces[rows, None]
+    steps = matrix[rows]
+    row_lengths = lengths[rows]
+
+    for t in range(n_steps):
+        # 动作已经用完或所有初始位置都已到达目标的行写回结果，不再推进
+        keep = (t < row_lengths) & active.any(axis=1)
+        if not keep.all():
+            done = ~keep
+            for name, values in state.items():
+                result[name][rows[done]] = values[done]
+                state[name] = values[keep]
+            rows, position, velocity, active = rows[keep], position[keep], velocity[keep], active[keep]
+            force, steps, row_lengths = force[keep], steps[keep], row_lengths[keep]
+        if not len(rows):
+            break
+
+        acceleration = np.cos(3 * position)
+        acceleration *= -GRAVITY
+        acceleration += (steps[:, t] - 1)[:, None] * force
+        new_velocity = velocity + acceleration
+        np.clip(new_velocity, -MAX_SPEED, MAX_SPEED, out=new_velocity)
+        new_position = position + new_velocity
+        np.clip(new_position, MIN_POSITION, MAX_POSITION, out=new_position)
+        new_velocity[(new_position == MIN_POSITION) & (new_velocity < 0)] = 0.0
+        np.copyto(position, new_position, where=active)
+        np.copyto(velocity, new_velocity, where=active)
+
+        energy = np.sin(3 * position)
+        energy *= GRAVITY / 3
+        energy += 0.5 * velocity * velocity
+        np.maximum(state["max_position"], position, out=state["max_position"])
+        np.maximum(state["max_energy"], energy, out=state["max_energy"])
+        reached = active & (position >= REACH_POSITION) & (state["reach_time"] == MAX_STEPS)
+        state["reach_time"][reached] = t + 1
+        at_goal = active & (position >= GOAL_POSITION)
+        state["goal_step"][at_goal] = t + 1
+        # 到达目标后 episode 结束
+        active &= ~at_goal
+
+    for name, values in state.items():
+        result[name][rows] = values
+
+    result["energy"] = (result.pop("max_energy") - ENERGY_BOTTOM) / (ENERGY_GOAL - ENERGY_BOTTOM)
+    return result
+
+
+def episode_metrics(action_paths: list, blocks: np.ndarray, scores: np.ndarray) -> dict:
+    """
+    每个 episode 的回放指标 {指标名: 长度为 episode 数的数组}，另有 consistent:
+    与记录一致的初始位置个数（0 表示没有一致的初始位置，指标按全部初始位置平均）。
+    """
+    matrix, lengths = action_matrix(action_paths)
+    forces = np.array(FORCES)[np.asarray(blocks, dtype=np.int64) % len(FORCES)]
+    sim = simulate(matrix, lengths, forces)
+
+    success = (np.asarray(scores) == 1.0)[:, None]
+    # 成功: 到达目标的步数与 step_count 最接近的初始位置；失败: 在动作用完前没有到达目标的初始位置
+    miss = np.where(sim["goal_step"] <= MAX_STEPS, np.abs(sim["goal_step"] - lengths[:, None]), MAX_STEPS + 1)
+    best_fit = (miss == miss.min(axis=1, keepdims=True)) & (miss <= MAX_STEPS)
+    consistent = np.where(success, best_fit, sim["goal_step"] > lengths[:, None])
+    n_consistent = consistent.sum(axis=1)
+    weights = np.where(n_consistent[:, None] > 0, consistent, True).astype(np.float64)
+    weights /= weights.sum(axis=1, keepdims=True)
+
+    metrics = {name: (sim[name] * weights).sum(axis=1) for name in METRIC_NAMES}
+    metrics["consistent"] = n_consistent
+    return metrics
+
+
+def rows_metrics(rows: list, block: int) -> dict:
+    """一组 CSV 行（同一块）的回放指标；不是 mountaincar 或无法解析的行为 NaN"""
+    index, action_paths, scores = [], [], []
+    for i, row in enumerate(rows):
+        if len(row) != 7 or row[2] != "mountaincar":
+            continue
+        try:
+            action_paths.append(json.loads(row[4]))
+            scores.append(float(row[6]))
+        except ValueError:
+            continue
+        index.append(i)
+
+    result = {name: np.full(len(rows), np.nan) for name in METRIC_NAMES}
+    if index:
+        metrics = episode_metrics(action_paths, np.full(len(index), block), np.array(scores))
+        for name in METRIC_NAMES:
+            result[name][index] = metrics[name]
+    return result
+
+
+def _block_metric(name: str, rows: list, block_idx: int) -> np.ndarray:
+    return rows_metrics(rows, block_idx)[name]
+
+
+# 表格指标名 -> RowMetric（按整组记录回放）
+ROW_METRICS = {f"mc_{name}": RowMetric(partial(_block_metric, name)) for name in METRIC_NAMES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放所有 mountaincar episode，计算稠密的进度指标")
+    parser.add_argument("base_dir", nargs="?", default=str(BASE_DIR), help="搜索的根目录")
+    parser.add_argument("--exclude", nargs="*", default=DEFAULT_EXCLUDES, help="跳过的顶层目录（支持通配符）")
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir)
+    start = time.perf_counter()
+    action_paths, blocks, scores, files = [], [], [], []
+    for csv_path in find_summary_files(base_dir, args.exclude):
+        if folder_identity(csv_path)[0] not in ("mountaincar", None):
+            continue
+        items_per_env = get_items_per_env(load_manifest(csv_path.parent.parent), 20)
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for j, row in enumerate(reader):
+                if len(row) != 7 or row[2] != "mountaincar":
+                    continue
+                try:
+                    path, score = json.loads(row[4]), float(row[6])
+                except ValueError:
+                    continue
+                action_paths.append(path)
+                blocks.append(j // items_per_env)
+                scores.append(score)
+                files.append(csv_path)
+    if not action_paths:
+        print("未找到任何 mountaincar episode")
+        return 0
+    loaded = time.perf_counter()
+    metrics = episode_metrics(action_paths, np.array(blocks), np.array(scores))
+    elapsed = time.perf_counter()
+
+    blocks = np.array(blocks)
+    scores = np.array(scores)
+    n_steps = sum(len(path) for path in action_paths)
+    print(f"回放 {len(action_paths)} 个 episode（{n_steps} 步 × {len(START_POSITIONS)} 个初始位置）")
+    print(f"有一致初始位置的 episode: {int((metrics['consistent'] > 0).sum())}/{len(action_paths)}")
+    print()
+    print("| 块 | force | episode 数 | 成功率 | " + " | ".join(METRIC_NAMES) + " |")
+    print("|----|-------|------------|--------|" + "|".join("------" for _ in METRIC_NAMES) + "|")
+    for block in np.unique(blocks):
+        in_block = blocks == block
+        values = " | ".join(f"{metrics[name][in_block].mean():.4f}" for name in METRIC_NAMES)
+        print(f"| env{block} | {FORCES[block % len(FORCES)]} | {int(in_block.sum())} | "
+              f"{scores[in_block].mean():.4f} | {values} |")
+    print(f"\n⏱️ 读取 {loaded - start:.2f}s，回放 {elapsed - loaded:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
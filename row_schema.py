@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+explorer_summary.csv 的逐行 schema 校验。
+
+完整性检查（check_integrity.py）只看行数和文件夹名；这里把整棵树所有文件的列
+一次读进 numpy 数组，对每一行做向量化检查:
+- malformed: 列数不是 7
+- timestamp: 时间戳无法解析
+- order: 同一文件内时间戳倒退
+- model / env: model_name、env_name 与所在的 log_ 文件夹不符（同一模型的已知写法视为相符）
+- action_path: action_path 无法解析为列表
+- steps: step_count != len(action_path)
+- score_parse: final_score 无法解析（extract_scores_from_csv 里的 ValueError 行会被静默跳过）
+- score_range: final_score 不在该环境的取值范围内
+  （frozenlake 为 1/目的地个数 的整数倍，单目的地即 0/1；mountaincar 为 0/1；webshop 为 0.25 的整数倍）
+
+重跑检测（运行崩溃后没有清空文件夹就重启时，行会被再追加一遍，
+calculate_env_averages 按每 20 条切块时之后的所有块都会错位）:
+- order: 时间戳倒退，即重启后从头开始的位置
+- gap: 相邻两行间隔超过 --gap-minutes，可能是中断后续跑的位置
+- duplicate: (instruction, action_path, timestamp) 与同一文件中更早的行完全相同
+- block: instruction 变化的位置（实际的块边界）与每 items_per_env 条切块的边界不一致；
+  报告中列出每个有问题文件的实际块边界
+
+用法:
+    python row_schema.py [base_dir] [--examples 3] [--exclude old _tmp*] [--gap-minutes 120] [--strict]
+"""
+
+import argparse
+import csv
+import fnmatch
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from check_integrity import MODELS as INTEGRITY_MODELS
+from generate_all_tables import BASE_DIR
+from run_manifest import load_manifest, get_items_per_env
+
+EXPECTED_COLUMNS = ["timestamp", "model_name", "env_name", "instruction", "action_path", "step_count", "final_score"]
+
+# 相邻两行的间隔超过此值（分钟）视为可能的中断
+GAP_MINUTES = 120
+
+# 默认不校验的顶层目录（旧格式的历史数据）
+DEFAULT_EXCLUDES = ["old", "_tmp*"]
+
+# 规则名 -> 说明（报告按此顺序输出）
+RULES = {
+    "malformed": "列数不是 7",
+    "timestamp": "时间戳无法解析",
+    "order": "时间戳倒退（重新开始）",
+    "gap": "相邻两行间隔过长",
+    "duplicate": "(instruction, action_path, timestamp) 重复",
+    "block": "块边界与预期不一致",
+    "model": "model_name 与文件夹不符",
+    "env": "env_name 与文件夹不符",
+    "action_path": "action_path 无法解析",
+    "steps": "step_count != len(action_path)",
+    "score_parse": "final_score 无法解析",
+    "score_range": "final_score 超出取值范围",
+}
+
+# 环境 -> final_score 的最小单位（frozenlake 按目的地个数决定，见 score_units）
+SCORE_UNITS = {
+    "mountaincar": 1.0,
+    "webshop": 0.25,
+}
+
+# 同一模型的不同写法（与 check_integrity.MODELS 的变体列表一致），任一写法都算与文件夹相符
+MODEL_ALIASES = {
+    name: model_name
+    for model_name, (model_prefix, model_variants) in INTEGRITY_MODELS.items()
+    for name in [model_name, model_prefix, *model_variants]
+}
+
+# log_[hidden_]<env>_<model>_<method>_<use_memory>_<use_glove>
+LOG_FOLDER_PATTERN = re.compile(
+    r"^log_(?:hidden_)?(webshop|frozenlake|mountaincar)_(.+)_(generative|memorybank|vanilla|voyager)_(True|False)_(True|False)$"
+)
+
+
+def folder_identity(csv_path: Path) -> tuple:
+    """从 log_ 文件夹名解析 (env, model)，不符合命名规则时为 (None, None)"""
+    match = LOG_FOLDER_PATTERN.match(csv_path.parent.parent.name)
+    if not match:
+        return None, None
+    return match.group(1), match.group(2)
+
+
+def canonical_models(names: np.ndarray) -> np.ndarray:
+    """把 model_name 映射到 MODEL_ALIASES 中的规范名，未知名称保持不变"""
+    unique, inverse = np.unique(names, return_inverse=True)
+    return np.array([MODEL_ALIASES.get(name, name) for name in unique] or [""], dtype=str)[inverse]
+
+
+def count_destinations(instruction: str) -> int:
+    """frozenlake 指令中 "Destinations: [(r, c), ...]" 的目的地个数，没有时为 1"""
+    if not instruction.startswith("Destinations:"):
+        return 1
+    return max(instruction[:instruction.find("]")].count("("), 1)
+
+
+def action_length(action_path: str) -> int:
+    """action_path 列表的长度，无法解析时为 -1"""
+    try:
+        actions = json.loads(action_path)
+    except ValueError:
+        return -1
+    return len(actions) if isinstance(actions, list) else -1
+
+
+def to_float(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def to_int(text: str) -> int:
+    try:
+        return int(text)
+    except ValueError:
+        return -1
+
+
+def parse_timestamps(values: list) -> np.ndarray:
+    """批量解析时间戳为 datetime64[s]，无法解析的为 NaT"""
+    iso = [v.replace("_", "T", 1) for v in values]
+    try:
+        return np.array(iso, dtype="datetime64[s]")
+    except ValueError:
+        parsed = []
+        for v in iso:
+            try:
+                parsed.append(np.datetime64(v, "s"))
+            except ValueError:
+                parsed.append(np.datetime64("NaT"))
+        return np.array(parsed, dtype="datetime64[s]")
+
+
+def find_summary_files(base_dir: Path, excludes: list) -> list:
+    files = []
+    for csv_path in sorted(base_dir.glob("**/explorer_summary.csv")):
+        top = csv_path.relative_to(base_dir).parts[0]
+        if not any(fnmatch.fnmatch(top, pattern) for pattern in excludes):
+            files.append(csv_path)
+    return files
+
+
+def load_columns(csv_files: list) -> dict:
+    """
+    把所有文件的行读入按列的数组（所有文件首尾相接）。
+    file 列是行所属文件在 csv_files 中的下标，record 列是行在文件中的记录号（从 1 开始，不含表头）。
+    """
+    file_idx, record, n_fields = [], [], []
+    timestamps, models, envs, action_lens, step_counts, scores, destinations = [], [], [], [], [], [], []
+    instruction_hashes, content_hashes = [], []
+
+    for i, csv_path in enumerate(csv_files):
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                continue
+            for j, row in enumerate(reader, start=1):
+                file_idx.append(i)
+                record.append(j)
+                n_fields.append(len(row))
+                if len(row) != len(EXPECTED_COLUMNS):
+                    row = (row + [""] * len(EXPECTED_COLUMNS))[:len(EXPECTED_COLUMNS)]
+                timestamp, model, env, instruction, action_path, step_count, final_score = row
+                timestamps.append(timestamp)
+                models.append(model)
+                envs.append(env)
+                action_lens.append(action_length(action_path))
+                step_counts.append(to_int(step_count))
+                scores.append(to_float(final_score))
+                destinations.append(count_destinations(instruction) if env == "frozenlake" else 1)
+                # 只在本进程内比较，使用内置 hash 即可
+                instruction_hashes.append(hash(instruction))
+                content_hashes.append(hash((instruction, action_path, timestamp)))
+
+    return {
+        "file": np.array(file_idx, dtype=np.intp),
+        "record": np.array(record, dtype=np.int64),
+        "n_fields": np.array(n_fields, dtype=np.int64),
+        "timestamp": parse_timestamps(timestamps),
+        "model": np.array(models, dtype=str),
+        "env": np.array(envs, dtype=str),
+        "action_len": np.array(action_lens, dtype=np.int64),
+        "step_count": np.array(step_counts, dtype=np.int64),
+        "score": np.array(scores, dtype=np.float64),
+        "destinations": np.array(destinations, dtype=np.int64),
+        "instruction_hash": np.array(instruction_hashes, dtype=np.int64),
+        "content_hash": np.array(content_hashes, dtype=np.int64),
+    }
+
+
+def items_per_env_by_file(csv_files: list) -> np.ndarray:
+    """每个文件的块大小（有清单时取清单的 episodes_per_map，否则为 20）"""
+    return np.array(
+        [get_items_per_env(load_manifest(csv_path.parent.parent), 20) for csv_path in csv_files] or [20],
+        dtype=np.int64,
+    )
+
+
+def same_file_as_previous(columns: dict) -> np.ndarray:
+    """每行是否与上一行属于同一文件"""
+    same_file = np.zeros(len(columns["file"]), dtype=bool)
+    same_file[1:] = columns["file"][1:] == columns["file"][:-1]
+    return same_file
+
+
+def find_duplicates(columns: dict) -> np.ndarray:
+    """
+    同一文件中 content_hash 与更早的某行相同的行。
+    时间戳只精确到秒，同一秒内很快结束的几个 episode（如 frozenlake 一步掉进洞里）可能完全相同，
+    因此只有两次出现之间隔着其他时间戳的行时才算重复（重新追加的行与原来的行之间总隔着更晚的行）。
+    """
+    n = len(columns["file"])
+    # 同一文件内连续相同时间戳的行属于同一组
+    new_group = ~same_file_as_previous(columns)
+    new_group[1:] |= columns["timestamp"][1:] != columns["timestamp"][:-1]
+    group = np.cumsum(new_group)
+
+    order = np.lexsort((np.arange(n), columns["content_hash"], columns["file"]))
+    sorted_file = columns["file"][order]
+    sorted_hash = columns["content_hash"][order]
+    repeated = np.zeros(n, dtype=bool)
+    repeated[1:] = (sorted_file[1:] == sorted_file[:-1]) & (sorted_hash[1:] == sorted_hash[:-1])
+    # order 中同一内容按行号排列，与上一次出现在同一时间戳组内的不算重复
+    repeated[1:] &= group[order[1:]] != group[order[:-1]]
+    duplicates = np.zeros(n, dtype=bool)
+    duplicates[order] = repeated
+    return duplicates
+
+
+def block_boundaries(columns: dict, items_per_env: np.ndarray) -> tuple:
+    """
+    返回 (实际边界, 预期边界) 两个行掩码。
+    实际边界是 instruction 与上一行不同的行；预期边界是每 items_per_env 条的第一行（首行除外）。
+    """
+    same_file = same_file_as_previous(columns)
+    actual = np.zeros(len(same_file), dtype=bool)
+    actual[1:] = same_file[1:] & (columns["instruction_hash"][1:] != columns["instruction_hash"][:-1])
+    block_size = items_per_env[columns["file"]]
+    expected = (columns["record"] > 1) & ((columns["record"] - 1) % block_size == 0)
+    return actual, expected
+
+
+def score_units(columns: dict) -> np.ndarray:
+    """每行 final_score 的最小单位；未知环境为 NaN（不检查取值范围）"""
+    units = np.full(len(columns["env"]), np.nan)
+    for env, unit in SCORE_UNITS.items():
+        units[columns["env"] == env] = unit
+    frozenlake = columns["env"] == "frozenlake"
+    units[frozenlake] = 1.0 / columns["destinations"][frozenlake]
+    return units
+
+
+def validate(columns: dict, csv_files: list, gap_minutes: float = GAP_MINUTES) -> dict:
+    """{规则名: 违反该规则的行的布尔掩码}"""
+    identities = [folder_identity(csv_path) for csv_path in csv_files]
+    folder_envs = np.array([env or "" for env, _ in identities] or [""], dtype=str)[columns["file"]]
+    folder_models = np.array([model or "" for _, model in identities] or [""], dtype=str)[columns["file"]]
+    known_folder = folder_envs != ""
+
+    timestamps = columns["timestamp"]
+    valid_ts = ~np.isnat(timestamps)
+    # 与同一文件内上一行比较
+    same_file = same_file_as_previous(columns)
+    comparable = np.zeros(len(timestamps), dtype=bool)
+    comparable[1:] = same_file[1:] & valid_ts[1:] & valid_ts[:-1]
+    delta = np.zeros(len(timestamps), dtype="timedelta64[s]")
+    delta[1:] = timestamps[1:] - timestamps[:-1]
+    backwards = comparable & (delta < np.timedelta64(0, "s"))
+    gap = comparable & (delta > np.timedelta64(int(gap_minutes * 60), "s"))
+
+    # instruction 在文件内有变化时才能判断块边界（如 frozenlake explicit 每块一张地图）
+    actual, expected = block_boundaries(columns, items_per_env_by_file(csv_files))
+    varying = np.zeros(len(csv_files), dtype=bool)
+    varying[columns["file"][actual]] = True
+
+    score = columns["score"]
+    units = score_units(columns)
+    steps = score / units
+    in_range = (score >= 0) & (score <= 1) & np.isclose(steps, np.round(steps))
+    checkable = ~np.isnan(score) & ~np.isnan(units)
+
+    parsed_path = columns["action_len"] >= 0
+    return {
+        "malformed": columns["n_fields"] != len(EXPECTED_COLUMNS),
+        "timestamp": ~valid_ts,
+        "order": backwards,
+        "gap": gap,
+        "duplicate": find_duplicates(columns),
+        "block": varying[columns["file"]] & (actual != expected),
+        "model": known_folder & (canonical_models(columns["model"]) != canonical_models(folder_models)),
+        "env": known_folder & (columns["env"] != folder_envs),
+        "action_path": ~parsed_path,
+        "steps": parsed_path & (columns["step_count"] != columns["action_len"]),
+        "score_parse": np.isnan(score),
+        "score_range": checkable & ~in_range,
+    }
+
+
+def format_report(columns: dict, violations: dict, csv_files: list, base_dir: Path, examples: int) -> str:
+    total_rows = len(columns["file"])
+    actual, _ = block_boundaries(columns, items_per_env_by_file(csv_files))
+    rerun = violations["order"] | violations["duplicate"] | violations["block"]
+    lines = [f"校验 {len(csv_files)} 个文件，共 {total_rows} 行", ""]
+    lines.append("| 规则 | 说明 | 违反行数 | 涉及文件 |")
+    lines.append("|------|------|----------|----------|")
+    for rule, description in RULES.items():
+        mask = violations[rule]
+        n_files = len(np.unique(columns["file"][mask]))
+        lines.append(f"| {rule} | {description} | {int(mask.sum())} | {n_files} |")
+
+    any_violation = np.zeros(total_rows, dtype=bool)
+    for mask in violations.values():
+        any_violation |= mask
+    bad_files = np.unique(columns["file"][any_violation])
+    if len(bad_files):
+        lines.append("")
+        lines.append(f"有问题的文件 ({len(bad_files)}):")
+    for i in bad_files:
+        in_file = columns["file"] == i
+        lines.append(f"- {csv_files[i].relative_to(base_dir)}")
+        for rule, mask in violations.items():
+            rows = columns["record"][mask & in_file]
+            if len(rows):
+                shown = ", ".join(f"#{r}" for r in rows[:examples])
+                more = " ..." if len(rows) > examples else ""
+                lines.append(f"    {rule}: {len(rows)} 行（记录 {shown}{more}）")
+        if (rerun & in_file).any():
+            boundaries = ", ".join(f"#{r}" for r in columns["record"][actual & in_file]) or "无"
+            lines.append(f"    实际块边界: {boundaries}（共 {int(in_file.sum())} 条）")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="逐行校验所有 explorer_summary.csv")
+    parser.add_argument("base_dir", nargs="?", default=str(BASE_DIR), help="搜索的根目录")
+    parser.add_argument("--examples", type=int, default=3, help="每条规则列出的记录号个数")
+    parser.add_argument("--exclude", nargs="*", default=DEFAULT_EXCLUDES, help="跳过的顶层目录（支持通配符）")
+    parser.add_argument("--gap-minutes", type=float, default=GAP_MINUTES, help="相邻两行间隔超过多少分钟记为 gap")
+    parser.add_argument("--strict", action="store_true", help="有任何违反时以非零状态退出")
+    args = parser.parse_args()
+
+    base_dir = Path(args.base_dir)
+    start = time.perf_counter()
+    csv_files = find_summary_files(base_dir, args.exclude)
+    if not csv_files:
+        print("未找到任何 explorer_summary.csv 文件")
+        return 0
+    columns = load_columns(csv_files)
+    violations = validate(columns, csv_files, args.gap_minutes)
+    elapsed = time.perf_counter() - start
+
+    print(format_report(columns, violations, csv_files, base_dir, args.examples))
+    print(f"\n⏱️ 用时 {elapsed:.2f}s")
+    has_violation = any(mask.any() for mask in violations.values())
+    return 1 if args.strict and has_violation else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
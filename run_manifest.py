@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+运行清单（manifest）读取工具。
+
+run_frozenlake_cli_v*.py 在运行开始时会在 finish_mark/ 目录下写入
+<cur_name>.manifest.json，记录本次运行的配置、地图哈希和期望的 episode 数。
+完整性检查和表格生成脚本通过这里的函数读取清单，用清单中的精确期望值
+代替硬编码的行数（41/61）和每组 20 条的假设。
+
+没有清单的旧运行（webshop、mountaincar 以及早期 frozenlake）返回 None，
+调用方回退到原来的默认值。
+"""
+
+import json
+from pathlib import Path
+
+# 清单文件与 finish_mark/<cur_name> 放在同一目录下
+MARKER_DIR_NAME = "finish_mark"
+MANIFEST_SUFFIX = ".manifest.json"
+
+# 当前支持的清单版本
+MANIFEST_VERSION = 1
+
+
+def get_manifest_path(method_folder: Path) -> Path:
+    """返回方法文件夹对应的清单路径: <output_root>/finish_mark/<cur_name>.manifest.json"""
+    return method_folder.parent / MARKER_DIR_NAME / f"{method_folder.name}{MANIFEST_SUFFIX}"
+
+
+def get_finish_mark_path(method_folder: Path) -> Path:
+    """返回方法文件夹对应的完成标记路径: <output_root>/finish_mark/<cur_name>"""
+    return method_folder.parent / MARKER_DIR_NAME / method_folder.name
+
+
+def load_manifest(method_folder: Path) -> dict | None:
+    """读取方法文件夹的清单，不存在或无法解析时返回 None"""
+    manifest_path = get_manifest_path(method_folder)
+    if not manifest_path.exists():
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"  读取清单 {manifest_path} 失败: {e}")
+        return None
+
+    if manifest.get("manifest_version") != MANIFEST_VERSION:
+        print(f"  清单版本不支持: {manifest_path}")
+        return None
+
+    return manifest
+
+
+def get_expected_lines(manifest: dict | None, default: int) -> int:
+    """期望的 CSV 行数（含标题行）；没有清单时返回 default"""
+    if manifest is None:
+        return default
+    return manifest["expected_episodes"] + 1
+
+
+def get_items_per_env(manifest: dict | None, default: int = 20) -> int:
+    """每个环境（地图/块）的 episode 数；没有清单时返回 default"""
+    if manifest is None:
+        return default
+    return manifest["episodes_per_map"]
+
+
+def check_manifest_consistency(manifest: dict, method_folder: Path) -> list:
+    """
+    检查清单与方法文件夹是否对应
+    返回不一致的问题列表
+    """
+    issues = []
+    if manifest.get("cur_name") != method_folder.name:
+        issues.append(f"清单不匹配: 清单记录的运行名为 '{manifest.get('cur_name')}'")
+    if manifest["expected_episodes"] != manifest["num_maps"] * manifest["episodes_per_map"]:
+        issues.append("清单内部不一致: expected_episodes != num_maps × episodes_per_map")
+    return issues
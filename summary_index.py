@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+explorer_summary.csv 的记录偏移索引（sidecar）。
+
+每个 explorer_summary.csv 旁边维护一个 explorer_summary.csv.offsets.json，
+记录每条记录（episode）起始位置的字节偏移。有了索引之后，查看某个运行中
+第 b 组第 k 个 episode 时可以直接 seek 过去，而不用从头解析整个文件。
+
+索引在表格生成脚本读取文件（ingestion）时顺带建立；运行过程中文件只会追加，
+因此再次读取时只需从上次索引到的位置继续扫描新追加的部分。
+如果文件被截断或被替换（尾部校验不一致），则整体重建。
+
+用法:
+    python summary_index.py <explorer_summary.csv> <block> <episode> [--items-per-env 20]
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+INDEX_SUFFIX = ".offsets.json"
+INDEX_VERSION = 1
+
+# 用于检测文件是否被替换：对已索引部分最后这么多字节做哈希
+TAIL_CHECK_BYTES = 4096
+
+ITEMS_PER_ENV = 20
+
+
+def get_index_path(csv_path: Path) -> Path:
+    """返回 CSV 文件对应的索引路径"""
+    return csv_path.with_name(csv_path.name + INDEX_SUFFIX)
+
+
+def _tail_hash(data: bytes, end: int) -> str:
+    """已索引部分 [end - TAIL_CHECK_BYTES, end) 的哈希"""
+    return hashlib.sha1(data[max(0, end - TAIL_CHECK_BYTES):end]).hexdigest()
+
+
+def _scan_records(data: bytes, start: int, in_header: bool) -> tuple:
+    """
+    从 start 开始扫描完整记录的起始偏移。
+    引号内的换行不算记录结束；最后一条没有换行结尾的（正在写入的）记录不计入。
+    返回 (header_end, offsets, indexed_size)
+    """
+    header_end = None
+    offsets = []
+    pos = start
+    record_start = start
+    in_quotes = False
+    while True:
+        nl = data.find(b"\n", pos)
+        if nl < 0:
+            break
+        if data.count(b'"', pos, nl) % 2:
+            in_quotes = not in_quotes
+        pos = nl + 1
+        if in_quotes:
+            continue
+        if in_header:
+            header_end = pos
+            in_header = False
+        elif nl > record_start and data[record_start:nl].strip():
+            offsets.append(record_start)
+        record_start = pos
+    return header_end, offsets, record_start
+
+
+def _load_index(index_path: Path) -> dict | None:
+    """读取索引文件，不存在或版本不符时返回 None"""
+    if not index_path.exists():
+        return None
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+def _save_index(index_path: Path, index: dict):
+    """原子写入索引文件"""
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"  写入索引 {index_path} 失败: {e}")
+
+
+def update_index(csv_path: Path, data: bytes | None = None) -> dict:
+    """
+    加载并增量更新索引，返回索引字典:
+    {"version", "header_end", "offsets", "indexed_size", "tail_hash"}
+
+    data 为调用方已经读入的整个文件内容（ingestion 时传入，避免重复读取）；
+    为 None 时只读取上次索引之后追加的部分。
+    """
+    index_path = get_index_path(csv_path)
+    index = _load_index(index_path)
+
+    if data is None:
+        size = csv_path.stat().st_size
+        with open(csv_path, "rb") as f:
+            if index and index["indexed_size"] <= size:
+                # 只读入尾部校验区间及之后追加的内容
+                base = max(0, index["indexed_size"] - TAIL_CHECK_BYTES)
+                f.seek(base)
+                chunk = f.read()
+                if _tail_hash(chunk, index["indexed_size"] - base) == index["tail_hash"]:
+                    return _extend_index(index_path, index, chunk, base)
+                f.seek(0)
+            data = f.read()
+    elif index and index["indexed_size"] <= len(data):
+        if _tail_hash(data, index["indexed_size"]) == index["tail_hash"]:
+            return _extend_index(index_path, index, data, 0)
+
+    # 索引不存在、文件被截断或被替换：整体重建
+    header_end, offsets, indexed_size = _scan_records(data, 0, in_header=True)
+    index = {
+        "version": INDEX_VERSION,
+        "header_end": header_end or 0,
+        "offsets": offsets,
+        "indexed_size": indexed_size,
+        "tail_hash": _tail_hash(data, indexed_size),
+    }
+    _save_index(index_path, index)
+    return index
+
+
+def _extend_index(index_path: Path, index: dict, chunk: bytes, base: int) -> dict:
+    """从 index["indexed_size"] 继续扫描 chunk（chunk[0] 对应文件偏移 base）"""
+    start = index["indexed_size"] - base
+    if start == len(chunk):
+        return index
+
+    in_header = index["header_end"] == 0
+    header_end, new_offsets, indexed_size = _scan_records(chunk, start, in_header)
+    if indexed_size == start:
+        return index
+
+    if header_end is not None:
+        index["header_end"] = header_end + base
+    index["offsets"].extend(offset + base for offset in new_offsets)
+    index["indexed_size"] = indexed_size + base
+    index["tail_hash"] = _tail_hash(chunk, indexed_size)
+    _save_index(index_path, index)
+    return index
+
+
+def read_summary_rows(csv_path: Path) -> tuple:
+    """
+    读取整个 explorer_summary.csv（ingestion），同时建立/更新偏移索引。
+    返回 (header, rows)，rows 不含标题行。
+    """
+    with open(csv_path, "rb") as f:
+        data = f.read()
+    update_index(csv_path, data)
+
+    reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    header = next(reader, None) or []
+    rows = list(reader)
+    return header, rows
+
+
+def read_header(csv_path: Path, index: dict | None = None) -> list:
+    """只读取标题行"""
+    if index is None:
+        index = update_index(csv_path)
+    with open(csv_path, "rb") as f:
+        raw = f.read(index["header_end"])
+    return next(csv.reader(io.StringIO(raw.decode("utf-8"), newline="")), [])
+
+
+def get_record_span(index: dict, record_idx: int) -> tuple:
+    """返回第 record_idx 条记录的字节区间 [start, end)"""
+    offsets = index["offsets"]
+    start = offsets[record_idx]
+    end = offsets[record_idx + 1] if record_idx + 1 < len(offsets) else index["indexed_size"]
+    return start, end
+
+
+def read_record_bytes(csv_path: Path, start: int, end: int) -> bytes:
+    """按字节区间直接读取原始记录内容"""
+    with open(csv_path, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def read_episode(csv_path: Path, block: int, episode: int, items_per_env: int = ITEMS_PER_ENV) -> dict:
+    """
+    直接 seek 读取第 block 组第 episode 个 episode，返回 {列名: 值}。
+    记录号 = block * items_per_env + episode。
+    """
+    index = update_index(csv_path)
+    record_idx = block * items_per_env + episode
+    if not 0 <= record_idx < len(index["offsets"]):
+        raise IndexError(f"记录 {record_idx} 超出范围（共 {len(index['offsets'])} 条）")
+
+    start, end = get_record_span(index, record_idx)
+    raw = read_record_bytes(csv_path, start, end)
+    row = next(csv.reader(io.StringIO(raw.decode("utf-8"), newline="")), [])
+    header = read_header(csv_path, index)
+    return dict(zip(header, row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按 (block, episode) 直接读取 explorer_summary.csv 中的一条记录")
+    parser.add_argument("csv_path", type=Path)
+    parser.add_argument("block", type=int)
+    parser.add_argument("episode", type=int)
+    parser.add_argument("--items-per-env", type=int, default=ITEMS_PER_ENV)
+    args = parser.parse_args()
+
+    record = read_episode(args.csv_path, args.block, args.episode, args.items_per_env)
+    for key, value in record.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+表格 cell 的依赖跟踪与增量重算。
+
+依赖链: 输出表格文件 -> cell -> (指标, 分组) -> 源文件中的记录区间。
+
+状态保存在 <BASE_DIR>/.table_deps.json 中:
+- sources: 每个 explorer_summary.csv 的 (size, mtime_ns)、来源描述（见
+  table_provenance.describe_source，含每组的记录区间和内容哈希），以及
+  每种指标下每组的平均值
+- outputs: 每个输出表格依赖的 (源文件, 指标) 列表，以及写出时这些依赖的内容哈希
+
+重新生成表格时:
+- 源文件的 size/mtime 没变: 直接复用缓存的平均值，不读文件
+- 源文件变了（追加了记录或文件夹被替换）: 通过偏移索引重新计算每组的内容
+  哈希，只有哈希变化的组才重新解析和求平均，这些 cell 记为 dirty
+- 只有依赖内容与上次写出时不同（包括被其他脚本更新过的源文件）、依赖集合
+  发生变化或文件不存在的输出表格才重写
+
+指标通常只看最后一列（parse_value 函数）；需要整行内容的指标（如 mountaincar
+回放指标）用 RowMetric 包装，按整组记录计算。
+"""
+
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from summary_index import read_record_bytes
+from table_provenance import describe_source
+
+DEPS_FILE_NAME = ".table_deps.json"
+DEPS_VERSION = 1
+
+
+class RowMetric(NamedTuple):
+    """
+    按整组记录计算的指标: compute(rows, block_idx) 返回每行的数值（NaN 不参与平均），
+    block_idx 为组号（env0/env1/env2），用于区分各组的环境参数。
+    """
+    compute: Callable
+
+
+class DependencyGraph:
+    """表格 cell 到源文件分组的依赖图，跨多次运行持久化"""
+
+    def __init__(self, state_path: Path, force: bool = False):
+        self.state_path = state_path
+        self.force = force
+        self.state = self._load()
+        # 本次运行中发生变化的 (源文件, 指标)
+        self.dirty = set()
+        self.recomputed_blocks = 0
+        self.reused_blocks = 0
+
+    def _load(self) -> dict:
+        """读取依赖状态，不存在或版本不符时返回空状态"""
+        empty = {"version": DEPS_VERSION, "sources": {}, "outputs": {}}
+        if not self.state_path.exists():
+            return empty
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return empty
+        if state.get("version") != DEPS_VERSION:
+            return empty
+        return state
+
+    def save(self):
+        """写入依赖状态，顺带清理已经不存在的源文件"""
+        self.state["sources"] = {
+            path: entry for path, entry in self.state["sources"].items() if Path(path).exists()
+        }
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.state_path)
+
+    def block_averages(
+        self,
+        csv_path: Path,
+        folder: Path,
+        expected_folder: str,
+        manifest: dict | None,
+        items_per_env: int,
+        min_data_points: int,
+        metric: str,
+        parse_value,
+    ) -> tuple:
+        """
+        返回 (每组平均值列表, 来源描述)。
+        parse_value 把最后一列的字符串转成参与平均的数值，无法解析时抛出 ValueError。
+        每组数据点少于 min_data_points 时该组为 None（与 calculate_env_averages 一致）。
+        """
+        averages, source = self.block_averages_multi(
+            csv_path, folder, expected_folder, manifest, items_per_env, min_data_points, {metric: parse_value},
+        )
+        return averages[metric], source
+
+    def block_averages_multi(
+        self,
+        csv_path: Path,
+        folder: Path,
+        expected_folder: str,
+        manifest: dict | None,
+        items_per_env: int,
+        min_data_points: int,
+        parse_values: dict,
+    ) -> tuple:
+        """
+        同时计算多种指标，源文件只描述（读取）一次。
+        parse_values 为 {指标名: parse_value}，返回 ({指标名: 每组平均值列表}, 来源描述)。
+        """
+        key = str(csv_path)
+        stat = csv_path.stat()
+        entry = self.state["sources"].get(key)
+        if self.force:
+            entry = None
+
+        unchanged = (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["source"]["folder"] == folder.name
+            and entry["source"]["manifest"] == (manifest is not None)
+        )
+        metric_keys = {metric: f"{metric}:{items_per_env}:{min_data_points}" for metric in parse_values}
+        # 文件没变，且各指标都是在当前内容上算出来的（其他脚本可能只更新了别的指标）
+        if unchanged:
+            current_sha1s = [block["sha1"] for block in entry["source"]["blocks"]]
+            if all(
+                metric_key in entry["metrics"] and entry["metrics"][metric_key]["sha1s"] == current_sha1s
+                for metric_key in metric_keys.values()
+            ):
+                results = {}
+                for metric, metric_key in metric_keys.items():
+                    results[metric] = entry["metrics"][metric_key]["averages"]
+                    self.reused_blocks += len(results[metric])
+                return results, entry["source"]
+
+        source = describe_source(csv_path, folder, expected_folder, items_per_env, manifest)
+        sha1s = [block["sha1"] for block in source["blocks"]]
+        metrics = entry["metrics"] if entry is not None else {}
+
+        results = {}
+        for metric, parse_value in parse_values.items():
+            metric_key = metric_keys[metric]
+            # 每种指标分别记录参与计算的各组哈希，哈希一致的组直接复用
+            cached = {}
+            if entry is not None and entry["source"]["folder"] == folder.name:
+                cached = entry["metrics"].get(metric_key, {})
+            old_sha1s = cached.get("sha1s", [])
+            old_averages = cached.get("averages", [])
+
+            averages = []
+            for block_idx, block in enumerate(source["blocks"]):
+                if block_idx < len(old_sha1s) and old_sha1s[block_idx] == block["sha1"]:
+                    averages.append(old_averages[block_idx])
+                    self.reused_blocks += 1
+                else:
+                    averages.append(self._compute_block(csv_path, block, block_idx, min_data_points, parse_value))
+                    self.recomputed_blocks += 1
+
+            # 分组内容或文件夹有任何变化都记为 dirty，保证 provenance 也随表格一起更新
+            if sha1s != old_sha1s:
+                self.dirty.add((key, metric))
+
+            metrics[metric_key] = {"sha1s": sha1s, "averages": averages}
+            results[metric] = averages
+
+        self.state["sources"][key] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "source": source,
+            "metrics": metrics,
+        }
+        return results, source
+
+    @staticmethod
+    def _compute_block(csv_path: Path, block: dict, block_idx: int, min_data_points: int, parse_value) -> float | None:
+        """只读取该组的字节区间并求平均"""
+        if block["count"] < min_data_points:
+            return None
+        raw = read_record_bytes(csv_path, block["bytes"][0], block["bytes"][1])
+        rows = [row for row in csv.reader(io.StringIO(raw.decode("utf-8"), newline="")) if row]
+        values = []
+        if isinstance(parse_value, RowMetric):
+            values = [float(v) for v in parse_value.compute(rows, block_idx) if not math.isnan(v)]
+        else:
+            for row in rows:
+                try:
+                    values.append(parse_value(row[-1]))
+                except ValueError:
+                    pass
+        if not values:
+            return None
+        return sum(values) / len(values)
+
+    @staticmethod
+    def output_deps(sources: dict, metric: str) -> list:
+        """
+        收集一个输出表格依赖的 (源文件, 指标)。
+        sources 为任意层嵌套的 {...: describe_source(...)} 字典。
+        """
+        deps = set()
+        stack = [sources]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict) and "blocks" in node and "path" in node:
+                deps.add(f"{node['path']}|{metric}")
+            elif isinstance(node, dict):
+                stack.extend(node.values())
+        return sorted(deps)
+
+    def output_signature(self, deps: list) -> str:
+        """
+        输出表格所依赖内容的哈希: 每个 (源文件, 指标) 当前的来源描述以及该指标
+        各组的哈希和平均值。状态保存在 .table_deps.json 中，其他脚本更新了同一个
+        源文件后这里也能发现（只看本次运行的 dirty 会漏掉）。
+        """
+        signature = []
+        for dep in deps:
+            path, metric = dep.rsplit("|", 1)
+            entry = self.state["sources"].get(path)
+            if entry is None:
+                signature.append([dep, None])
+                continue
+            metrics = {key: value for key, value in entry["metrics"].items() if key.split(":", 1)[0] == metric}
+            signature.append([dep, entry["source"], metrics])
+        text = json.dumps(signature, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def needs_write(self, output_file: Path, deps: list) -> bool:
+        """输出表格是否需要重写"""
+        if self.force or not output_file.exists():
+            return True
+        recorded = self.state["outputs"].get(str(output_file))
+        if recorded is None or recorded["deps"] != deps:
+            return True
+        return recorded.get("sha1") != self.output_signature(deps)
+
+    def mark_written(self, output_file: Path, deps: list):
+        """记录输出表格当前的依赖集合及其内容哈希"""
+        self.state["outputs"][str(output_file)] = {"deps": deps, "sha1": self.output_signature(deps)}
+
+    def summary(self) -> str:
+        """本次运行的增量统计"""
+        return (
+            f"复用 {self.reused_blocks} 组，重算 {self.recomputed_blocks} 组，"
+            f"{len({path for path, _ in self.dirty})} 个源文件有变化"
+        )
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+表格导出插件: 把表格生成过程中的内存数据直接渲染为 LaTeX / Markdown / JSON / XLSX。
+
+table_layout 在写 CSV 的同时把同样的行（数值 cell 保留为 float）交给 ExportTable，
+所有格式在同一次运行中输出，不需要再读回 table_*.csv:
+    table_gpt4o_explicit.csv -> table_gpt4o_explicit.tex / .md / .json / .xlsx
+
+LaTeX 和 Markdown 中每个分区（explicit/implicit）每列的最大值加粗。
+XLSX 需要 openpyxl，没有安装时跳过并给出提示。
+"""
+
+import argparse
+import io
+import json
+import math
+from pathlib import Path
+
+from table_writer import WRITE_LOG, write_if_changed
+
+try:
+    import openpyxl
+    from openpyxl.styles import Font
+except ImportError:
+    openpyxl = None
+
+
+class ExportTable:
+    """
+    一个输出表格的内存表示。
+    表格由若干块（block）组成，每块有若干表头行和若干分区（section）；
+    所有模型合并在一个文件时每个模型是一块。
+    数据行中标签 cell 为 str，数值 cell 为 float，空的数值 cell 为 None。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.blocks = []
+
+    def start_block(self):
+        self.blocks.append({"headers": [], "sections": []})
+
+    def add_header(self, row: list):
+        self.blocks[-1]["headers"].append(list(row))
+
+    def start_section(self, name: str, subheader: list | None = None):
+        """subheader 为分区前的额外表头行（如合并表格中 implicit 的 env0/env1 行）"""
+        self.blocks[-1]["sections"].append({"name": name, "subheader": subheader, "rows": []})
+
+    def add_row(self, cells: list):
+        self.blocks[-1]["sections"][-1]["rows"].append(list(cells))
+
+
+def label_columns(block: dict) -> int:
+    """数据行开头的标签列数"""
+    counts = []
+    for section in block["sections"]:
+        for row in section["rows"]:
+            n = 0
+            while n < len(row) and isinstance(row[n], str):
+                n += 1
+            counts.append(n)
+    return min(counts) if counts else 1
+
+
+def _best_per_column(section: dict) -> dict:
+    """分区内每列的最大值 {列号: 值}，按显示的 4 位小数比较，并列时都加粗"""
+    best = {}
+    for row in section["rows"]:
+        for col, cell in enumerate(row):
+            if isinstance(cell, float) and not math.isnan(cell):
+                best[col] = max(best.get(col, round(cell, 4)), round(cell, 4))
+    return best
+
+
+def _is_best(best: dict, col: int, cell) -> bool:
+    return isinstance(cell, float) and best.get(col) == round(cell, 4)
+
+
+def _format_value(cell) -> str:
+    """数值 cell 与 CSV 中一致，保留 4 位小数"""
+    if isinstance(cell, float):
+        return f"{cell:.4f}"
+    return cell or ""
+
+
+def _header_spans(row: list, start: int) -> list:
+    """把 [label, "", "", label2, ""] 这种分组表头转成 [(label, 跨几列), ...]"""
+    spans = []
+    for cell in row[start:]:
+        if cell or not spans:
+            spans.append([cell, 1])
+        else:
+            spans[-1][1] += 1
+    return spans
+
+
+def flat_columns(block: dict, label_cols: int) -> list:
+    """多级表头合并为单行列名（Markdown / JSON 使用），分组标签向右填充"""
+    headers = block["headers"]
+    width = max((len(h) for h in headers), default=label_cols)
+    names = []
+    for col in range(width):
+        if col < label_cols:
+            names.append(headers[-1][col] if headers and col < len(headers[-1]) else "")
+            continue
+        parts = []
+        for header in headers:
+            label = ""
+            for c in range(min(col, len(header) - 1), label_cols - 1, -1):
+                if header[c]:
+                    label = header[c]
+                    break
+            if label:
+                parts.append(label)
+        names.append(" ".join(parts))
+    return names
+
+
+def _latex_escape(text: str) -> str:
+    replacements = {
+        "\\": r"\textbackslash{}", "&": r"\&", "%": r"\%", "$": r"\$", "#": r"\#",
+        "_": r"\_", "{": r"\{", "}": r"\}", "~": r"\textasciitilde{}", "^": r"\textasciicircum{}",
+    }
+    return "".join(replacements.get(ch, ch) for ch in text)
+
+
+def _latex_header(row: list, label_cols: int) -> str:
+    cells = [_latex_escape(cell) for cell in row[:label_cols]]
+    for label, span in _header_spans(row, label_cols):
+        if span > 1:
+            cells.append(rf"\multicolumn{{{span}}}{{c}}{{{_latex_escape(label)}}}")
+        else:
+            cells.append(_latex_escape(label))
+    return " & ".join(cells) + r" \\"
+
+
+def export_latex(table: ExportTable) -> str:
+    """booktabs 风格的 tabular，每个分区每列的最大值加粗"""
+    if not table.blocks:
+        return ""
+    label_cols = label_columns(table.blocks[0])
+    width = max(len(row) for block in table.blocks for row in block["headers"])
+    lines = [
+        f"% {table.path.with_suffix('.csv').name}",
+        r"\begin{tabular}{" + "l" * label_cols + "c" * (width - label_cols) + "}",
+        r"\toprule",
+    ]
+    for block_idx, block in enumerate(table.blocks):
+        if block_idx > 0:
+            lines.append(r"\midrule")
+        for header in block["headers"]:
+            lines.append(_latex_header(header, label_cols))
+        for section in block["sections"]:
+            lines.append(r"\midrule")
+            if section["subheader"]:
+                lines.append(" & ".join(_latex_escape(cell) for cell in section["subheader"]) + r" \\")
+            best = _best_per_column(section)
+            for row in section["rows"]:
+                cells = []
+                for col, cell in enumerate(row):
+                    text = _latex_escape(_format_value(cell))
+                    if _is_best(best, col, cell):
+                        text = rf"\textbf{{{text}}}"
+                    cells.append(text)
+                lines.append(" & ".join(cells) + r" \\")
+    lines.append(r"\bottomrule")
+    lines.append(r"\end{tabular}")
+    return "\n".join(lines) + "\n"
+
+
+def export_markdown(table: ExportTable) -> str:
+    """每块一个 Markdown 表格，多级表头合并为一行，每个分区每列的最大值加粗"""
+    out = []
+    for block in table.blocks:
+        label_cols = label_columns(block)
+        headers = block["headers"]
+        # 第一行表头只有第一个 cell 时作为标题
+        if headers and headers[0][0] and not any(headers[0][1:]):
+            out.append(f"### {headers[0][0]}")
+            out.append("")
+            headers = headers[1:]
+        columns = flat_columns({"headers": headers}, label_cols)
+        out.append("| " + " | ".join(columns) + " |")
+        out.append("|" + "|".join([" --- "] * label_cols + [" ---: "] * (len(columns) - label_cols)) + "|")
+        for section in block["sections"]:
+            if section["subheader"]:
+                out.append("| " + " | ".join(f"*{cell}*" if cell else "" for cell in section["subheader"]) + " |")
+            best = _best_per_column(section)
+            for row in section["rows"]:
+                cells = []
+                for col, cell in enumerate(row):
+                    text = _format_value(cell)
+                    if _is_best(best, col, cell):
+                        text = f"**{text}**"
+                    cells.append(text)
+                out.append("| " + " | ".join(cells) + " |")
+        out.append("")
+    return "\n".join(out)
+
+
+def export_json(table: ExportTable) -> str:
+    """结构化 JSON: 每块的列名、分区和数据行（数值保留完整精度）"""
+    blocks = []
+    for block in table.blocks:
+        label_cols = label_columns(block)
+        headers = block["headers"]
+        title = headers[0][0] if headers and headers[0][0] and not any(headers[0][1:]) else None
+        columns = flat_columns({"headers": headers[1:] if title else headers}, label_cols)
+        blocks.append({
+            "title": title,
+            "columns": columns,
+            "sections": [
+                {
+                    "name": section["name"],
+                    "rows": [
+                        {
+                            "labels": row[:label_cols],
+                            "values": [cell if isinstance(cell, float) else None for cell in row[label_cols:]],
+                        }
+                        for row in section["rows"]
+                    ],
+                }
+                for section in block["sections"]
+            ],
+        })
+    return json.dumps({"table": table.path.with_suffix(".csv").name, "blocks": blocks}, ensure_ascii=False, indent=2) + "\n"
+
+
+def export_xlsx(table: ExportTable) -> bytes | None:
+    """一个工作表，布局与 CSV 相同，每个分区每列的最大值加粗；没有 openpyxl 时返回 None"""
+    if openpyxl is None:
+        return None
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = table.path.stem[:31]
+    bold = Font(bold=True)
+    for block_idx, block in enumerate(table.blocks):
+        if block_idx > 0:
+            sheet.append([])
+        for header in block["headers"]:
+            sheet.append(header)
+        for section in block["sections"]:
+            if section["subheader"]:
+                sheet.append(section["subheader"])
+            best = _best_per_column(section)
+            for row in section["rows"]:
+                sheet.append(["" if cell is None else cell for cell in row])
+                for col, cell in enumerate(row):
+                    if isinstance(cell, float):
+                        xl_cell = sheet.cell(row=sheet.max_row, column=col + 1)
+                        xl_cell.number_format = "0.0000"
+                        if _is_best(best, col, cell):
+                            xl_cell.font = bold
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+# 导出插件: 格式名 -> (文件后缀, 渲染函数)；渲染函数返回 str / bytes，返回 None 表示跳过
+EXPORTERS = {
+    "latex": (".tex", export_latex),
+    "markdown": (".md", export_markdown),
+    "json": (".json", export_json),
+    "xlsx": (".xlsx", export_xlsx),
+}
+
+
+def export_paths(path: Path, formats: list) -> list:
+    """表格各导出格式的文件路径（不包括当前环境无法导出的格式）"""
+    return [
+        path.with_suffix(EXPORTERS[fmt][0]) for fmt in formats
+        if fmt != "xlsx" or openpyxl is not None
+    ]
+
+
+# 本次运行中已经提示过无法导出的格式，避免每个表格重复提示
+_SKIPPED_FORMATS = set()
+
+
+def write_exports(table: ExportTable, formats: list):
+    """渲染并写出所有导出格式（内容没变时不重写）"""
+    for fmt in formats:
+        suffix, render = EXPORTERS[fmt]
+        content = render(table)
+        if content is None:
+            if fmt not in _SKIPPED_FORMATS:
+                print(f"  ⚠️ 未安装 openpyxl，跳过 {fmt} 导出")
+                _SKIPPED_FORMATS.add(fmt)
+            continue
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        output_file = table.path.with_suffix(suffix)
+        WRITE_LOG.append((output_file, write_if_changed(output_file, content)))
+
+
+def parse_formats(text: str) -> list:
+    """
+    把 "latex,markdown" 解析为格式列表；"all" 表示所有格式。
+    作为 --export 的 argparse type 使用，未知格式在解析参数时就报错，不会等到扫描完所有文件。
+    """
+    if not text:
+        return []
+    formats = list(EXPORTERS) if text == "all" else [fmt.strip() for fmt in text.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in EXPORTERS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"未知导出格式: {', '.join(unknown)}（可选: {', '.join(EXPORTERS)}, all）")
+    return formats
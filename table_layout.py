@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+统一的表格布局引擎。
+
+输入是已经算好的每组平均值（见 table_deps.DependencyGraph.block_averages），
+以及一组输出规格 OutputSpec（指标 × 合并/explicit/implicit × 每个模型/所有模型）。
+引擎只遍历一次 模型 × explicit/implicit × ROW_ORDER，每个 cell 的数值在每种指标下
+只格式化一次，然后按各输出规格拼成行，逐行写入所有打开的表格文件。
+
+frozenlake 各版本的表格（模型作为列）由 render_version_tables 以同样的方式
+一次遍历生成：每个版本一个表格，加上包含所有版本的汇总表格。
+
+写 CSV 的同时把同样的行（数值保留为 float）收集到 table_export.ExportTable，
+表格生成后保存快照（见 table_snapshot.py）；exports 参数（如 ["latex", "markdown"]）
+指定的其他格式也在同一次遍历中输出。
+"""
+
+from contextlib import ExitStack
+from pathlib import Path
+from typing import NamedTuple
+
+from table_deps import DependencyGraph
+from table_export import ExportTable, export_paths, write_exports
+from table_provenance import ProvenanceWriter
+from table_snapshot import save_table_snapshot
+from table_writer import TableFile
+
+# 行顺序
+ROW_ORDER = [
+    "no-memory",
+    "vanilla", "vanilla-glove",
+    "memorybank", "memorybank-glove",
+    "voyager", "voyager-glove",
+    "generative", "generative-glove",
+]
+
+# 表头中的环境名称
+ENV_HEADERS = {
+    "webshop": "webshop",
+    "frozenlake": "frozen lake",
+    "mountaincar": "mountain car",
+}
+
+# 合并表格和 explicit 表格的列: 3 个环境 × env0, env1, env2
+EXPLICIT_ENVS = ["webshop", "frozenlake", "mountaincar"]
+# implicit 只有 webshop 和 frozenlake，且只有 env0, env1
+IMPLICIT_ENVS = ["webshop", "frozenlake"]
+IMPLICIT_BLOCKS = 2
+
+BLOCKS_PER_ENV = 3
+
+
+class OutputSpec(NamedTuple):
+    """一个输出表格的规格"""
+    metric: str    # 指标名，如 "raw" / "ceiling"
+    layout: str    # "combined"（explicit + implicit 在同一个表格）/ "explicit" / "implicit"
+    scope: str     # "model"（每个模型一个文件）/ "all"（所有模型写入一个文件）
+    filename: str  # 文件名模板，scope 为 "model" 时可以使用 {model}
+
+
+class _Target:
+    """一个打开的输出: CSV（含 provenance），以及用于快照和其他导出格式的内存表格"""
+
+    def __init__(self, writer: ProvenanceWriter, export: ExportTable):
+        self.writer = writer
+        self.export = export
+
+    def header(self, row: list):
+        self.writer.writerow(row)
+        self.export.add_header(row)
+
+    def row(self, row: list, export_row: list):
+        self.writer.writerow(row)
+        self.export.add_row(export_row)
+
+    def start_block(self):
+        self.export.start_block()
+
+    def start_section(self, name: str, subheader: list | None = None):
+        if subheader is not None:
+            self.writer.writerow(subheader)
+        self.export.start_section(name, subheader)
+
+
+def _open_target(stack: ExitStack, path: Path, deps: list, graph: DependencyGraph | None, exports: list, rendered: list) -> _Target | None:
+    """依赖没有变化（且导出文件都在）时返回 None，否则打开输出并在 stack 退出时落盘"""
+    if (
+        graph is not None
+        and not graph.needs_write(path, deps)
+        and all(p.exists() for p in export_paths(path, exports))
+    ):
+        print(f"  未变化，跳过: {path}")
+        return None
+    f = stack.enter_context(TableFile(path))
+    writer = ProvenanceWriter(f, path)
+    export = ExportTable(path)
+
+    def finish(exc_type, exc, tb):
+        # 在 TableFile 落盘之前执行；出错时什么都不记录
+        if exc_type is None:
+            writer.save()
+            save_table_snapshot(export)
+            if exports:
+                write_exports(export, exports)
+            if graph is not None:
+                graph.mark_written(path, deps)
+        return False
+
+    stack.push(finish)
+    rendered.append(path)
+    print(f"  生成: {path}")
+    return _Target(writer, export)
+
+
+def format_section(model_data: dict | None, section: str, row_name: str) -> dict:
+    """
+    把一行中每个 cell 的平均值格式化一次。
+    返回 {(env, block): ("0.1234", 0.1234) 或 ("", None)}
+    """
+    cells = {}
+    for env in EXPLICIT_ENVS:
+        averages = model_data[section].get(row_name, {}).get(env, []) if model_data else []
+        for i in range(BLOCKS_PER_ENV):
+            if i < len(averages) and averages[i] is not None:
+                cells[(env, i)] = (f"{averages[i]:.4f}", averages[i])
+            else:
+                cells[(env, i)] = ("", None)
+    return cells
+
+
+def _header_rows(layout: str, display_name: str) -> list:
+    """各布局的三行表头"""
+    env_header = []
+    for env in EXPLICIT_ENVS:
+        env_header.extend([ENV_HEADERS[env], "", ""])
+    if layout == "combined":
+        return [
+            [display_name] + [""] * 10,
+            ["", ""] + env_header,
+            ["", ""] + ["env0", "env1", "env2"] * len(EXPLICIT_ENVS),
+        ]
+    if layout == "explicit":
+        return [
+            [display_name] + [""] * 9,
+            [""] + env_header,
+            [""] + ["env0", "env1", "env2"] * len(EXPLICIT_ENVS),
+        ]
+    implicit_header = []
+    for env in IMPLICIT_ENVS:
+        implicit_header.extend([ENV_HEADERS[env], ""])
+    return [
+        [display_name] + [""] * 4,
+        [""] + implicit_header,
+        [""] + ["env0", "env1"] * len(IMPLICIT_ENVS),
+    ]
+
+
+def _layout_row(layout: str, section: str, row_idx: int, row_name: str, cells: dict, sources: dict, writer: ProvenanceWriter) -> tuple:
+    """
+    按布局把格式化好的 cell 拼成一行，同时记录每个数值 cell 的来源。
+    返回 (CSV 行, 导出行)，导出行中数值 cell 为 float、空数值 cell 为 None。
+    """
+    if layout == "combined":
+        row_data = [section if row_idx == 0 else "", row_name]
+        envs, blocks = EXPLICIT_ENVS, BLOCKS_PER_ENV
+    else:
+        row_data = [row_name]
+        envs, blocks = (EXPLICIT_ENVS, BLOCKS_PER_ENV) if section == "explicit" else (IMPLICIT_ENVS, IMPLICIT_BLOCKS)
+    export_row = list(row_data)
+
+    for env in envs:
+        for i in range(blocks):
+            # 合并表格中 implicit 部分没有 mountaincar 和 env2
+            if section == "implicit" and (env == "mountaincar" or i >= IMPLICIT_BLOCKS):
+                row_data.append("")
+                export_row.append(None)
+                continue
+            text, value = cells[(env, i)]
+            if text:
+                writer.record(len(row_data), section, row_name, f"{env}/env{i}", text, sources.get(env), i)
+            row_data.append(text)
+            export_row.append(value)
+    return row_data, export_row
+
+
+def _sections(layout: str) -> list:
+    """布局包含的部分"""
+    return ["explicit", "implicit"] if layout == "combined" else [layout]
+
+
+def render_model_tables(
+    data_by_metric: dict,
+    specs: list,
+    models: list,
+    output_dir: Path,
+    graph: DependencyGraph | None = None,
+    exports: list = (),
+) -> list:
+    """
+    一次遍历生成所有输出规格对应的表格。
+
+    data_by_metric[metric][model_folder] = generate_model_table(...) 的结果
+    models 为 [(model_folder, display_name), ...]，决定输出顺序
+    exports 为额外的导出格式（见 table_export.EXPORTERS）
+    返回本次实际渲染的文件列表（依赖未变化而跳过的不在其中）。
+    """
+    rendered = []
+
+    with ExitStack() as all_stack:
+        # 所有模型写入同一个文件的输出在整个遍历过程中保持打开
+        all_outputs = []
+        for spec in specs:
+            if spec.scope != "all":
+                continue
+            sources = [data_by_metric[spec.metric].get(m, {}) or {} for m, _ in models]
+            deps = DependencyGraph.output_deps({i: d.get("sources", {}) for i, d in enumerate(sources)}, spec.metric)
+            target = _open_target(all_stack, output_dir / spec.filename, deps, graph, exports, rendered)
+            if target is not None:
+                all_outputs.append((spec, target))
+
+        for model_folder, display_name in models:
+            with ExitStack() as model_stack:
+                targets = []
+                for spec in specs:
+                    if spec.scope != "model":
+                        continue
+                    model_data = data_by_metric[spec.metric].get(model_folder)
+                    if not model_data:
+                        continue
+                    section_sources = model_data["sources"] if spec.layout == "combined" else model_data["sources"][spec.layout]
+                    deps = DependencyGraph.output_deps(section_sources, spec.metric)
+                    path = output_dir / spec.filename.format(model=model_folder)
+                    target = _open_target(model_stack, path, deps, graph, exports, rendered)
+                    if target is not None:
+                        targets.append((spec, target))
+                targets.extend(all_outputs)
+                if not targets:
+                    continue
+
+                for spec, target in targets:
+                    target.start_block()
+                    for header in _header_rows(spec.layout, display_name):
+                        target.header(header)
+
+                metrics = {spec.metric for spec, _ in targets}
+                for section in ("explicit", "implicit"):
+                    section_targets = [(spec, target) for spec, target in targets if section in _sections(spec.layout)]
+                    for spec, target in section_targets:
+                        if spec.layout == "combined" and section == "implicit":
+                            # 合并表格: 空行 + implicit 标题
+                            target.start_section(section, ["", "", "env0", "env1", "", "env0", "env1", "", "", "", ""])
+                        else:
+                            target.start_section(section)
+
+                    for row_idx, row_name in enumerate(ROW_ORDER):
+                        # 每种指标下每个 cell 只格式化一次
+                        formatted = {}
+                        for metric in metrics:
+                            model_data = data_by_metric[metric].get(model_folder)
+                            formatted[metric] = format_section(model_data, section, row_name)
+                        for spec, target in section_targets:
+                            model_data = data_by_metric[spec.metric].get(model_folder)
+                            sources = model_data["sources"][section].get(row_name, {}) if model_data else {}
+                            target.row(*_layout_row(spec.layout, section, row_idx, row_name, formatted[spec.metric], sources, target.writer))
+
+                # 所有模型写入同一个文件时，模型之间空一行
+                for spec, target in all_outputs:
+                    target.writer.writerow([])
+
+    return rendered
+
+
+def render_version_tables(
+    data: dict,
+    sources: dict,
+    versions: list,
+    model_order: list,
+    title: str,
+    version_filename: str,
+    summary_filename: str,
+    output_dir: Path,
+    metric: str,
+    graph: DependencyGraph | None = None,
+    exports: list = (),
+) -> list:
+    """
+    一次遍历生成每个版本的表格（模型作为列）和包含所有版本的汇总表格。
+
+    data[version][display_name][row_name] = [env0_avg, env1_avg, env2_avg]
+    sources[version][display_name][row_name] = describe_source(...)
+    返回本次实际渲染的文件列表。
+    """
+    rendered = []
+
+    with ExitStack() as stack:
+        version_targets = {}
+        for version in versions:
+            if not data.get(version):
+                continue
+            path = output_dir / version_filename.format(version=version)
+            deps = DependencyGraph.output_deps(sources.get(version, {}), metric)
+            target = _open_target(stack, path, deps, graph, exports, rendered)
+            if target is None:
+                continue
+            available_models = [m for m in model_order if m in data[version]]
+            version_targets[version] = (target, available_models)
+
+            # 标题行1: 版本信息；标题行2: env0, env1, env2 (每个模型重复)
+            header1 = [f"{title} - {version}"]
+            header2 = ["Method"]
+            for model in available_models:
+                header1.extend([model, "", ""])
+                header2.extend(["env0", "env1", "env2"])
+            target.start_block()
+            target.header(header1)
+            target.header(header2)
+            target.start_section(version)
+
+        summary_path = output_dir / summary_filename
+        summary_target = _open_target(stack, summary_path, DependencyGraph.output_deps(sources, metric), graph, exports, rendered)
+        if summary_target is not None:
+            # 标题行1: 版本；标题行2: 模型名称（每个版本重复）；标题行3: env0, env1, env2
+            header1, header2, header3 = [""], [""], ["Method"]
+            for version in versions:
+                header1.extend([version] + [""] * (len(model_order) * 3 - 1))
+                for model in model_order:
+                    header2.extend([model, "", ""])
+                    header3.extend(["env0", "env1", "env2"])
+            summary_target.start_block()
+            summary_target.header(header1)
+            summary_target.header(header2)
+            summary_target.header(header3)
+            summary_target.start_section("summary")
+
+        for row_name in ROW_ORDER:
+            summary_row, summary_export = [row_name], [row_name]
+            version_rows = {version: ([row_name], [row_name]) for version in version_targets}
+            for version in versions:
+                version_data = data.get(version, {})
+                for model in model_order:
+                    env_averages = version_data.get(model, {}).get(row_name, [])
+                    source = sources.get(version, {}).get(model, {}).get(row_name)
+                    for i in range(BLOCKS_PER_ENV):
+                        # 每个 cell 只格式化一次，同时写入版本表格和汇总表格
+                        number = env_averages[i] if i < len(env_averages) else None
+                        text = f"{number:.4f}" if number is not None else ""
+                        if version in version_targets and model in version_targets[version][1]:
+                            target = version_targets[version][0]
+                            row, export_row = version_rows[version]
+                            if text:
+                                target.writer.record(len(row), version, row_name, f"{model}/env{i}", text, source, i)
+                            row.append(text)
+                            export_row.append(number)
+                        if summary_target is not None:
+                            if text:
+                                summary_target.writer.record(len(summary_row), version, row_name, f"{version}/{model}/env{i}", text, source, i)
+                            summary_row.append(text)
+                            summary_export.append(number)
+            for version, (target, _) in version_targets.items():
+                target.row(*version_rows[version])
+            if summary_target is not None:
+                summary_target.row(summary_row, summary_export)
+
+    return rendered
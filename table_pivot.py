@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+通用的透视表（pivot）引擎。
+
+所有 explorer_summary.csv 的 episode 解析后保存为一个列式的 episode 目录
+（catalog），缓存在 <BASE_DIR>/.pivot_cache.npz 中；源文件的 (size, mtime_ns)
+没变时直接复用缓存，只重新解析变化了的文件。
+
+每个 episode 带有以下维度:
+- model:   模型显示名，如 GPT-4o
+- env:     webshop / frozenlake / mountaincar
+- mode:    explicit / implicit
+- method:  行名，如 vanilla-glove（见 ROW_ORDER）
+- version: main（主实验目录）或 frozenlak_explicit 下的 v0, v1, ...
+- block:   env0 / env1 / env2（按每组 episode 数分组）
+- episode: 组内第几个 episode
+
+mountaincar / frozenlake 的 episode 还带有回放得到的稠密指标（mc_max_position 等，见
+mountaincar_replay.py；fl_optimality_gap，见 frozenlake_replay.py），其他环境的 episode
+上这些指标为 NaN，不参与聚合。
+
+给定行维度、列维度和指标，用 numpy 对所有 episode 做一次分组聚合得到表格，
+不需要为每种新视图单独写脚本:
+    # 与 table_gpt4o_explicit.csv 相同的视图
+    python table_pivot.py --rows method --cols env,block --where model=GPT-4o --where mode=explicit --where version=main
+    # 模型作为列、版本作为列组
+    python table_pivot.py --rows method --cols version,model --where env=frozenlake --where mode=explicit -o table_pivot_versions.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+import generate_all_tables as main_tree
+import generate_frozenlake_explicit_tables as version_tree
+import frozenlake_replay
+import mountaincar_replay
+from run_manifest import load_manifest, get_items_per_env
+from summary_index import read_summary_rows
+from table_layout import ROW_ORDER, EXPLICIT_ENVS
+from table_writer import TableFile
+
+BASE_DIR = main_tree.BASE_DIR
+
+CACHE_FILE_NAME = ".pivot_cache.npz"
+CACHE_VERSION = 3
+
+# 每个源文件上固定的维度
+SOURCE_DIMS = ["model", "env", "mode", "method", "version"]
+# 每个 episode 上的维度
+EPISODE_DIMS = ["block", "episode"]
+DIMS = SOURCE_DIMS + EPISODE_DIMS
+
+MAIN_VERSION = "main"
+VERSION_PATTERN = re.compile(r"v(\d+)")
+
+
+def find_versions() -> list:
+    """
+    frozenlak_explicit 下实际存在的版本目录（v0, v1, ...，按版本号排序）。
+    数据源以磁盘上的目录为准；generate_frozenlake_explicit_tables.VERSIONS 只是
+    该脚本输出哪些版本表格的选择，不一定包含所有数据。
+    """
+    if not version_tree.BASE_DIR.is_dir():
+        return []
+    versions = [
+        item.name for item in version_tree.BASE_DIR.iterdir()
+        if item.is_dir() and VERSION_PATTERN.fullmatch(item.name)
+    ]
+    return sorted(versions, key=lambda name: int(VERSION_PATTERN.fullmatch(name).group(1)))
+
+
+# 参与透视的 frozenlak_explicit 版本
+SOURCE_VERSIONS = find_versions()
+
+# 维度取值的规范顺序（表格中行/列的顺序），没有列出的值按出现顺序排在后面
+DIM_ORDER = {
+    "model": [display_name for _, _, display_name in main_tree.MODELS.values()],
+    "env": EXPLICIT_ENVS,
+    "mode": ["explicit", "implicit"],
+    "method": ROW_ORDER,
+    "version": [MAIN_VERSION] + SOURCE_VERSIONS,
+}
+
+# 环境 -> (回放模块, 指标名前缀)
+REPLAY_MODULES = {
+    "mountaincar": (mountaincar_replay, "mc_"),
+    "frozenlake": (frozenlake_replay, "fl_"),
+}
+# 回放指标（Catalog.replay 的各列）
+REPLAY_METRICS = [name for module, _ in REPLAY_MODULES.values() for name in module.ROW_METRICS]
+
+# 指标: 名称 -> 从目录取出每个 episode 数值的向量化函数，聚合时对非 NaN 的值求平均
+METRICS = {
+    "raw": lambda catalog: catalog.score,
+    "ceiling": lambda catalog: (catalog.score != 0).astype(np.float64),
+}
+METRICS.update({
+    name: (lambda catalog, col=col: catalog.replay[:, col]) for col, name in enumerate(REPLAY_METRICS)
+})
+
+# 与表格生成脚本一致: 每个 cell 的数据点少于该值时留空
+MIN_DATA_POINTS = 20
+
+
+class Catalog(NamedTuple):
+    """列式 episode 目录"""
+    sources: list          # [{path, size, mtime_ns, items_per_env, dims: {维度: 值}}]
+    source: np.ndarray     # 每个 episode 所属源文件的下标
+    block: np.ndarray      # 组号
+    episode: np.ndarray    # 组内序号
+    score: np.ndarray      # 最后一列的分数
+    replay: np.ndarray     # 回放指标，形状为 (episode 数, len(REPLAY_METRICS))，不适用时为 NaN
+
+    def __len__(self):
+        return len(self.score)
+
+
+class PivotTable(NamedTuple):
+    """透视表结果，values/counts 的形状为 (行数, 列数)，空 cell 为 nan"""
+    rows: list             # 行维度名
+    cols: list             # 列维度名
+    metric: str
+    row_keys: list         # 每行的维度取值元组
+    col_keys: list         # 每列的维度取值元组
+    values: np.ndarray
+    counts: np.ndarray
+
+
+def crawl_sources() -> list:
+    """
+    遍历主实验目录和 frozenlak_explicit 下所有版本目录（SOURCE_VERSIONS），返回所有源文件及其维度。
+    查找规则与 generate_all_tables.py / generate_frozenlake_explicit_tables.py 一致。
+    """
+    found = []
+    for model_folder, (model_prefix, model_variants, display_name) in main_tree.MODELS.items():
+        model_dir = BASE_DIR / model_folder
+        if not model_dir.exists():
+            continue
+        for env_name, env_short, exp_type in main_tree.ENVIRONMENTS:
+            env_folder = main_tree.find_env_folder(model_dir, model_prefix, env_name)
+            if not env_folder:
+                continue
+            for method in main_tree.METHODS:
+                method_folder = main_tree.find_method_folder(env_folder, model_prefix, env_name, method)
+                if not method_folder:
+                    continue
+                row_name = main_tree.METHOD_TO_ROW.get(main_tree.parse_method(method))
+                csv_path = method_folder / "log" / "explorer_summary.csv"
+                if row_name and csv_path.exists():
+                    found.append((csv_path, method_folder, {
+                        "model": display_name, "env": env_short, "mode": exp_type,
+                        "method": row_name, "version": MAIN_VERSION,
+                    }))
+
+    for version in SOURCE_VERSIONS:
+        version_dir = version_tree.BASE_DIR / version
+        for model_key, (model_variants, display_name) in version_tree.MODEL_PATTERNS.items():
+            model_folder = version_tree.find_model_folder(version_dir, model_key)
+            if not model_folder:
+                continue
+            for method in version_tree.METHODS:
+                log_folder = version_tree.find_log_folder(model_folder, model_variants, method)
+                if not log_folder:
+                    continue
+                row_name = version_tree.METHOD_TO_ROW.get(version_tree.parse_method(method))
+                csv_path = log_folder / "log" / "explorer_summary.csv"
+                if row_name and csv_path.exists():
+                    found.append((csv_path, log_folder, {
+                        "model": display_name, "env": "frozenlake", "mode": "explicit",
+                        "method": row_name, "version": version,
+                    }))
+    return found
+
+
+def parse_source(csv_path: Path, items_per_env: int, env: str) -> tuple:
+    """
+    解析一个 explorer_summary.csv，返回 (block, episode, score, replay) 四个数组。
+    与 describe_source 一致: 最后一列无法解析为 float 的记录跳过，不占组内位置。
+    """
+    _, rows = read_summary_rows(csv_path)
+    scores, score_rows = [], []
+    for row in rows:
+        if not row:
+            continue
+        try:
+            scores.append(float(row[-1]))
+        except ValueError:
+            continue
+        score_rows.append(row)
+    idx = np.arange(len(scores), dtype=np.int32)
+    block = idx // items_per_env
+
+    replay = np.full((len(scores), len(REPLAY_METRICS)), np.nan)
+    if env in REPLAY_MODULES:
+        module, prefix = REPLAY_MODULES[env]
+        for b in np.unique(block):
+            in_block = np.flatnonzero(block == b)
+            metrics = module.rows_metrics([score_rows[i] for i in in_block], int(b))
+            for col, name in enumerate(REPLAY_METRICS):
+                if name in module.ROW_METRICS:
+                    replay[in_block, col] = metrics[name.removeprefix(prefix)]
+    return block, idx % items_per_env, np.array(scores, dtype=np.float64), replay
+
+
+def _load_cache(cache_path: Path) -> Catalog | None:
+    """读取缓存的 episode 目录，不存在或版本不符时返回 None"""
+    if not cache_path.exists():
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as npz:
+            meta = json.loads(str(npz["meta"]))
+            if meta.get("version") != CACHE_VERSION:
+                return None
+            return Catalog(meta["sources"], npz["source"], npz["block"], npz["episode"], npz["score"], npz["replay"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_cache(cache_path: Path, catalog: Catalog):
+    """原子写入 episode 目录缓存"""
+    tmp_path = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp.npz")
+    meta = json.dumps({"version": CACHE_VERSION, "sources": catalog.sources}, ensure_ascii=False)
+    try:
+        np.savez(
+            tmp_path, meta=np.array(meta), source=catalog.source,
+            block=catalog.block, episode=catalog.episode, score=catalog.score, replay=catalog.replay,
+        )
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"  写入缓存 {cache_path} 失败: {e}", file=sys.stderr)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def load_catalog(cache_path: Path | None = None, rebuild: bool = False) -> Catalog:
+    """
+    返回所有 episode 的目录。源文件 (size, mtime_ns) 和分组大小都没变时复用缓存，
+    否则只重新解析变化了的源文件；有变化时写回缓存。
+    """
+    if cache_path is None:
+        cache_path = BASE_DIR / CACHE_FILE_NAME
+    cached = None if rebuild else _load_cache(cache_path)
+
+    # 缓存中每个源文件对应的 episode 区间
+    cached_slices = {}
+    if cached is not None:
+        bounds = np.searchsorted(cached.source, np.arange(len(cached.sources) + 1))
+        for i, entry in enumerate(cached.sources):
+            cached_slices[entry["path"]] = (entry, bounds[i], bounds[i + 1])
+
+    sources, parts = [], []
+    changed = cached is None
+    for csv_path, folder, dims in crawl_sources():
+        stat = csv_path.stat()
+        items_per_env = get_items_per_env(load_manifest(folder), version_tree.ITEMS_PER_ENV)
+        entry = {
+            "path": str(csv_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "items_per_env": items_per_env,
+            "dims": dims,
+        }
+        hit = cached_slices.get(entry["path"])
+        if hit is not None and hit[0] == entry:
+            _, start, end = hit
+            block, episode, score = cached.block[start:end], cached.episode[start:end], cached.score[start:end]
+            replay = cached.replay[start:end]
+        else:
+            changed = True
+            try:
+                block, episode, score, replay = parse_source(csv_path, items_per_env, dims["env"])
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"读取 {csv_path} 失败: {e}", file=sys.stderr)
+                continue
+        parts.append((np.full(len(score), len(sources), dtype=np.int32), block, episode, score, replay))
+        sources.append(entry)
+
+    if cached is not None and len(sources) != len(cached.sources):
+        changed = True
+
+    if parts:
+        columns = [np.concatenate(column) for column in zip(*parts)]
+    else:
+        columns = [np.zeros(0, dtype=np.int32)] * 3 + [np.zeros(0, dtype=np.float64)]
+        columns.append(np.zeros((0, len(REPLAY_METRICS)), dtype=np.float64))
+    catalog = Catalog(sources, *columns)
+    if changed:
+        _save_cache(cache_path, catalog)
+    return catalog
+
+
+def dim_codes(catalog: Catalog, dim: str) -> tuple:
+    """
+    返回 (每个 episode 的取值编号, 取值标签列表)。编号按 DIM_ORDER 的规范顺序，
+    因此对编号排序即得到表格中的行/列顺序。
+    """
+    if dim == "block":
+        labels = [f"env{b}" for b in range(int(catalog.block.max(initial=-1)) + 1)]
+        return catalog.block.astype(np.int64), labels
+    if dim == "episode":
+        labels = [str(e) for e in range(int(catalog.episode.max(initial=-1)) + 1)]
+        return catalog.episode.astype(np.int64), labels
+    if dim not in SOURCE_DIMS:
+        raise ValueError(f"未知维度: {dim}（可选: {', '.join(DIMS)}）")
+
+    values = [entry["dims"][dim] for entry in catalog.sources]
+    order = DIM_ORDER.get(dim, [])
+    labels = [v for v in order if v in values] + sorted({v for v in values if v not in order})
+    lookup = {label: code for code, label in enumerate(labels)}
+    source_codes = np.array([lookup[v] for v in values], dtype=np.int64)
+    return source_codes[catalog.source], labels
+
+
+def pivot(
+    catalog: Catalog,
+    rows: list,
+    cols: list,
+    metric: str = "raw",
+    where: dict | None = None,
+    min_count: int = MIN_DATA_POINTS,
+) -> PivotTable:
+    """
+    按 rows × cols 分组，对 metric 的数值求平均（NaN 不参与）。
+    where 为 {维度: [允许的取值, ...]}；数据点少于 min_count 的 cell 为 nan；
+    没有任何数据的行和列不出现在结果中。
+    """
+    if metric not in METRICS:
+        raise ValueError(f"未知指标: {metric}（可选: {', '.join(METRICS)}）")
+
+    mask = np.ones(len(catalog), dtype=bool)
+    for dim, allowed in (where or {}).items():
+        codes, labels = dim_codes(catalog, dim)
+        allowed_codes = [labels.index(v) for v in allowed if v in labels]
+        mask &= np.isin(codes, allowed_codes)
+
+    # 每个维度只保留筛选后实际出现的取值，编号压缩为 0..k-1
+    inverses, dim_labels = [], []
+    for dim in rows + cols:
+        codes, labels = dim_codes(catalog, dim)
+        present, inverse = np.unique(codes[mask], return_inverse=True)
+        inverses.append(inverse)
+        dim_labels.append([labels[c] for c in present])
+
+    shape = [len(labels) for labels in dim_labels]
+    size = int(np.prod(shape)) if shape else 1
+    values = METRICS[metric](catalog)[mask]
+    if inverses:
+        group = np.ravel_multi_index(inverses, shape) if len(values) else np.zeros(0, dtype=np.int64)
+    else:
+        group = np.zeros(len(values), dtype=np.int64)
+    valid = ~np.isnan(values)
+    values, group = values[valid], group[valid]
+    sums = np.bincount(group, weights=values, minlength=size)
+    counts = np.bincount(group, minlength=size)
+
+    n_rows = int(np.prod(shape[:len(rows)]))
+    n_cols = int(np.prod(shape[len(rows):]))
+    sums = sums.reshape(n_rows, n_cols)
+    counts = counts.reshape(n_rows, n_cols)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(counts >= max(min_count, 1), sums / counts, np.nan)
+
+    row_keys = [tuple(key) for key in np.ndindex(*shape[:len(rows)])]
+    col_keys = [tuple(key) for key in np.ndindex(*shape[len(rows):])]
+    row_keys = [tuple(dim_labels[d][k] for d, k in enumerate(key)) for key in row_keys]
+    col_keys = [tuple(dim_labels[len(rows) + d][k] for d, k in enumerate(key)) for key in col_keys]
+
+    # 去掉完全没有数据的行和列（例如 implicit × mountaincar）
+    keep_rows = counts.sum(axis=1) > 0
+    keep_cols = counts.sum(axis=0) > 0
+    return PivotTable(
+        rows, cols, metric,
+        [key for key, keep in zip(row_keys, keep_rows) if keep],
+        [key for key, keep in zip(col_keys, keep_cols) if keep],
+        means[keep_rows][:, keep_cols],
+        counts[keep_rows][:, keep_cols],
+    )
+
+
+def _grouped_labels(keys: list, level: int) -> list:
+    """多级表头的第 level 级: 与前一个 key 的前缀相同时留空（与现有表格的表头风格一致）"""
+    labels = []
+    for i, key in enumerate(keys):
+        if i > 0 and keys[i - 1][:level + 1] == key[:level + 1]:
+            labels.append("")
+        else:
+            labels.append(key[level])
+    return labels
+
+
+def pivot_rows(table: PivotTable) -> list:
+    """把透视表排成 CSV 行: 列维度各占一行表头，行维度各占一列"""
+    n_row_dims = len(table.rows)
+    lines = []
+    for level, dim in enumerate(table.cols):
+        lead = [""] * n_row_dims
+        if n_row_dims:
+            lead[-1] = dim
+        lines.append(lead + _grouped_labels(table.col_keys, level))
+    if not table.cols:
+        lines.append(list(table.rows) + [table.metric])
+
+    row_labels = [_grouped_labels(table.row_keys, level) for level in range(n_row_dims)]
+    for i in range(len(table.row_keys)):
+        cells = ["" if np.isnan(v) else f"{v:.4f}" for v in table.values[i]]
+        lines.append([labels[i] for labels in row_labels] + cells)
+    return lines
+
+
+def write_pivot_csv(table: PivotTable, output_file: Path):
+    """把透视表写入 CSV（内容没变时不重写，见 table_writer.py）"""
+    with TableFile(output_file) as f:
+        writer = csv.writer(f)
+        writer.writerows(pivot_rows(table))
+
+
+def parse_where(items: list) -> dict:
+    """把 ["model=GPT-4o,Grok-3", "mode=explicit"] 解析为 {维度: [取值, ...]}"""
+    where = {}
+    for item in items:
+        dim, sep, values = item.partition("=")
+        if not sep:
+            raise ValueError(f"筛选条件格式应为 维度=取值[,取值...]: {item}")
+        where.setdefault(dim.strip(), []).extend(v.strip() for v in values.split(","))
+    return where
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按任意行/列维度生成透视表")
+    parser.add_argument("--rows", default="method", help=f"行维度，逗号分隔（可选: {', '.join(DIMS)}）")
+    parser.add_argument("--cols", default="env,block", help="列维度，逗号分隔")
+    parser.add_argument("--metric", default="raw", choices=sorted(METRICS))
+    parser.add_argument("--where", action="append", default=[], help="筛选条件，如 model=GPT-4o 或 version=v0,v1；可重复")
+    parser.add_argument("--min-count", type=int, default=MIN_DATA_POINTS, help="cell 的最少数据点数")
+    parser.add_argument("-o", "--output", type=Path, help="输出 CSV 文件（默认打印到标准输出）")
+    parser.add_argument("--rebuild", action="store_true", help="忽略缓存，重新解析所有源文件")
+    args = parser.parse_args()
+
+    rows = [d for d in args.rows.split(",") if d]
+    cols = [d for d in args.cols.split(",") if d]
+    catalog = load_catalog(rebuild=args.rebuild)
+    table = pivot(catalog, rows, cols, args.metric, parse_where(args.where), args.min_count)
+
+    if args.output:
+        write_pivot_csv(table, args.output)
+        print(f"✅ 透视表已生成: {args.output} ({len(table.row_keys)} 行 × {len(table.col_keys)} 列)")
+    else:
+        buffer = io.StringIO(newline="")
+        csv.writer(buffer).writerows(pivot_rows(table))
+        sys.stdout.write(buffer.getvalue())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+表格 cell 的来源记录（provenance）与查询。
+
+表格生成脚本在写 table_*.csv 的同时写入 table_*.csv.provenance.json，
+对每个数值 cell 记录:
+- 源文件路径，以及 find_method_folder 选中的文件夹是精确匹配还是模糊匹配
+- 参与平均的记录范围（第几条到第几条 episode）和对应的字节区间
+- 这些记录原始内容的哈希
+
+查询时只读这个 sidecar，不需要重新遍历实验目录:
+    python table_provenance.py explain table_gpt4o_explicit.csv vanilla-glove webshop/env1
+    python table_provenance.py explain table_gpt4o_explicit.csv 4 3
+
+row 可以是 CSV 行号（从 0 开始）、行名，或 "implicit:vanilla" 这种带分区的行名；
+col 可以是 CSV 列号（从 0 开始）或 "webshop/env1" 这种列名。
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from summary_index import update_index, get_record_span, read_record_bytes
+
+PROVENANCE_SUFFIX = ".provenance.json"
+PROVENANCE_VERSION = 1
+
+
+def get_provenance_path(table_path: Path) -> Path:
+    """返回表格对应的 provenance 路径"""
+    return table_path.with_name(table_path.name + PROVENANCE_SUFFIX)
+
+
+def _is_score_record(raw: bytes) -> bool:
+    """与 extract_scores_from_csv 相同的规则：最后一列能解析为 float 的记录才计入分数"""
+    row = next(csv.reader(io.StringIO(raw.decode("utf-8"), newline="")), [])
+    if not row:
+        return False
+    try:
+        float(row[-1])
+    except ValueError:
+        return False
+    return True
+
+
+def describe_source(csv_path: Path, folder: Path, expected_folder: str, items_per_env: int, manifest: dict | None) -> dict:
+    """
+    描述一个 explorer_summary.csv 的来源信息，并按 items_per_env 分组给出每组
+    对应的记录范围、字节区间和内容哈希（与 calculate_env_averages 的分组一致）。
+    """
+    index = update_index(csv_path)
+    with open(csv_path, "rb") as f:
+        data = f.read(index["indexed_size"])
+
+    # 跳过无法解析分数的记录，保证记录编号与参与平均的值一一对应
+    score_records = []
+    for record_idx in range(len(index["offsets"])):
+        start, end = get_record_span(index, record_idx)
+        if _is_score_record(data[start:end]):
+            score_records.append(record_idx)
+
+    blocks = []
+    for i in range(0, len(score_records), items_per_env):
+        chunk = score_records[i:i + items_per_env]
+        byte_start = get_record_span(index, chunk[0])[0]
+        byte_end = get_record_span(index, chunk[-1])[1]
+        blocks.append({
+            "records": [chunk[0], chunk[-1] + 1],
+            "skipped": chunk[-1] + 1 - chunk[0] - len(chunk),
+            "bytes": [byte_start, byte_end],
+            "sha1": hashlib.sha1(data[byte_start:byte_end]).hexdigest(),
+            "count": len(chunk),
+        })
+
+    return {
+        "path": str(csv_path),
+        "folder": folder.name,
+        "expected_folder": expected_folder,
+        "folder_match": "exact" if folder.name == expected_folder else "fuzzy",
+        "manifest": manifest is not None,
+        "blocks": blocks,
+    }
+
+
+class ProvenanceWriter:
+    """
+    csv.writer 的包装：记录当前行号，并收集每个数值 cell 的来源。
+    在写出一行之前调用 record()，col 为该 cell 在行中的列号。
+    """
+
+    def __init__(self, f, table_path: Path):
+        self.writer = csv.writer(f)
+        self.table_path = table_path
+        self.line_no = 0
+        self.sources = []
+        self.source_ids = {}
+        self.cells = []
+
+    def writerow(self, row: list):
+        self.writer.writerow(row)
+        self.line_no += 1
+
+    def record(self, col: int, section: str, row_label: str, col_label: str, value: str, source: dict | None, block: int):
+        """记录当前行第 col 列的来源；section 为 explicit/implicit 或版本名"""
+        if source is None or block >= len(source["blocks"]):
+            return
+        source_id = self.source_ids.get(source["path"])
+        if source_id is None:
+            source_id = len(self.sources)
+            self.source_ids[source["path"]] = source_id
+            self.sources.append(source)
+        self.cells.append({
+            "row": self.line_no,
+            "col": col,
+            "section": section,
+            "row_label": row_label,
+            "col_label": col_label,
+            "value": value,
+            "source": source_id,
+            "block": block,
+        })
+
+    def save(self):
+        """写入 provenance sidecar；来源与 cell 都没有变化时保留原文件"""
+        provenance_path = get_provenance_path(self.table_path)
+        if provenance_path.exists():
+            try:
+                old = load_provenance(self.table_path)
+                if old["sources"] == self.sources and old["cells"] == self.cells:
+                    return
+            except (OSError, json.JSONDecodeError, KeyError):
+                pass
+
+        provenance = {
+            "version": PROVENANCE_VERSION,
+            "table": self.table_path.name,
+            "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "sources": self.sources,
+            "cells": self.cells,
+        }
+        tmp_path = provenance_path.with_name(provenance_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(provenance, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, provenance_path)
+
+
+def load_provenance(table_path: Path) -> dict:
+    """读取表格的 provenance"""
+    provenance_path = get_provenance_path(table_path)
+    if not provenance_path.exists():
+        raise FileNotFoundError(f"没有找到 {provenance_path}，请先重新生成表格")
+    with open(provenance_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_cell(provenance: dict, row: str, col: str) -> dict | None:
+    """按行号/行名 和 列号/列名 查找 cell"""
+    for cell in provenance["cells"]:
+        if row.isdigit():
+            row_ok = cell["row"] == int(row)
+        else:
+            row_ok = row in (cell["row_label"], f"{cell['section']}:{cell['row_label']}")
+        if col.isdigit():
+            col_ok = cell["col"] == int(col)
+        else:
+            col_ok = cell["col_label"] == col
+        if row_ok and col_ok:
+            return cell
+    return None
+
+
+def explain(table_path: Path, row: str, col: str) -> str:
+    """返回某个 cell 的来源说明"""
+    provenance = load_provenance(table_path)
+    cell = find_cell(provenance, row, col)
+    if cell is None:
+        return f"{table_path.name}: 没有找到 cell ({row}, {col})，可能该 cell 为空"
+
+    source = provenance["sources"][cell["source"]]
+    block = source["blocks"][cell["block"]]
+    lines = [
+        f"表格: {provenance['table']} (生成于 {provenance['generated_at']})",
+        f"cell: 行 {cell['row']} ({cell['row_label']}), 列 {cell['col']} ({cell['col_label']}) = {cell['value']}",
+        f"源文件: {source['path']}",
+        f"文件夹: {source['folder']} ({'精确匹配' if source['folder_match'] == 'exact' else '模糊匹配，期望 ' + source['expected_folder']})",
+        f"分组: 第 {cell['block']} 组, 记录 [{block['records'][0]}, {block['records'][1]}) 共 {block['count']} 条"
+        + (f"，跳过 {block['skipped']} 条无法解析的记录" if block["skipped"] else ""),
+        f"字节区间: [{block['bytes'][0]}, {block['bytes'][1]})",
+        f"内容哈希: sha1 {block['sha1']}",
+        f"清单: {'有' if source['manifest'] else '无'}",
+    ]
+    return "\n".join(lines)
+
+
+def verify(table_path: Path, row: str, col: str) -> bool:
+    """按记录的字节区间读取源文件，检查内容哈希是否仍然一致"""
+    provenance = load_provenance(table_path)
+    cell = find_cell(provenance, row, col)
+    if cell is None:
+        return False
+    source = provenance["sources"][cell["source"]]
+    block = source["blocks"][cell["block"]]
+    raw = read_record_bytes(Path(source["path"]), block["bytes"][0], block["bytes"][1])
+    return hashlib.sha1(raw).hexdigest() == block["sha1"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询表格 cell 的来源")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    explain_parser = subparsers.add_parser("explain", help="打印 cell 的源文件、记录范围和内容哈希")
+    explain_parser.add_argument("table", type=Path)
+    explain_parser.add_argument("row")
+    explain_parser.add_argument("col")
+    explain_parser.add_argument("--verify", action="store_true", help="同时检查源文件内容是否已变化")
+
+    args = parser.parse_args()
+    if args.command == "explain":
+        print(explain(args.table, args.row, args.col))
+        if args.verify:
+            print("源数据: " + ("未变化 ✓" if verify(args.table, args.row, args.col) else "已变化 ❌"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+表格快照: 每次生成表格时把内存中的数值（不是 CSV 文本）保存为带时间戳、按内容寻址的快照，
+之后可以在任意两个快照之间比较 cell 的变化，用来代替手动保留 old-table_*.csv 对比。
+
+存储位置 <BASE_DIR>/.table_snapshots/:
+- objects/<sha256>.npz: 快照内容（行标签、列标签、数值矩阵，空 cell 为 nan），相同内容只存一份
+- index.json: 每个快照的 id、表格名、生成时间和内容哈希；同一表格内容没变时不追加新快照
+
+用法:
+    python table_snapshot.py list [table_gpt4o.csv]
+    python table_snapshot.py diff table_gpt4o.csv                  # 该表格最近两个快照
+    python table_snapshot.py diff table_gpt4o.csv@-3 table_gpt4o.csv@-1
+    python table_snapshot.py diff 3fa2c1 9b07de --threshold 0.01   # 按快照 id（前缀）
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from table_export import label_columns, flat_columns
+
+SNAPSHOT_DIR_NAME = ".table_snapshots"
+SNAPSHOT_VERSION = 1
+
+# 快照 id 为内容哈希的前若干位
+SNAPSHOT_ID_LENGTH = 12
+
+
+def snapshot_arrays(table) -> tuple:
+    """
+    把 table_export.ExportTable 展开为 (行标签, 列标签, 数值矩阵)。
+    行标签为 "块标题/分区:行名"，列标签为多级表头合并后的列名。
+    """
+    row_labels, col_labels, rows = [], None, []
+    for block in table.blocks:
+        label_cols = label_columns(block)
+        headers = block["headers"]
+        title = headers[0][0] if headers and headers[0][0] and not any(headers[0][1:]) else ""
+        columns = flat_columns({"headers": headers[1:] if title else headers}, label_cols)[label_cols:]
+        if col_labels is None:
+            col_labels = columns
+        for section in block["sections"]:
+            for row in section["rows"]:
+                labels = "/".join(cell for cell in row[:label_cols] if cell and cell != section["name"])
+                prefix = f"{title}/" if title and len(table.blocks) > 1 else ""
+                row_labels.append(f"{prefix}{section['name']}:{labels}")
+                rows.append([np.nan if cell is None else cell for cell in row[label_cols:]])
+
+    col_labels = col_labels or []
+    values = np.array(rows, dtype=np.float64).reshape(len(rows), len(col_labels))
+    return row_labels, col_labels, values
+
+
+def content_digest(row_labels: list, col_labels: list, values: np.ndarray) -> str:
+    """快照内容的 sha256（标签和数值的规范字节表示）"""
+    h = hashlib.sha256()
+    h.update(json.dumps([row_labels, col_labels], ensure_ascii=False).encode("utf-8"))
+    h.update(np.ascontiguousarray(values, dtype="<f8").tobytes())
+    return h.hexdigest()
+
+
+class SnapshotStore:
+    """快照存储"""
+
+    def __init__(self, base_dir: Path):
+        self.root = base_dir / SNAPSHOT_DIR_NAME
+        self.objects = self.root / "objects"
+        self.index_path = self.root / "index.json"
+
+    def load_index(self) -> list:
+        """读取快照列表（按生成时间顺序）"""
+        if not self.index_path.exists():
+            return []
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return []
+        if index.get("version") != SNAPSHOT_VERSION:
+            return []
+        return index["snapshots"]
+
+    def _save_index(self, snapshots: list):
+        tmp_path = self.index_path.with_name(f".{self.index_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": SNAPSHOT_VERSION, "snapshots": snapshots}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def save(self, table_name: str, row_labels: list, col_labels: list, values: np.ndarray) -> str | None:
+        """
+        保存快照，返回快照 id；与该表格最近一次快照内容相同时不保存，返回 None。
+        """
+        digest = content_digest(row_labels, col_labels, values)
+        snapshots = self.load_index()
+        history = [s for s in snapshots if s["table"] == table_name]
+        if history and history[-1]["digest"] == digest:
+            return None
+
+        self.objects.mkdir(parents=True, exist_ok=True)
+        object_path = self.objects / f"{digest}.npz"
+        if not object_path.exists():
+            buffer = io.BytesIO()
+            np.savez_compressed(
+                buffer, values=values,
+                row_labels=np.array(row_labels, dtype=str), col_labels=np.array(col_labels, dtype=str),
+            )
+            tmp_path = object_path.with_name(f".{object_path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_path, object_path)
+
+        snapshot_id = digest[:SNAPSHOT_ID_LENGTH]
+        snapshots.append({
+            "id": snapshot_id,
+            "table": table_name,
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "digest": digest,
+            "shape": list(values.shape),
+        })
+        self._save_index(snapshots)
+        return snapshot_id
+
+    def resolve(self, ref: str) -> dict:
+        """
+        把引用解析为快照记录。引用可以是快照 id（前缀），或 "表格名@n"
+        （n 为该表格历史中的下标，-1 为最新）。
+        """
+        snapshots = self.load_index()
+        table_name, sep, pos = ref.rpartition("@")
+        if sep:
+            history = [s for s in snapshots if s["table"] == table_name]
+            try:
+                return history[int(pos)]
+            except (ValueError, IndexError):
+                raise KeyError(f"{table_name} 没有快照 {pos}（共 {len(history)} 个）")
+
+        matches = [s for s in snapshots if s["digest"].startswith(ref)]
+        if not matches:
+            raise KeyError(f"没有找到快照: {ref}")
+        if len({s["digest"] for s in matches}) > 1:
+            raise KeyError(f"快照 id 不唯一: {ref}")
+        return matches[-1]
+
+    def load(self, snapshot: dict) -> tuple:
+        """读取快照内容，返回 (行标签, 列标签, 数值矩阵)"""
+        with np.load(self.objects / f"{snapshot['digest']}.npz", allow_pickle=False) as npz:
+            return list(npz["row_labels"]), list(npz["col_labels"]), npz["values"]
+
+
+def save_table_snapshot(table, base_dir: Path | None = None) -> str | None:
+    """保存 ExportTable 的快照（由 table_layout 在表格生成后调用）"""
+    row_labels, col_labels, values = snapshot_arrays(table)
+    store = SnapshotStore(base_dir or table.path.parent)
+    try:
+        return store.save(table.path.name, row_labels, col_labels, values)
+    except OSError as e:
+        print(f"  保存快照失败: {table.path.name}: {e}")
+        return None
+
+
+def diff_snapshots(old: tuple, new: tuple, threshold: float = 0.0) -> dict:
+    """
+    按行/列标签对齐两个快照并比较。
+    返回 {"changed": [(行, 列, 旧值, 新值, 差值)], "appeared": [...], "vanished": [...],
+          "rows_added", "rows_removed", "cols_added", "cols_removed"}；
+    appeared/vanished 为从空变为有值、从有值变为空的 cell。
+    """
+    old_rows, old_cols, old_values = old
+    new_rows, new_cols, new_values = new
+
+    old_r = {label: i for i, label in enumerate(old_rows)}
+    old_c = {label: i for i, label in enumerate(old_cols)}
+    new_r = {label: i for i, label in enumerate(new_rows)}
+    new_c = {label: i for i, label in enumerate(new_cols)}
+    rows = [r for r in new_rows if r in old_r]
+    cols = [c for c in new_cols if c in old_c]
+
+    def take(values, row_index, col_index):
+        r = np.array([row_index[label] for label in rows], dtype=np.intp)
+        c = np.array([col_index[label] for label in cols], dtype=np.intp)
+        return values[np.ix_(r, c)]
+
+    a = take(old_values, old_r, old_c)
+    b = take(new_values, new_r, new_c)
+    a_nan, b_nan = np.isnan(a), np.isnan(b)
+    delta = b - a
+    changed = ~a_nan & ~b_nan & (np.abs(delta) > threshold)
+
+    def cells(mask):
+        return [
+            (rows[i], cols[j], float(a[i, j]), float(b[i, j]), float(delta[i, j]))
+            for i, j in zip(*np.nonzero(mask))
+        ]
+
+    result = {
+        "changed": cells(changed),
+        "appeared": cells(a_nan & ~b_nan),
+        "vanished": cells(~a_nan & b_nan),
+        "rows_added": [r for r in new_rows if r not in old_r],
+        "rows_removed": [r for r in old_rows if r not in new_r],
+        "cols_added": [c for c in new_cols if c not in old_c],
+        "cols_removed": [c for c in old_cols if c not in new_c],
+    }
+    result["changed"].sort(key=lambda cell: -abs(cell[4]))
+    return result
+
+
+def format_diff(old_snapshot: dict, new_snapshot: dict, diff: dict) -> str:
+    """diff 结果的文本报告"""
+    lines = [
+        f"旧: {old_snapshot['table']} {old_snapshot['id']} ({old_snapshot['created_at']})",
+        f"新: {new_snapshot['table']} {new_snapshot['id']} ({new_snapshot['created_at']})",
+    ]
+    if old_snapshot["digest"] == new_snapshot["digest"]:
+        lines.append("内容相同 ✓")
+        return "\n".join(lines)
+
+    changed = diff["changed"]
+    if changed:
+        deltas = np.array([cell[4] for cell in changed])
+        lines.append(
+            f"\n变化的 cell: {len(changed)} 个，最大 |Δ| = {np.abs(deltas).max():.4f}，"
+            f"平均 Δ = {deltas.mean():+.4f}（升 {int((deltas > 0).sum())} / 降 {int((deltas < 0).sum())}）"
+        )
+        for row, col, old, new, delta in changed:
+            lines.append(f"  {row:<32} {col:<24} {old:.4f} -> {new:.4f}  ({delta:+.4f})")
+    else:
+        lines.append("\n没有数值变化的 cell")
+
+    for key, title in (("appeared", "新出现的 cell"), ("vanished", "变为空的 cell")):
+        if diff[key]:
+            lines.append(f"\n{title}: {len(diff[key])} 个")
+            for row, col, old, new, _ in diff[key]:
+                value = new if key == "appeared" else old
+                lines.append(f"  {row:<32} {col:<24} {value:.4f}")
+
+    for key, title in (
+        ("rows_added", "新增的行"), ("rows_removed", "删除的行"),
+        ("cols_added", "新增的列"), ("cols_removed", "删除的列"),
+    ):
+        if diff[key]:
+            lines.append(f"\n{title}: {', '.join(diff[key])}")
+    return "\n".join(lines)
+
+
+def main():
+    # 表格生成脚本通过 table_layout 导入本模块，这里延迟导入避免循环依赖
+    from generate_all_tables import BASE_DIR
+
+    parser = argparse.ArgumentParser(description="表格快照的列表与比较")
+    parser.add_argument("--base-dir", type=Path, default=BASE_DIR, help="表格所在目录（快照保存在其中的 .table_snapshots）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="列出快照")
+    list_parser.add_argument("table", nargs="?", help="只列出该表格的快照")
+
+    diff_parser = subparsers.add_parser("diff", help="比较两个快照")
+    diff_parser.add_argument("old", help="快照 id、表格名@n，或只给表格名（比较最近两个快照）")
+    diff_parser.add_argument("new", nargs="?", help="快照 id 或 表格名@n")
+    diff_parser.add_argument("--threshold", type=float, default=0.0, help="忽略 |Δ| 不超过该值的变化")
+
+    args = parser.parse_args()
+    store = SnapshotStore(args.base_dir)
+
+    if args.command == "list":
+        snapshots = [s for s in store.load_index() if args.table in (None, s["table"])]
+        for s in snapshots:
+            print(f"{s['id']}  {s['created_at']}  {s['table']}  {s['shape'][0]}×{s['shape'][1]}")
+        print(f"共 {len(snapshots)} 个快照")
+        return
+
+    if args.new is None:
+        old_ref, new_ref = f"{args.old}@-2", f"{args.old}@-1"
+    else:
+        old_ref, new_ref = args.old, args.new
+    try:
+        old_snapshot, new_snapshot = store.resolve(old_ref), store.resolve(new_ref)
+    except KeyError as e:
+        parser.error(str(e.args[0]))
+    diff = diff_snapshots(store.load(old_snapshot), store.load(new_snapshot), args.threshold)
+    print(format_diff(old_snapshot, new_snapshot, diff))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+表格输出层：先渲染到内存，再与已有文件比较内容哈希，只有内容变化时才写入。
+
+写入采用 tmp + rename 的原子方式，避免同步任务读到写了一半的文件；
+内容没变的表格不会被重写，mtime 和 git status 都保持不变。
+
+用法:
+    with TableFile(output_file) as f:
+        writer = csv.writer(f)
+        ...
+    print(format_write_report())
+"""
+
+import hashlib
+import io
+import os
+from pathlib import Path
+
+# 本次运行中每个输出文件的写入结果: [(路径, 是否变化)]
+WRITE_LOG = []
+
+
+def file_digest(path: Path) -> str | None:
+    """已有文件内容的 sha256，文件不存在时返回 None"""
+    if not path.exists():
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """内容与已有文件不同时原子写入，返回是否写入"""
+    if file_digest(path) == hashlib.sha256(content).hexdigest():
+        return False
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return True
+
+
+class TableFile:
+    """
+    代替 open(output_file, "w", newline="", encoding="utf-8") 的上下文管理器。
+    with 块内写入内存缓冲区，正常退出时按内容哈希决定是否落盘。
+    """
+
+    def __init__(self, path: Path, encoding: str = "utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.buffer = None
+        self.changed = False
+
+    def __enter__(self) -> io.StringIO:
+        self.buffer = io.StringIO(newline="")
+        return self.buffer
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            return False
+        self.changed = write_if_changed(self.path, self.buffer.getvalue().encode(self.encoding))
+        WRITE_LOG.append((self.path, self.changed))
+        return False
+
+
+def changed_tables() -> list:
+    """本次运行中内容实际发生变化的表格"""
+    return [path for path, changed in WRITE_LOG if changed]
+
+
+def format_write_report() -> str:
+    """本次运行的写入统计"""
+    changed = changed_tables()
+    lines = [f"📝 内容变化的表格: {len(changed)}/{len(WRITE_LOG)}"]
+    for path in changed:
+        lines.append(f"  - {path}")
+    return "\n".join(lines)
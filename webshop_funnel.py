@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+WebShop 轨迹漏斗分析: 搜索 → 点击商品 → 选择选项 → 购买（buy now）。
+
+每个 webshop episode 的 action_path 中的动作映射为整数 id（见 ACTION_NAMES，
+每个不同的动作字符串只分类一次），所有运行的 episode 排成一个 (episode × step) 数组，
+用数组运算一次得到每个 episode 到达的漏斗阶段:
+- 搜索: 有 search[...]
+- 点击: 搜索之后点击了商品（ASIN）
+- 选项: 点击商品之后点击了选项（颜色、尺码等）
+- 购买: 点击商品之后点击了 buy now（选项不是必须的，另外统计没选选项就购买的比例）
+
+每个 (model, mode, method, env0/env1/env2) cell 报告各阶段的转化率、没有购买的 episode
+最常停在哪个阶段（流失阶段）和平均搜索次数，用来分析 webshop env1 经常得 0 分的原因。
+
+用法:
+    python webshop_funnel.py [--where model=GPT-4o] [--where mode=explicit] [-o funnel.csv]
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from run_manifest import load_manifest, get_items_per_env
+from summary_index import read_summary_rows
+from table_pivot import DIM_ORDER, crawl_sources, parse_where
+from table_writer import TableFile
+
+# 动作 id
+SEARCH, CLICK_ITEM, CLICK_OPTION, BUY, NAVIGATE, INFO, OTHER = range(7)
+ACTION_NAMES = ["search", "click_item", "click_option", "buy", "navigate", "info", "other"]
+PADDING = -1
+
+ACTION_PATTERN = re.compile(r"(\w+)\[(.*)\]$", re.DOTALL)
+# 商品 ASIN，如 b09kp78g37
+ITEM_PATTERN = re.compile(r"(?=.*\d)[0-9a-z]{10}")
+# buy now 之后 Explorer 追加的结束标记，如 a-0-x
+END_MARK_PATTERN = re.compile(r"[a-z]-\d+-x")
+NAVIGATION_CLICKS = {"back to search", "next >", "< prev", "search"}
+INFO_CLICKS = {"description", "features", "reviews", "attributes"}
+
+# 漏斗阶段（episode 到达的最后一个阶段）
+STAGE_NAMES = ["未搜索", "搜索", "点击", "选项", "购买"]
+NOT_STARTED, SEARCHED, CLICKED, OPTIONED, BOUGHT = range(len(STAGE_NAMES))
+
+# 每个 cell 的维度
+CELL_DIMS = ["model", "mode", "method", "block"]
+
+
+def classify_action(action) -> int:
+    """一个动作字符串 -> 动作 id"""
+    match = ACTION_PATTERN.match(action) if isinstance(action, str) else None
+    if not match:
+        return OTHER
+    kind, value = match.group(1).lower(), match.group(2).strip().lower()
+    if kind == "search":
+        return SEARCH
+    if kind != "click":
+        return OTHER
+    if value == "buy now":
+        return BUY
+    if value in NAVIGATION_CLICKS:
+        return NAVIGATE
+    if value in INFO_CLICKS:
+        return INFO
+    if ITEM_PATTERN.fullmatch(value):
+        return CLICK_ITEM
+    if END_MARK_PATTERN.fullmatch(value):
+        return OTHER
+    return CLICK_OPTION
+
+
+class WebshopEpisodes:
+    """所有 webshop episode 的动作 id 和所属 cell"""
+
+    def __init__(self):
+        self.action_ids = {}  # 动作字符串 -> id
+        self.actions = []  # 每个 episode 的动作 id 列表
+        self.cell = []  # 每个 episode 的 cell 编号
+        self.score = []
+        self.cells = []  # [{维度: 值}]
+        self.cell_index = {}
+
+    def add_file(self, csv_path: Path, dims: dict):
+        items_per_env = get_items_per_env(load_manifest(csv_path.parent.parent), 20)
+        _, rows = read_summary_rows(csv_path)
+        for j, row in enumerate(rows):
+            if len(row) != 7 or row[2] != "webshop":
+                continue
+            try:
+                path = json.loads(row[4])
+                score = float(row[6])
+            except ValueError:
+                continue
+            ids = []
+            for action in path:
+                key = action if isinstance(action, str) else json.dumps(action)
+                action_id = self.action_ids.get(key)
+                if action_id is None:
+                    action_id = self.action_ids[key] = classify_action(action)
+                ids.append(action_id)
+            cell_dims = {dim: dims[dim] for dim in CELL_DIMS if dim != "block"}
+            cell_dims["block"] = f"env{j // items_per_env}"
+            key = tuple(cell_dims[dim] for dim in CELL_DIMS)
+            if key not in self.cell_index:
+                self.cell_index[key] = len(self.cells)
+                self.cells.append(cell_dims)
+            self.actions.append(ids)
+            self.cell.append(self.cell_index[key])
+            self.score.append(score)
+
+    def __len__(self):
+        return len(self.actions)
+
+
+def id_matrix(actions: list) -> np.ndarray:
+    """动作 id 列表 -> (episode × step) 数组，空位为 PADDING"""
+    lengths = np.array([len(ids) for ids in actions], dtype=np.int64)
+    matrix = np.full((len(actions), int(lengths.max()) if len(lengths) else 0), PADDING, dtype=np.int8)
+    if lengths.sum():
+        flat = np.fromiter((a for ids in actions for a in ids), dtype=np.int8, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(len(actions)), lengths)
+        offsets = np.cumsum(lengths) - lengths
+        matrix[rows, np.arange(len(flat)) - np.repeat(offsets, lengths)] = flat
+    return matrix
+
+
+def classify_stages(matrix: np.ndarray) -> dict:
+    """
+    每个 episode 的漏斗结果: stage（到达的最后阶段，见 STAGE_NAMES）、
+    bought_without_option（购买但没有选选项）、searches（搜索次数）
+    """
+    n_steps = matrix.shape[1]
+    never = n_steps + 1
+
+    def first(action_id, after):
+        """after 之后第一次出现 action_id 的位置，没有为 never"""
+        hit = (matrix == action_id) & (np.arange(n_steps) > after[:, None])
+        return np.where(hit.any(axis=1), hit.argmax(axis=1), never)
+
+    start = np.full(len(matrix), -1)
+    first_search = first(SEARCH, start)
+    first_item = first(CLICK_ITEM, first_search)
+    first_option = first(CLICK_OPTION, first_item)
+    first_buy = first(BUY, first_item)
+
+    searched = first_search < never
+    clicked = first_item < never
+    optioned = first_option < never
+    bought = first_buy < never
+
+    stage = np.full(len(matrix), NOT_STARTED)
+    stage[searched] = SEARCHED
+    stage[clicked] = CLICKED
+    stage[optioned] = OPTIONED
+    stage[bought] = BOUGHT
+    return {
+        "stage": stage,
+        "bought_without_option": bought & (first_option > first_buy),
+        "searches": (matrix == SEARCH).sum(axis=1),
+    }
+
+
+def funnel_table(episodes: WebshopEpisodes) -> list:
+    """每个 cell 一行: {维度..., episodes, 平均搜索次数, 各阶段转化率, 流失阶段, 平均得分}"""
+    result = classify_stages(id_matrix(episodes.actions))
+    cell = np.array(episodes.cell, dtype=np.intp)
+    n_cells = len(episodes.cells)
+
+    # stage_counts[c, k]: cell c 中最后停在阶段 k 的 episode 数；选项不是购买的前提，
+    # 选过选项的 episode = 停在选项阶段的 + 选过选项再购买的
+    stage_counts = np.zeros((n_cells, len(STAGE_NAMES)), dtype=np.int64)
+    np.add.at(stage_counts, (cell, result["stage"]), 1)
+    total = stage_counts.sum(axis=1)
+    searched = stage_counts[:, SEARCHED:].sum(axis=1)
+    clicked = stage_counts[:, CLICKED:].sum(axis=1)
+    bought = stage_counts[:, BOUGHT]
+    no_option = np.bincount(cell, weights=result["bought_without_option"], minlength=n_cells)
+    optioned = bought - no_option + stage_counts[:, OPTIONED]
+    searches = np.bincount(cell, weights=result["searches"], minlength=n_cells)
+    scores = np.bincount(cell, weights=np.array(episodes.score), minlength=n_cells)
+    drop_off = stage_counts[:, :BOUGHT].argmax(axis=1)
+
+    def rate(a, b):
+        return np.divide(a, b, out=np.full(n_cells, np.nan), where=b > 0)
+
+    columns = {
+        "avg_searches": rate(searches, total),
+        "search_rate": rate(searched, total),
+        "click_rate": rate(clicked, searched),
+        "option_rate": rate(optioned, clicked),
+        "buy_rate": rate(bought, clicked),
+        "buy_without_option": rate(no_option, bought),
+        "avg_score": rate(scores, total),
+    }
+    table = []
+    for c in sorted(range(n_cells), key=lambda c: _order_key(episodes.cells[c])):
+        row = {**episodes.cells[c], "episodes": int(total[c])}
+        row.update({name: float(values[c]) for name, values in columns.items()})
+        row["drop_off"] = STAGE_NAMES[drop_off[c]] if bought[c] < total[c] else ""
+        table.append(row)
+    return table
+
+
+def _order_key(cell: dict) -> tuple:
+    key = []
+    for dim in CELL_DIMS:
+        order = DIM_ORDER.get(dim, [])
+        value = cell[dim]
+        key.append((order.index(value) if value in order else len(order), value))
+    return tuple(key)
+
+
+# 输出列: (字段, 标题, 格式)
+COLUMNS = [
+    ("episodes", "episode 数", "{}"),
+    ("avg_searches", "平均搜索次数", "{:.2f}"),
+    ("search_rate", "搜索率", "{:.3f}"),
+    ("click_rate", "搜索→点击", "{:.3f}"),
+    ("option_rate", "点击→选项", "{:.3f}"),
+    ("buy_rate", "点击→购买", "{:.3f}"),
+    ("buy_without_option", "未选选项购买", "{:.3f}"),
+    ("drop_off", "流失阶段", "{}"),
+    ("avg_score", "平均得分", "{:.4f}"),
+]
+
+
+def format_cell(value, fmt: str) -> str:
+    if isinstance(value, float) and np.isnan(value):
+        return ""
+    return fmt.format(value)
+
+
+def format_markdown(table: list) -> str:
+    headers = CELL_DIMS + [title for _, title, _ in COLUMNS]
+    lines = ["| " + " | ".join(headers) + " |", "|" + "|".join("---" for _ in headers) + "|"]
+    for row in table:
+        cells = [str(row[dim]) for dim in CELL_DIMS] + [format_cell(row[field], fmt) for field, _, fmt in COLUMNS]
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def write_csv(table: list, output_file: Path):
+    """写入 CSV（内容没变时不重写，见 table_writer.py）"""
+    with TableFile(output_file) as f:
+        writer = csv.writer(f)
+        writer.writerow(CELL_DIMS + [field for field, _, _ in COLUMNS])
+        for row in table:
+            writer.writerow([row[dim] for dim in CELL_DIMS] + [format_cell(row[field], fmt) for field, _, fmt in COLUMNS])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebShop 轨迹漏斗分析（搜索 → 点击 → 选项 → 购买）")
+    parser.add_argument("--where", action="append", default=[], help="筛选条件，如 model=GPT-4o 或 block=env1；可重复")
+    parser.add_argument("-o", "--output", type=Path, help="输出 CSV 文件（默认打印 Markdown 表格）")
+    args = parser.parse_args()
+
+    where = parse_where(args.where)
+    episodes = WebshopEpisodes()
+    for csv_path, _, dims in crawl_sources():
+        if dims["env"] != "webshop":
+            continue
+        if any(dim in dims and dims[dim] not in allowed for dim, allowed in where.items()):
+            continue
+        try:
+            episodes.add_file(csv_path, dims)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"读取 {csv_path} 失败: {e}", file=sys.stderr)
+    if not len(episodes):
+        print("没有符合条件的 webshop episode")
+        return 0
+
+    table = funnel_table(episodes)
+    if "block" in where:
+        table = [row for row in table if row["block"] in where["block"]]
+    if args.output:
+        write_csv(table, args.output)
+        print(f"  生成: {args.output}")
+    else:
+        print(format_markdown(table))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())